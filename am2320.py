@@ -1,5 +1,25 @@
-import ustruct
 import time
+from array import array
+
+CRC16_POLY = const(0xA001)  # crc-16/modbus, reflected
+DATA_SIZE = const(6)  # function code, byte count and the 4 register bytes; the crc follows
+READ_WAIT_US = const(2000)  # the sensor needs at least 1.5 ms between the request and the read
+
+
+def build_crc16_table():
+    ''' crc of every possible byte value, so the checksum takes one lookup per byte instead of 8 shifts '''
+    table = array('H', [0] * 256)
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 0x01:
+                crc = (crc >> 1) ^ CRC16_POLY
+            else:
+                crc >>= 1
+        table[byte] = crc
+    return table
+
+CRC16_TABLE = build_crc16_table()
 
 class AM2320:
     BUFFER_SIZE = const(8)
@@ -8,9 +28,30 @@ class AM2320:
         self.i2c = i2c
         self.address = address
         self.buf = bytearray(self.BUFFER_SIZE)
+        self.__view = memoryview(self.buf)
+        # raw register values of the last good measurement, in tenths
+        self.__humidity_tenths = 0
+        self.__temperature_tenths = 0
 
     def measure(self):
-        buf = self.buf
+        '''
+        read and checksum the humidity and temperature registers and decode them.
+        everything after the wake up works in the preallocated buffer, so a good
+        measurement allocates nothing (the wake up write raises while the sensor is
+        asleep, and that OSError is the only allocation).
+        '''
+        self._request()
+        # wait at least 1.5ms
+        time.sleep_ms(2)
+        self._read()
+
+    def measure_steps(self):
+        ''' measure() for I2CBus.submit(): yields the wait in us instead of sleeping it '''
+        self._request()
+        yield READ_WAIT_US
+        self._read()
+
+    def _request(self):
         address = self.address
         # wake sensor
         try:
@@ -19,32 +60,40 @@ class AM2320:
             pass
         # read 4 registers starting at offset 0x00
         self.i2c.writeto(address, b'\x03\x00\x04')
-        # wait at least 1.5ms
-        time.sleep_ms(2)
-        # read data
-        self.i2c.readfrom_mem_into(address, 0, buf)
+
+    def _read(self):
+        buf = self.__view
+        self.i2c.readfrom_mem_into(self.address, 0, self.buf)
         # print(buf)
-        crc = ustruct.unpack('<H', bytearray(buf[-2:]))[0]
-        if (crc != self.crc16(buf[:-2])):
+        crc = buf[DATA_SIZE] | buf[DATA_SIZE + 1] << 8
+        if (crc != self.crc16(buf, DATA_SIZE)):
             raise Exception("checksum error")
+        self.__humidity_tenths = buf[2] << 8 | buf[3]
+        temperature = (buf[4] & 0x7f) << 8 | buf[5]
+        if buf[4] & 0x80:
+            temperature = -temperature
+        self.__temperature_tenths = temperature
 
-    def crc16(self, buf):
+    def crc16(self, buf, length=None):
+        ''' crc of the first length bytes of buf (all of it by default), read in place '''
+        if length is None:
+            length = len(buf)
+        table = CRC16_TABLE
         crc = 0xFFFF
-        for c in buf:
-            crc ^= c
-            for i in range(8):
-                if crc & 0x01:
-                    crc >>= 1
-                    crc ^= 0xA001
-                else:
-                    crc >>= 1
+        for i in range(length):
+            crc = (crc >> 8) ^ table[(crc ^ buf[i]) & 0xFF]
         return crc
 
     def humidity(self):
-        return (self.buf[2] << 8 | self.buf[3]) * 0.1
+        return self.__humidity_tenths * 0.1
 
     def temperature(self):
-        t = ((self.buf[4] & 0x7f) << 8 | self.buf[5]) * 0.1
-        if self.buf[4] & 0x80:
-            t = -t
-        return t
+        return self.__temperature_tenths * 0.1
+
+    def humidity_centi(self):
+        ''' humidity in hundredths of a percent, as an int '''
+        return self.__humidity_tenths * 10
+
+    def temperature_centi(self):
+        ''' temperature in hundredths of a degree C, as an int '''
+        return self.__temperature_tenths * 10
@@ -1,6 +1,9 @@
 import http_utils
 import mrequests as requests
-from ujson import dumps
+try:
+    from ujson import dumps
+except ImportError:
+    from json import dumps
 
 TEMPERATURE_KEY = "Temperature"
 WIND_KEY = "Wind"
@@ -10,49 +13,109 @@ WIND_DIRECTION_KEY = "Direction"
 RAIN_KEY = "Rain"
 RAIN_COUNT_DAILY_KEY = "Daily"
 RAIN_COUNT_HOURLY_KEY = "Hourly"
+RAIN_RATE_KEY = "Rate"
 PRESSURE_KEY = "Pressure"
 HUMIDITY_KEY = "Humidity"
 DEW_POINT_KEY = "DewPoint"
+REJECTED_KEY = "Rejected"
+HEALTH_KEY = "Health"
+HEAT_INDEX_KEY = "HeatIndex"
+WIND_CHILL_KEY = "WindChill"
+FEELS_LIKE_KEY = "FeelsLike"
+SEA_LEVEL_PRESSURE_KEY = "SeaLevelPressure"
+PRESSURE_TENDENCY_KEY = "PressureTendency"
+# servers drop an idle kept connection well before the next 2 minute update (nginx after 75 s, telegraf's
+# listener after 10 s), so one idle for longer than this is closed and the upload connects straight away
+# instead of first sending on a connection that's most likely gone
+SESSION_IDLE_TIMEOUT_MS = 60_000
+REQUEST_TIMEOUT_S = 30  # a kept connection the network silently dropped fails instead of hanging the upload thread
 
-def get_data_str(id, key, data):
+# the uploads keep a connection per host, a request to it within SESSION_IDLE_TIMEOUT_MS skips the
+# connect and tls handshake. only the upload thread uses it
+session = requests.Session(SESSION_IDLE_TIMEOUT_MS)
+
+def get_data_str(id, key, snapshot):
+    ''' the wunderground query string of a weather.WeatherSnapshot '''
     return ''.join(
         [
             'ID=', id,
             '&PASSWORD=', key,
             '&dateutc=now',
-            '&winddir=', str(data[WIND_KEY][WIND_DIRECTION_KEY]),
-            '&windspeedmph=', str(data[WIND_KEY][WIND_SPEED_KEY]),
-            '&windgustmph=', str(data[WIND_KEY][WIND_GUST_KEY]),
-            '&tempf=', str(data[TEMPERATURE_KEY]),
-            '&rainin=', str(data[RAIN_KEY][RAIN_COUNT_HOURLY_KEY]),
-            '&dailyrainin=', str(data[RAIN_KEY][RAIN_COUNT_DAILY_KEY]),
-            '&baromin=', str(data[PRESSURE_KEY]),
-            '&humidity=', str(data[HUMIDITY_KEY]),
-            '&dewptf=', str(data[DEW_POINT_KEY]),
+            '&winddir=', str(snapshot.wind_direction),
+            '&windspeedmph=', str(snapshot.wind_speed),
+            '&windgustmph=', str(snapshot.wind_gust),
+            '&tempf=', str(snapshot.temperature),
+            '&rainin=', str(snapshot.rain_hourly),
+            '&dailyrainin=', str(snapshot.rain_daily),
+            '&baromin=', str(snapshot.sea_level_pressure),
+            '&humidity=', str(snapshot.humidity),
+            '&dewptf=', str(snapshot.dew_point),
             '&softwaretype=custom',
             '&action=updateraw'
         ]
     )
 
+def get_json_str(snapshot):
+    ''' a weather.WeatherSnapshot as the json telegraf is sent, nested like Weather.get_weather_data() '''
+    health = {}
+    if snapshot.humidity_health is not None:
+        health[HUMIDITY_KEY] = snapshot.humidity_health
+    if snapshot.pressure_health is not None:
+        health[PRESSURE_KEY] = snapshot.pressure_health
+    return dumps({
+        RAIN_KEY: {
+            RAIN_COUNT_DAILY_KEY: snapshot.rain_daily,
+            RAIN_COUNT_HOURLY_KEY: snapshot.rain_hourly,
+            RAIN_RATE_KEY: snapshot.rain_rate
+        },
+        WIND_KEY: {
+            WIND_DIRECTION_KEY: snapshot.wind_direction,
+            WIND_SPEED_KEY: snapshot.wind_speed,
+            WIND_GUST_KEY: snapshot.wind_gust
+        },
+        TEMPERATURE_KEY: snapshot.temperature,
+        PRESSURE_KEY: snapshot.pressure,
+        HUMIDITY_KEY: snapshot.humidity,
+        DEW_POINT_KEY: snapshot.dew_point,
+        HEAT_INDEX_KEY: snapshot.heat_index,
+        WIND_CHILL_KEY: snapshot.wind_chill,
+        FEELS_LIKE_KEY: snapshot.feels_like,
+        SEA_LEVEL_PRESSURE_KEY: snapshot.sea_level_pressure,
+        PRESSURE_TENDENCY_KEY: snapshot.pressure_tendency,
+        REJECTED_KEY: {
+            TEMPERATURE_KEY: snapshot.temperature_rejected,
+            PRESSURE_KEY: snapshot.pressure_rejected,
+            HUMIDITY_KEY: snapshot.humidity_rejected
+        },
+        HEALTH_KEY: health
+    })
+
 def update_weather_api(host, path, station_id, station_key, weather):
     url_str = "https://{}{}{}".format(host, path, get_data_str(station_id, station_key, weather))
     try:
-        get_response(url_str, requests.get(url=url_str))
+        return get_response(url_str, session.get(url=url_str, timeout=REQUEST_TIMEOUT_S))
     except Exception as e:
         print("url: {}\nLooks like Wunderground is not responding -> {}".format(url_str, e))
+    return False
 
-def send_json_to_telegraf_api(host, port, path, weather_dict):
+def send_json_to_telegraf_api(host, port, path, weather):
     url_str = "http://{}:{}{}".format(host, port, path)
     try:
-        get_response(url_str, requests.post(url=url_str, data=dumps(weather_dict)))
+        return get_response(url_str, session.post(url=url_str, data=get_json_str(weather), timeout=REQUEST_TIMEOUT_S))
     except Exception as e:
         print("url: {}\nLooks like Telegraf is not responding -> {}".format(url_str, e))
+    return False
 
 def get_response(url_str, http_res):
+    ''' print the host's response, returns whether there was one '''
     http_parser = http_utils.HttpParser()
-    http_res_code = http_parser.parse_http(http_res)
+    try:
+        http_res_code = http_parser.parse_http(http_res)
+    finally:
+        http_res.close()  # reads what's left of an error's body, so the session can keep the connection
     if http_res_code:
         http_res_text = http_parser.get_http_response()
         print("Response from {} --> {}".format(url_str, http_res_text))
-    else:
-        print("Error; no response from host: {}.".format(url_str))
+        return True
+    print("Error; no response from host: {}.".format(url_str))
+    return False
@@ -0,0 +1,92 @@
+from time import ticks_ms, ticks_diff
+
+CONVERSION_MS = const(750)  # worst case conversion time at the default 12 bit resolution
+POWER_ON_TEMP = 85.0  # what the scratchpad holds when a conversion didn't happen
+
+
+class DS18B20Scheduler:
+    '''
+    pipelines the conversions of every ds18b20 on a 1-Wire bus. each tick() reads all
+    of the probes' results of the conversion the previous tick started and then starts
+    the next one with a single broadcast, so any number of probes convert in parallel
+    and nothing ever waits out the conversion time. the rom list is scanned once.
+    '''
+
+    def __init__(self, ds, roms=None, conversion_ms=CONVERSION_MS):
+        self.ds = ds
+        self.conversion_ms = conversion_ms
+        self.read_errors = 0
+        self.convert_errors = 0
+        self.__converting_since = None  # ticks_ms() of the broadcast, None when nothing is converting
+        self.set_roms(ds.scan() if roms is None else roms)
+
+    def set_roms(self, roms):
+        self.roms = list(roms)
+        self.__temperatures = [None] * len(self.roms)
+
+    def rescan(self):
+        ''' look for probes again, e.g. after one was added or a scan at boot came up short '''
+        self.set_roms(self.ds.scan())
+
+    def tick(self, now_ms=None):
+        '''
+        read the finished conversion and start the next one. returns True when new
+        readings were taken; a tick that comes before the conversion could have
+        finished leaves it running and changes nothing. when the conversion can't be
+        started every probe reads None until one has been, and the error is raised.
+        '''
+        if now_ms is None:
+            now_ms = ticks_ms()
+        read = False
+        if self.__converting_since is not None:
+            if ticks_diff(now_ms, self.__converting_since) < self.conversion_ms:
+                return False
+            self.__read_all()
+            read = True
+        self.__converting_since = None
+        try:
+            self.ds.convert_temp()  # skip rom: every probe on the bus starts converting
+        except Exception:
+            # no presence pulse or a shorted bus: nothing is converting, so there is
+            # nothing to read next tick and the last readings mustn't stand in for new ones
+            self.__clear()
+            self.convert_errors += 1
+            raise
+        self.__converting_since = now_ms
+        return read
+
+    def __clear(self):
+        temperatures = self.__temperatures
+        for i in range(len(temperatures)):
+            temperatures[i] = None
+
+    def __read_all(self):
+        temperatures = self.__temperatures
+        for i in range(len(self.roms)):
+            try:
+                temperature = self.ds.read_temp(self.roms[i])
+            except Exception:
+                temperature = None  # crc error or the probe dropped off the bus
+                self.read_errors += 1
+            if temperature == POWER_ON_TEMP:
+                temperature = None
+            temperatures[i] = temperature
+
+    def count(self):
+        return len(self.roms)
+
+    def temperature(self, i):
+        ''' degrees C of probe i from the last read, None if it couldn't be read '''
+        return self.__temperatures[i]
+
+    def mean(self):
+        ''' mean of the probes that were read, None if none were '''
+        total = 0.0
+        count = 0
+        for temperature in self.__temperatures:
+            if temperature is not None:
+                total += temperature
+                count += 1
+        if not count:
+            return None
+        return total / count
@@ -0,0 +1,219 @@
+from time import ticks_us, ticks_add, ticks_diff, sleep_us
+from machine import I2C, SoftI2C
+try:
+    from _thread import allocate_lock
+except ImportError:
+    allocate_lock = None
+
+HARD_I2C_ID = 0
+FAST_FREQ = 400_000
+STANDARD_FREQ = 100_000
+DEFAULT_TIMEOUT_US = 50_000
+NACK_ERRNOS = (5, 19)  # EIO, ENODEV: nothing acked the address or a byte
+
+
+def open_bus(scl, sda, freq=FAST_FREQ, timeout_us=DEFAULT_TIMEOUT_US, expected=(), bus_id=HARD_I2C_ID):
+    '''
+    an I2CBus on the hardware i2c controller when the port has one for these pins, on
+    SoftI2C otherwise. the hardware bus is also given up when a scan doesn't find all of
+    the expected addresses on it.
+    '''
+    try:
+        i2c = I2C(bus_id, scl=scl, sda=sda, freq=freq, timeout=timeout_us)
+        found = i2c.scan()
+        missing = [address for address in expected if address not in found]
+        if not missing:
+            return I2CBus(i2c, "I2C", freq)
+        print("Hardware i2c doesn't see {}, using SoftI2C".format([hex(address) for address in missing]))
+    except Exception as e:
+        print("No hardware i2c on these pins, using SoftI2C: ", e)
+    return I2CBus(SoftI2C(scl=scl, sda=sda, freq=freq, timeout=timeout_us), "SoftI2C", freq)
+
+
+class DeviceStats:
+    def __init__(self):
+        self.transactions = 0
+        self.nacks = 0  # e.g. the AM2320 ignoring its wake up write, see NACK_ERRNOS
+        self.errors = 0  # every other bus error, timeouts mostly
+        self.total_us = 0
+        self.max_us = 0
+        self.contended = 0  # transactions that had to wait for another thread's
+        self.waited_us = 0
+
+    def mean_us(self):
+        if not self.transactions:
+            return 0
+        return self.total_us // self.transactions
+
+    def __repr__(self):
+        return "{} transactions, mean {} us, max {} us, {} nacks, {} errors, {} contended ({} us waiting)".format(
+            self.transactions, self.mean_us(), self.max_us, self.nacks, self.errors, self.contended, self.waited_us)
+
+
+class I2CBus:
+    '''
+    the one way onto the i2c bus: the same transaction methods as machine.I2C, so
+    drivers take it in place of the bus, but serialized between threads and timed,
+    with latency and error counts kept per device address.
+
+    submit() queues a driver operation and run() does everything queued as one batch.
+    an operation is a callable or a generator that yields how many us it has to wait
+    between transactions (a sensor waking up or converting); run() does the other
+    operations' transactions during that wait instead of sleeping it away.
+    '''
+
+    def __init__(self, i2c, kind, freq):
+        self.i2c = i2c
+        self.kind = kind
+        self.freq = freq
+        self.stats = {}
+        self.batches = 0
+        self.last_batch_us = 0
+        self.max_batch_us = 0
+        self.__lock = allocate_lock() if allocate_lock else None
+        self.__queue = []
+
+    def device_stats(self, address):
+        stats = self.stats.get(address)
+        if stats is None:
+            stats = DeviceStats()
+            self.stats[address] = stats
+        return stats
+
+    def __begin(self, address):
+        lock = self.__lock
+        if lock is not None and not lock.acquire(0):
+            waiting_since = ticks_us()
+            lock.acquire()
+            stats = self.device_stats(address)
+            stats.contended += 1
+            stats.waited_us += ticks_diff(ticks_us(), waiting_since)
+        return ticks_us()
+
+    def __end(self, address, start, error):
+        took = ticks_diff(ticks_us(), start)
+        if self.__lock is not None:
+            self.__lock.release()
+        stats = self.device_stats(address)
+        stats.transactions += 1
+        stats.total_us += took
+        if took > stats.max_us:
+            stats.max_us = took
+        if error is not None:
+            if error.args and error.args[0] in NACK_ERRNOS:
+                stats.nacks += 1
+            else:
+                stats.errors += 1
+
+    def scan(self):
+        return self.i2c.scan()
+
+    def writeto(self, address, buf, stop=True):
+        start = self.__begin(address)
+        error = None
+        try:
+            return self.i2c.writeto(address, buf, stop)
+        except OSError as e:
+            error = e
+            raise
+        finally:
+            self.__end(address, start, error)
+
+    def readfrom_into(self, address, buf, stop=True):
+        start = self.__begin(address)
+        error = None
+        try:
+            self.i2c.readfrom_into(address, buf, stop)
+        except OSError as e:
+            error = e
+            raise
+        finally:
+            self.__end(address, start, error)
+
+    def writeto_mem(self, address, memaddr, buf, addrsize=8):
+        start = self.__begin(address)
+        error = None
+        try:
+            self.i2c.writeto_mem(address, memaddr, buf, addrsize=addrsize)
+        except OSError as e:
+            error = e
+            raise
+        finally:
+            self.__end(address, start, error)
+
+    def readfrom_mem_into(self, address, memaddr, buf, addrsize=8):
+        start = self.__begin(address)
+        error = None
+        try:
+            self.i2c.readfrom_mem_into(address, memaddr, buf, addrsize=addrsize)
+        except OSError as e:
+            error = e
+            raise
+        finally:
+            self.__end(address, start, error)
+
+    def readfrom_mem(self, address, memaddr, nbytes, addrsize=8):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(address, memaddr, buf, addrsize)
+        return buf
+
+    def submit(self, name, operation):
+        ''' queue operation for the next run(); name is what its failure is reported under '''
+        self.__queue.append((name, operation))
+
+    def run(self):
+        '''
+        do every queued operation, interleaving them while any of them waits: each
+        generator gets its first transactions in, the callables run during those waits,
+        then whichever generator is due next goes on. returns [(name, exception)] for
+        the operations that raised; the others still finish.
+        '''
+        queue = self.__queue
+        self.__queue = []
+        failures = []
+        batch_start = ticks_us()
+        waiting = []  # [generator, name, resume at ticks_us]
+        for name, operation in queue:
+            if not callable(operation):
+                step = [operation, name, batch_start]
+                waiting.append(step)
+                I2CBus.__advance(step, waiting, failures)
+        for name, operation in queue:
+            if callable(operation):
+                try:
+                    operation()
+                except Exception as e:
+                    failures.append((name, e))
+        while waiting:
+            now = ticks_us()
+            soonest = waiting[0]
+            for step in waiting:
+                if ticks_diff(step[2], soonest[2]) < 0:
+                    soonest = step
+            wait = ticks_diff(soonest[2], now)
+            if wait > 0:
+                sleep_us(wait)  # every operation is waiting, nothing else to put on the bus
+            I2CBus.__advance(soonest, waiting, failures)
+        self.batches += 1
+        self.last_batch_us = ticks_diff(ticks_us(), batch_start)
+        if self.last_batch_us > self.max_batch_us:
+            self.max_batch_us = self.last_batch_us
+        return failures
+
+    @staticmethod
+    def __advance(step, waiting, failures):
+        ''' run a generator's transactions up to its next wait, or drop it when it's done '''
+        try:
+            step[2] = ticks_add(ticks_us(), next(step[0]))
+        except StopIteration:
+            waiting.remove(step)
+        except Exception as e:
+            failures.append((step[1], e))
+            waiting.remove(step)
+
+    def __repr__(self):
+        lines = ["{} at {} Hz, {} batches, last {} us, max {} us".format(
+            self.kind, self.freq, self.batches, self.last_batch_us, self.max_batch_us)]
+        for address in sorted(self.stats):
+            lines.append("  {}: {}".format(hex(address), self.stats[address]))
+        return "\n".join(lines)
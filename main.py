@@ -1,21 +1,36 @@
 from sys import version
+import micropython
 from neopixel import NeoPixel
 from network import WLAN, STA_IF
 from onewire import OneWire
 from ds18x20 import DS18X20
-from machine import Pin, Timer, RTC, ADC, SoftI2C
-from time import ticks_ms, ticks_diff, sleep_ms, time, mktime
+from machine import Pin, RTC, ADC
+from time import ticks_ms, ticks_diff, time, mktime
 import weather
 from base64 import b64decode
 from ujson import load
 from am2320 import AM2320
-from mpl3115a2 import MPL3115A2
+from mpl3115a2 import MPL3115A2, MPL3115A2exception
+from ds18b20_scheduler import DS18B20Scheduler
+import i2c_bus
+from wind_vane import WindVane
+from sensor_health import SensorHealth, STATES
+from periodic import Periodic, run_periodic, run_periodic_blocking
+from upload_worker import UploadWorker
+from wifi_supervisor import WifiSupervisor, EVENT_UP, EVENT_DOWN, EVENT_FAILED
+import uasyncio as asyncio
+from ring_buffer import SampleRing, round_div
 import time_utils
 import api_utils
+try:
+    import _thread
+except ImportError:
+    _thread = None
 
 print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
 print("RPi-Pico MicroPython Ver:", version)
 print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+micropython.alloc_emergency_exception_buf(100)  # lets an exception in a hard irq handler be reported
 
 CONFIG_FILE = "conf/config.json"
 TEMPERATURE_SENSOR_IN_PIN = 19
@@ -25,27 +40,42 @@ WIND_SPD_SENSOR_IN_PIN = 6
 RAIN_CNT_SENSOR_IN_PIN = 5
 I2C_SCL_PIN = 3
 I2C_SDA_PIN = 2
-I2C_FREQ = 100_000
+I2C_FREQ = 100_000  # the AM2320 is only rated for 100 kHz, the MPL3115A2 alone could use i2c_bus.FAST_FREQ
 I2C_TIMEOUT = 50_000
 RAIN_UNITS = "in"
 TEMPERATURE_UNITS = "F"
 SPEED_UNITS = "MPH"
+FIXED_POINT = False  # True keeps readings as scaled ints, see weather.Weather
+WIND_DIR_BURST_SAMPLES = 16  # adc readings per wind direction sample, the modal sector is kept
+PRESSURE_FIFO_STEP = 0  # the barometer samples every 2**step s into its fifo; None reads it once per sample
+SAMPLING_THREAD = False  # True reads the sensors on a _thread of their own, on the second core where there is one
+SAMPLING_STACK_SIZE = 8 * 1024
+SAMPLE_QUEUE_LENGTH = 16  # samples the sampling thread can get ahead of the main loop, a power of two
+VERBOSE = False  # True prints the buses', sensors', tasks' and uploads' counters after every update
 # WIFI_MODE = 3
 HOURLY = 3_600_000  # milliseconds
-# WIFI_CHECK_PERIOD = HOURLY
 SECOND_PERIOD = 1000
 DATA_POINT_CHECK_PERIOD = 5 * SECOND_PERIOD
 MINUTE_PERIOD = 60 * SECOND_PERIOD
 WEATHER_UPDATE_PERIOD = 2 * MINUTE_PERIOD
+WIFI_CHECK_PERIOD = SECOND_PERIOD  # a poll of the supervisor, it only reconnects on its own backoff
+TIME_SYNC_CHECK_PERIOD = MINUTE_PERIOD
+SAMPLE_HANDOFF_PERIOD = SECOND_PERIOD  # how often the main loop adds what the sampling thread queued
 UPDATES_PER_HOUR = int(HOURLY / WEATHER_UPDATE_PERIOD)
 DATA_POINTS_PER_UPDATE = int(WEATHER_UPDATE_PERIOD / DATA_POINT_CHECK_PERIOD)
 DEFAULT_TIME_API_HOST = "worldtimeapi.org"
 DEFAULT_TIME_API_PATH = "/api/timezone/America/New_York"
 NUM_RGB_LEDS = 1
 LED_POSITION = NUM_RGB_LEDS - 1
-NUM_TEMP_SENSORS = 1
-TEMP_SENSOR_POSITION = NUM_TEMP_SENSORS - 1
 N_RAIN_RESET_TIME_TO_REMEMBER = 5
+# the fields of a sample record, the sensor health ones are indexes into sensor_health.STATES
+SAMPLE_HUMIDITY = 0
+SAMPLE_WIND_DIR = 1
+SAMPLE_TEMPERATURE = 2
+SAMPLE_PRESSURE = 3
+SAMPLE_HUMIDITY_HEALTH = 4
+SAMPLE_PRESSURE_HEALTH = 5
+SAMPLE_WIDTH = 6
 
 temp_sensor_pin = Pin(TEMPERATURE_SENSOR_IN_PIN)
 wind_dir_pin = ADC(Pin(WIND_DIR_SENSOR_IN_PIN))
@@ -58,26 +88,40 @@ rtc = RTC()
 wlan = WLAN(STA_IF)
 wlan.active(True)
 wind_dir_pin.atten(ADC.ATTN_11DB)
-i2c = SoftI2C(scl=i2c_scl_pin, sda=i2c_sda_pin, freq=I2C_FREQ, timeout=I2C_TIMEOUT)
-humidity_sensor = None
-pressure_sensor = None
-try:
-    humidity_sensor = AM2320(i2c)
-    pressure_sensor = MPL3115A2(i2c, mode=MPL3115A2.PRESSURE)
-except Exception as e:
-    print("Problem initializing an i2c device: ", e)
+wind_vane = WindVane(wind_dir_pin, WIND_DIR_BURST_SAMPLES, \
+    weather.WIND_DIRECTION_NAMES.index(weather.DEFAULT_WIND_DIRECTION))
+i2c = i2c_bus.open_bus(i2c_scl_pin, i2c_sda_pin, I2C_FREQ, I2C_TIMEOUT, expected=(MPL3115A2.MPL3115_I2CADDR,))
+
+def init_humidity_sensor():
+    return AM2320(i2c)
+
+def init_pressure_sensor():
+    sensor = MPL3115A2(i2c, mode=MPL3115A2.PRESSURE)
+    if PRESSURE_FIFO_STEP is not None:
+        try:
+            sensor.enable_fifo(PRESSURE_FIFO_STEP)
+        except Exception as e:
+            print("Problem enabling the pressure sensor's fifo, reading it directly: ", e)
+    return sensor
+
+# each sensor is made on its first due() and made again after it's been backed off
+humidity_health = SensorHealth("humidity sensor", init_humidity_sensor)
+pressure_health = SensorHealth("pressure sensor", init_pressure_sensor)
 temp_sensor = DS18X20(OneWire(temp_sensor_pin))
-roms = temp_sensor.scan()
+temp_probes = DS18B20Scheduler(temp_sensor)  # scans the bus once
 weather_obj = weather.Weather(TEMPERATURE_UNITS, SPEED_UNITS, RAIN_UNITS, UPDATES_PER_HOUR, \
-    DATA_POINTS_PER_UPDATE)
+    DATA_POINTS_PER_UPDATE, FIXED_POINT)
+uploader = UploadWorker()  # the network requests run on their own thread, sampling never waits on them
 
 def set_time():
+    ''' runs on the upload thread '''
+    global time_synced_at
     time_utils.query_time_api(
         time_settings().get("host", DEFAULT_TIME_API_HOST),
         time_settings().get("path", DEFAULT_TIME_API_PATH),
         rtc
     )
-    return get_wifi_conn_status(wlan.isconnected(), False)
+    time_synced_at = ticks_ms()
 
 def read_config_file(filename):
     json_data = None
@@ -97,6 +141,18 @@ def weather_settings():
 def database_settings():
     return config.get("database_api", {})
 
+def wind_vane_settings():
+    return config.get("wind_vane", {})
+
+def station_settings():
+    return config.get("station", {})
+
+def load_wind_dir_calibration():
+    try:
+        weather_obj.set_wind_dir_calibration(wind_vane_settings().get("calibration"))
+    except Exception as e:
+        print("Problem loading the wind vane calibration, using the default: ", e)
+
 def wifi_led_red():
     wifi_indicator[LED_POSITION] = (2, 0, 0)  # dim red
     wifi_indicator.write()
@@ -109,32 +165,43 @@ def init_wlan():
     wlan.active(True)
     wlan.config(dhcp_hostname=wifi_settings().get("hostname", "esp32-default-host"))
 
-def connect_wifi():
-    print("Attempting to connect to wifi AP!")
+def make_wifi_supervisor():
     ssid = b64decode(bytes(wifi_settings().get("ssid", ""), 'utf-8'))
     password = b64decode(bytes(wifi_settings().get("password", ""), 'utf-8'))
-    connection_status = wlan.isconnected()
-    if not connection_status:
-        wlan.connect(ssid.decode("utf-8"), password.decode("utf-8"))
-        while not wlan.isconnected():
-            pass
-        connection_status = wlan.isconnected()
-    if connection_status:
-        print("Successfully connected to the wifi AP!")
-    return connection_status
-
-def get_wifi_conn_status(conn_status, bool_query_time):
-    if conn_status:
-        wifi_led_green()
-        if bool_query_time:
-            conn_status = set_time()
-    else:
-        wifi_led_red()
-        print("sorry, cant connect to wifi AP! connection --> {}".format(conn_status))
-    return conn_status
+    supervisor = WifiSupervisor(wlan, ssid.decode("utf-8"), password.decode("utf-8"))
+    supervisor.add_hook(EVENT_UP, on_wifi_up)
+    supervisor.add_hook(EVENT_DOWN, on_wifi_down)
+    supervisor.add_hook(EVENT_FAILED, on_wifi_failed)
+    return supervisor
+
+def on_wifi_up(supervisor):
+    global pending_weather_data
+    print("Successfully connected to the wifi AP! rssi {} dBm".format(supervisor.rssi))
+    wifi_led_green()
+    check_time_sync()  # set the rtc as soon as the link is up
+    if pending_weather_data is not None:
+        upload_weather_data(pending_weather_data)  # the last update made while the link was down
+        pending_weather_data = None
+
+def on_wifi_down(supervisor):
+    wifi_led_red()
+    print("Lost the wifi AP, reconnecting. {}".format(repr(supervisor)))
+
+def on_wifi_failed(supervisor):
+    wifi_led_red()
+    print("sorry, cant connect to wifi AP! connection --> {}, trying again within {} s".format(
+        supervisor.last_failure, supervisor.backoff_ms // 1000))
+
+def check_time_sync():
+    ''' set the rtc once the link is up, then again once a day in the midnight hour '''
+    if not wifi.is_up():
+        return
+    if time_synced_at is None or (rtc.datetime()[4] == 0 and ticks_diff(ticks_ms(), time_synced_at) > HOURLY):
+        uploader.submit("time api", set_time)
 
 def reset_rain_counter_daily():
     weather_obj.reset_daily_rain_count()
+    weather_obj.close_rollup_day()
     save_rain_reset_time(rtc.datetime())
 
 def save_rain_reset_time(current_time):
@@ -142,7 +209,7 @@ def save_rain_reset_time(current_time):
     rain_reset_list.pop(0)
 
 def update_weather_metrics():
-    global weather_update_time
+    global weather_update_time, pending_weather_data
     weather_obj.set_wind_direction(weather_obj.calculate_avg_wind_dir())
     weather_obj.set_temperature(weather_obj.average_data_points(weather_obj.get_temperature_list()))
     weather_obj.set_humidity(weather_obj.average_data_points(weather_obj.get_humidity_list()))
@@ -150,41 +217,114 @@ def update_weather_metrics():
     weather_obj.set_pressure(weather_obj.average_data_points(weather_obj.get_pressure_list()))
     delta_t_s = int(ticks_diff(ticks_ms(), weather_update_time) / 1000)  # convert to seconds
     weather_obj.set_wind_speed(weather_obj.calculate_avg_wind_speed(delta_t_s))
-    weather_obj.set_rain_count_hourly(weather_obj.calculate_hourly_rain())
-    weather_obj.rotate_hourly_rain_buckets()
+    weather_obj.check_rain_tips()
+    weather_obj.set_rain_count_hourly(weather_obj.calculate_hourly_rain(ticks_ms()))
+    weather_obj.set_rain_rate(weather_obj.calculate_rain_rate(ticks_ms()))
+    weather_obj.close_rollup_period()
     weather_update_time = ticks_ms()
-    if get_wifi_conn_status(wlan.isconnected(), False):
-        web_weather_update()
-        database_weather_update()
+    # the upload thread serializes the snapshot, the next samples only change weather_obj
+    weather_data = weather_obj.publish()
+    if wifi.is_up():
+        upload_weather_data(weather_data)
+    else:
+        pending_weather_data = weather_data  # sent as soon as the link is back
+        print("sorry, no wifi AP to upload to, keeping this update until it's back")
     print(repr(weather_obj))
+    if VERBOSE:
+        print_diagnostics()
     weather_obj.reset_wind_gust()
 
+def print_diagnostics():
+    print(repr(i2c))
+    print(repr(wind_vane))
+    print(repr(humidity_health))
+    print(repr(pressure_health))
+    print(repr(uploader))
+    print(repr(api_utils.session))
+    print(repr(sampling))
+    if sample_queue is not None:
+        print("sample queue: {}".format(repr(sample_queue)))
+    print(repr(wifi))
+    print("anemometer: {}, rain gauge: {}".format(repr(wind_pulses), repr(rain_tips)))
+
+def upload_weather_data(weather_data):
+    uploader.submit("wunderground", web_weather_update, weather_data)
+    uploader.submit("telegraf", database_weather_update, weather_data)
+
+def aggregate_weather():
+    global rain_needs_reset_at_midnight
+    if sample_queue is not None:
+        add_queued_samples()  # every sample taken so far is in this update
+    print("updating weather. daily rain resets were: {}".format(str(rain_reset_list)))
+    update_weather_metrics()
+    if time_synced_at is None:
+        return  # the rtc's hour means nothing yet
+    # check to see if its midnight with rtc.datetime()[4] as it returns the current hour
+    if rtc.datetime()[4] == 0:
+        if rain_needs_reset_at_midnight:
+            reset_rain_counter_daily()
+            rain_needs_reset_at_midnight = False
+    else:
+        # here's where it just stopped being the zeroth hour so now we set needs reset to true again
+        if not rain_needs_reset_at_midnight:
+            rain_needs_reset_at_midnight = True
+
 def average_sensor_temperatures():
     possible_temperatures = []
-    if humidity_sensor:
-        possible_temperatures.append(try_read_sensor_catch_e("humidity sensor - temperature", humidity_sensor.temperature))
+    if humidity_health.good():
+        humidity_sensor = humidity_health.sensor
+        possible_temperatures.append(try_read_sensor_catch_e("humidity sensor - temperature", \
+            humidity_sensor.temperature_centi if FIXED_POINT else humidity_sensor.temperature))
         # print("humidity sensor's temperature reading: {}".format(possible_temperatures[-1]))
-    if pressure_sensor:
-        possible_temperatures.append(try_read_sensor_catch_e("pressure sensor - temperature", pressure_sensor.temperature))
+    if pressure_health.good():
+        possible_temperatures.append(try_read_sensor_catch_e("pressure sensor - temperature", \
+            pressure_sensor_temperature_reader()))
         # print("pressure sensor's temperature reading: {}".format(possible_temperatures[-1]))
     possible_temperatures.append(try_read_sensor_catch_e("temperature sensor", read_temp_sensors_value))
     # print("temperature sensor's temperature reading: {}".format(possible_temperatures[-1]))
-    temperatures = [temp for temp in possible_temperatures if temp]
+    temperatures = [temp for temp in possible_temperatures if temp is not None]
     if temperatures:
+        if FIXED_POINT:
+            return round_div(sum(temperatures), len(temperatures))
         return sum(temperatures) / len(temperatures)
     else:
-        return 0.0
+        return 0 if FIXED_POINT else 0.0
 
-def get_temperature(initial_reading=False):
+def get_temperature():
     try:
-        temp_sensor.convert_temp()
-        if initial_reading:
-            sleep_ms(1000)
-            return read_temp_sensors_value()
+        # reads the conversion the last sample started and starts the next one, never waits
+        temp_probes.tick()
     except Exception as e:
         print_sensor_read_error("temperature sensor - convert_temp function", e)
     return average_sensor_temperatures()
 
+def sample_pressure_sensor():
+    '''
+    one bus read of the barometer per sample: drain its fifo, or read pressure and
+    temperature together so both of the sample's values come from the same conversion
+    '''
+    pressure_sensor = pressure_health.sensor
+    if pressure_sensor.state == MPL3115A2.STATE_FAILED:
+        pressure_sensor.restart()  # start over instead of never reading the barometer again
+        raise MPL3115A2exception("no conversion within {} ms".format(pressure_sensor.ready_timeout_ms))
+    if pressure_sensor.fifo:
+        pressure_sensor.drain_fifo()
+    else:
+        pressure_sensor.read_all()
+
+def pressure_sensor_temperature_reader():
+    pressure_sensor = pressure_health.sensor
+    if pressure_sensor.fifo:
+        # mean of the samples the sensor took since the last drain
+        return pressure_sensor.fifo_mean_temperature_centi if FIXED_POINT else pressure_sensor.fifo_mean_temperature
+    return pressure_sensor.last_temperature_centi if FIXED_POINT else pressure_sensor.last_temperature
+
+def pressure_sensor_pressure_reader():
+    pressure_sensor = pressure_health.sensor
+    if pressure_sensor.fifo:
+        return pressure_sensor.fifo_mean_pressure_pa if FIXED_POINT else pressure_sensor.fifo_mean_pressure
+    return pressure_sensor.last_pressure_pa if FIXED_POINT else pressure_sensor.last_pressure
+
 def try_read_sensor_catch_e(sensor, func):
     try:
         return func()
@@ -193,50 +333,132 @@ def try_read_sensor_catch_e(sensor, func):
     return None
 
 def read_temp_sensors_value():
-    return temp_sensor.read_temp(roms[TEMP_SENSOR_POSITION])
+    temperature = temp_probes.mean()  # of every probe on the bus that could be read
+    if temperature is None:
+        return None
+    if FIXED_POINT:
+        return round(temperature * weather.CENTI)  # the ds18x20 driver only gives floats
+    return temperature
 
 def print_sensor_read_error(sensor, error):
     print("There was an error reading from the {}. {}".format(sensor, error))
 
+# the irq handlers only store a ticks_ms() stamp, converting tips and pulses to units is
+# left to the sampling task and the drain the wind PulseBuffer schedules
 def rain_counter_isr(irq):
-    weather_obj.increment_rain()
+    record_rain_tip(ticks_ms())  # PulseBuffer debounces the bucket's reed switch
 
 def wind_speed_isr(irq):
-    global wind_speed_last_intrpt  # software debounce mechanical reed switch
-    if ticks_diff(ticks_ms(), wind_speed_last_intrpt) > 5:  # no less than 5ms between pulses
-        wind_speed_last_intrpt = ticks_ms()
-        weather_obj.add_wind_speed_pulse()
-
-def record_weather_data_points(timer):
-    global gust_start_timer
-    if humidity_sensor:
-        try_read_sensor_catch_e("humidity sensor - measure", humidity_sensor.measure)
-        weather_obj.add_humidity_reading(try_read_sensor_catch_e("humidity sensor", humidity_sensor.humidity))
-    weather_obj.add_wind_dir_reading(wind_dir_pin.read())
-    weather_obj.add_temperature_reading(get_temperature())
-    if pressure_sensor:
-        weather_obj.add_pressure_reading(try_read_sensor_catch_e("pressure sensor", pressure_sensor.pressure))
-    gust_start_timer = weather_obj.check_wind_gust(gust_start_timer)
-
-def web_weather_update():
+    record_wind_pulse(ticks_ms())  # PulseBuffer debounces the mechanical reed switch
+
+def attach_pulse_irq(pin, handler):
+    '''
+    as a hard irq the handler stamps the edge when it happens; a soft one waits its turn
+    behind the running python code in a scheduler queue that only holds a few
+    '''
+    try:
+        pin.irq(trigger=Pin.IRQ_RISING, handler=handler, hard=True)
+    except (TypeError, ValueError):
+        print("No hard irq on {}, using a soft one".format(pin))
+        pin.irq(trigger=Pin.IRQ_RISING, handler=handler)
+
+def sample_i2c_sensors():
+    '''
+    both i2c sensors in one batch on the bus: the barometer is read while the AM2320
+    takes the 2 ms it needs between its request and its reply
+    '''
+    sampled = []
+    if humidity_health.due():
+        i2c.submit(humidity_health, humidity_health.sensor.measure_steps())
+        sampled.append(humidity_health)
+    if pressure_health.due():
+        i2c.submit(pressure_health, sample_pressure_sensor)
+        sampled.append(pressure_health)
+    errors = dict(i2c.run())
+    for health in sampled:
+        if health in errors:
+            health.failed(errors[health])
+        else:
+            health.succeeded()
+
+def take_sample(sample):
+    '''
+    read the sensors into the sample record. weather_obj is left to add_sample(), so
+    this can run on the sampling thread while the main loop aggregates and uploads
+    '''
+    sample_i2c_sensors()
+    humidity = None
+    if humidity_health.good():
+        humidity_sensor = humidity_health.sensor
+        humidity = try_read_sensor_catch_e("humidity sensor", \
+            humidity_sensor.humidity_centi if FIXED_POINT else humidity_sensor.humidity)
+    sample[SAMPLE_HUMIDITY] = humidity
+    sample[SAMPLE_WIND_DIR] = wind_vane.read_sector(weather_obj.get_wind_dir_table())
+    sample[SAMPLE_TEMPERATURE] = get_temperature()
+    pressure = None
+    if pressure_health.good():
+        pressure = try_read_sensor_catch_e("pressure sensor", pressure_sensor_pressure_reader())
+    sample[SAMPLE_PRESSURE] = pressure
+    sample[SAMPLE_HUMIDITY_HEALTH] = STATES.index(humidity_health.state())
+    sample[SAMPLE_PRESSURE_HEALTH] = STATES.index(pressure_health.state())
+
+def add_sample(sample):
+    ''' a sample record into weather_obj, along with the pulses and tips the irqs recorded meanwhile '''
+    weather_obj.set_sensor_health(api_utils.HUMIDITY_KEY, STATES[int(sample[SAMPLE_HUMIDITY_HEALTH])])
+    weather_obj.set_sensor_health(api_utils.PRESSURE_KEY, STATES[int(sample[SAMPLE_PRESSURE_HEALTH])])
+    weather_obj.add_humidity_reading(sample[SAMPLE_HUMIDITY])
+    weather_obj.add_wind_dir_index(int(sample[SAMPLE_WIND_DIR]))  # the queue's typed array hands it back as a float
+    weather_obj.add_temperature_reading(sample[SAMPLE_TEMPERATURE])
+    weather_obj.add_pressure_reading(sample[SAMPLE_PRESSURE])
+    weather_obj.check_wind_gust()
+    weather_obj.check_rain_tips()
+
+def record_weather_data_points():
+    take_sample(sample)
+    add_sample(sample)
+
+def queue_sample():
+    ''' on the sampling thread '''
+    take_sample(sample)
+    sample_queue.push(sample)
+
+def add_queued_samples():
+    while sample_queue.pop_into(queued_sample):
+        add_sample(queued_sample)
+
+def start_sampling_thread():
+    '''
+    the sensors are read on their own thread and the samples queued for the main loop,
+    which is all that touches weather_obj. None when there's no _thread or it's off.
+    '''
+    if not SAMPLING_THREAD or _thread is None:
+        return None
+    queue = SampleRing(SAMPLE_QUEUE_LENGTH, SAMPLE_WIDTH, "i" if FIXED_POINT else "f")
+    _thread.stack_size(SAMPLING_STACK_SIZE)
+    _thread.start_new_thread(run_periodic_blocking, (sampling, queue_sample))
+    return queue
+
+def web_weather_update(weather_data):
     creds = weather_settings().get("credentials", {})
     station_id = b64decode(bytes(creds.get("station_id", ""), 'utf-8'))
     station_key = b64decode(bytes(creds.get("station_key", ""), 'utf-8'))
-    api_utils.update_weather_api(
+    if api_utils.update_weather_api(
         weather_settings().get("host", ""),
         weather_settings().get("path", ""),
         station_id.decode("utf-8"),
         station_key.decode("utf-8"),
-        weather_obj.get_weather_data()
-    )
+        weather_data
+    ):
+        wifi.uploaded()
 
-def database_weather_update():
-    api_utils.send_json_to_telegraf_api(
+def database_weather_update(weather_data):
+    if api_utils.send_json_to_telegraf_api(
         database_settings().get("host", ""),
         database_settings().get("port", 8080),
         database_settings().get("path", ""),
-        weather_obj.get_weather_data()
-    )
+        weather_data
+    ):
+        wifi.uploaded()
 
 # def ms_until_midnight():
 #     '''
@@ -248,37 +470,51 @@ def database_weather_update():
 #     midnight_seconds = mktime((now[0], now[1], now[2] + 1, 0, 0, 0, now[3] + 1, 0))
 #     return (midnight_seconds - time()) * 1000  # return in milliseconds
 
-connection = ""
+async def run_station():
+    '''
+    the station's tasks: sampling every DATA_POINT_CHECK_PERIOD, aggregation and the
+    uploads it hands to the upload thread every WEATHER_UPDATE_PERIOD, and the wifi
+    and time sync checks. each is on its own deadline grid, none of them blocks.
+    with the sampling thread running, the sampling task only adds what it queued.
+    '''
+    if sample_queue is None:
+        sampling_task = run_periodic(sampling, record_weather_data_points)
+    else:
+        sampling_task = run_periodic(sample_handoff, add_queued_samples)
+    await asyncio.gather(
+        sampling_task,
+        run_periodic(aggregation, aggregate_weather),
+        run_periodic(wifi_supervision, wifi.poll),
+        run_periodic(time_sync, check_time_sync)
+    )
+
+time_synced_at = None
+pending_weather_data = None
 wifi_led_red()
 config = read_config_file(CONFIG_FILE)
-data_check_timer = Timer(2)
+load_wind_dir_calibration()
+weather_obj.set_altitude(station_settings().get("altitude_m", 0))
 init_wlan()
-connection = get_wifi_conn_status(connect_wifi(), True)
+wifi = make_wifi_supervisor()  # connects on its first poll
 # create an n-long list of 8-tuples
 rain_needs_reset_at_midnight = True
 rain_reset_list = [tuple([0]*8)] * N_RAIN_RESET_TIME_TO_REMEMBER
 
 begin_time = ticks_ms()
 weather_update_time = begin_time
-wind_speed_last_intrpt = begin_time
-gust_start_timer = begin_time
-rain_counter_pin.irq(trigger=Pin.IRQ_RISING, handler=rain_counter_isr)
-wind_speed_pin.irq(trigger=Pin.IRQ_RISING, handler=wind_speed_isr)
-data_check_timer.init(period=DATA_POINT_CHECK_PERIOD, mode=Timer.PERIODIC, callback=record_weather_data_points)
-trash_temperature_reading = get_temperature(initial_reading=True)
-del trash_temperature_reading  # first reading is always wrong so just put it in the garbage
-while True:
-    sleep_ms(100)
-    if ticks_diff(ticks_ms(), weather_update_time) > WEATHER_UPDATE_PERIOD:
-        print("updating weather. daily rain resets were: {}".format(str(rain_reset_list)))
-        update_weather_metrics()
-        # check to see if its midnight with rtc.datetime()[4] as it returns the current hour
-        if rtc.datetime()[4] is 0:
-            if rain_needs_reset_at_midnight:
-                reset_rain_counter_daily()
-                rain_needs_reset_at_midnight = False
-            connection = get_wifi_conn_status(connect_wifi(), True)
-        else:
-            # here's where it just stopped being the zeroth hour so now we set needs reset to true again
-            if not rain_needs_reset_at_midnight:
-                rain_needs_reset_at_midnight = True
+wind_pulses = weather_obj.wind_pulses
+rain_tips = weather_obj.rain_tips
+record_wind_pulse = wind_pulses.record  # bound once, not in every irq
+record_rain_tip = rain_tips.record
+attach_pulse_irq(rain_counter_pin, rain_counter_isr)
+attach_pulse_irq(wind_speed_pin, wind_speed_isr)
+try_read_sensor_catch_e("temperature sensor - convert_temp function", temp_probes.tick)  # first conversion, read by the first sample
+sample = [None] * SAMPLE_WIDTH  # filled by take_sample(), on the sampling thread when there is one
+queued_sample = [None] * SAMPLE_WIDTH
+sampling = Periodic("sampling", DATA_POINT_CHECK_PERIOD, DATA_POINT_CHECK_PERIOD)
+sample_handoff = Periodic("sample handoff", SAMPLE_HANDOFF_PERIOD)
+sample_queue = start_sampling_thread()
+aggregation = Periodic("aggregation", WEATHER_UPDATE_PERIOD, WEATHER_UPDATE_PERIOD)
+wifi_supervision = Periodic("wifi", WIFI_CHECK_PERIOD)
+time_sync = Periodic("time sync", TIME_SYNC_CHECK_PERIOD)
+asyncio.run(run_station())
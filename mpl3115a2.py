@@ -1,4 +1,4 @@
-import time
+from time import ticks_ms, ticks_diff
 
 class MPL3115A2exception(Exception):
     pass
@@ -19,7 +19,7 @@ class MPL3115A2:
     MPL3115_WHO_AM_I = const(0x0c)
     MPL3115_FIFO_STATUS = const(0x0d)
     MPL3115_FIFO_DATA = const(0x0e)
-    MPL3115_FIFO_SETUP = const(0x0e)
+    MPL3115_FIFO_SETUP = const(0x0f)
     MPL3115_TIME_DELAY = const(0x10)
     MPL3115_SYS_MODE = const(0x11)
     MPL3115_INT_SORCE = const(0x12)
@@ -42,56 +42,248 @@ class MPL3115A2:
     MPL3115_OFFSET_T = const(0x2c)
     MPL3115_OFFSET_H = const(0x2d)
 
-    def __init__(self, i2c, mode=PRESSURE):
+    OUT_SIZE = const(5)  # pressure msb, csb, lsb, temperature msb, lsb
+    FIFO_CAPACITY = const(32)
+    FIFO_SAMPLE_SIZE = const(5)  # same layout as the output registers
+    FIFO_MODE_CIRCULAR = const(0x40)  # F_SETUP F_MODE = 01, the oldest sample is overwritten when full
+    FIFO_COUNT_MASK = const(0x3f)
+    FIFO_OVERFLOW = const(0x80)
+    CTRL_REG1_PRESSURE = const(0x38)  # barometer mode, not raw, oversampling 128, minimum time 512 ms
+    CTRL_REG1_ALTITUDE = const(0xB8)  # altitude mode, not raw, oversampling 128, minimum time 512 ms
+    CTRL_REG1_ACTIVE = const(0x01)
+    PT_DATA_CFG_EVENTS = const(0x07)  # no events detected
+    DR_STATUS_PTDR = const(0x04)  # pressure/altitude or temperature data ready
+
+    STATE_STARTING = const(0)  # configured, waiting for the first conversion
+    STATE_READY = const(1)
+    STATE_FAILED = const(2)  # no conversion within ready_timeout_ms, see restart()
+    READY_TIMEOUT_MS = const(2000)
+
+    def __init__(self, i2c, mode=PRESSURE, ready_timeout_ms=READY_TIMEOUT_MS):
+        '''
+        only writes the configuration; nothing here waits for the sensor. poll() (or
+        wait_ready() from uasyncio) tells when the first conversion is done and until then
+        the readers return None.
+        '''
 
         self.i2c = i2c
         self.STA_reg = bytearray(1)
         self.mode = mode
+        # output registers 0x01-0x05, read in one transaction so pressure and temperature can't tear
+        self.out_buf = bytearray(OUT_SIZE)
+        out_view = memoryview(self.out_buf)
+        self.out_pressure_view = out_view[:3]
+        self.out_temperature_view = out_view[3:]
+        self.out_valid = False
+        self.fifo = False
+        self.fifo_count = 0
+        self.fifo_overflows = 0
+        self.fifo_buf = bytearray(FIFO_CAPACITY * FIFO_SAMPLE_SIZE)
+        fifo_view = memoryview(self.fifo_buf)
+        # a view per possible sample count so a drain doesn't have to slice
+        self.fifo_views = tuple(fifo_view[:count * FIFO_SAMPLE_SIZE] for count in range(FIFO_CAPACITY + 1))
+        self.fifo_step = 0
+        self.ready_timeout_ms = ready_timeout_ms
+        self.state = STATE_STARTING
+        self.state_since = ticks_ms()
+        self.set_mode(mode)
 
-        if self.mode is PRESSURE:
-            # barometer mode, not raw, oversampling 128, minimum time 512 ms
-            self.i2c.writeto_mem(MPL3115_I2CADDR, MPL3115_CTRL_REG1, bytes([0x38]))
-            self.i2c.writeto_mem(MPL3115_I2CADDR, MPL3115_PT_DATA_CFG, bytes([0x07]))  # no events detected
-            self.i2c.writeto_mem(MPL3115_I2CADDR, MPL3115_CTRL_REG1, bytes([0x39]))  # active
-        elif self.mode is ALTITUDE:
-            # altitude mode, not raw, oversampling 128, minimum time 512 ms
-            self.i2c.writeto_mem(MPL3115_I2CADDR, MPL3115_CTRL_REG1, bytes([0xB8]))
-            self.i2c.writeto_mem(MPL3115_I2CADDR, MPL3115_PT_DATA_CFG, bytes([0x07]))  # no events detected
-            self.i2c.writeto_mem(MPL3115_I2CADDR, MPL3115_CTRL_REG1, bytes([0xB9]))  # active
+    def set_mode(self, mode):
+        ''' switch between PRESSURE and ALTITUDE mode, returns without waiting for a conversion '''
+        if mode is PRESSURE:
+            self.ctrl_reg1 = CTRL_REG1_PRESSURE
+        elif mode is ALTITUDE:
+            self.ctrl_reg1 = CTRL_REG1_ALTITUDE
         else:
             raise MPL3115A2exception("Invalid Mode MPL3115A2")
+        self.mode = mode
+        self.restart()
 
-        if self._read_status():
-            pass
-        else:
-            raise MPL3115A2exception("Error with MPL3115A2")
+    def restart(self):
+        ''' write the configuration again and start waiting for a conversion, e.g. after poll() gave up '''
+        reg = self.STA_reg
+        reg[0] = self.ctrl_reg1  # standby, the mode, time step and fifo can only be changed in standby
+        self.i2c.writeto_mem(MPL3115_I2CADDR, MPL3115_CTRL_REG1, reg)
+        reg[0] = PT_DATA_CFG_EVENTS
+        self.i2c.writeto_mem(MPL3115_I2CADDR, MPL3115_PT_DATA_CFG, reg)
+        if self.fifo:
+            reg[0] = self.fifo_step & 0x0f
+            self.i2c.writeto_mem(MPL3115_I2CADDR, MPL3115_CTRL_REG2, reg)
+            reg[0] = FIFO_MODE_CIRCULAR
+            self.i2c.writeto_mem(MPL3115_I2CADDR, MPL3115_FIFO_SETUP, reg)
+        reg[0] = self.ctrl_reg1 | CTRL_REG1_ACTIVE
+        self.i2c.writeto_mem(MPL3115_I2CADDR, MPL3115_CTRL_REG1, reg)
+        self.out_valid = False
+        self.fifo_count = 0
+        self.state = STATE_STARTING
+        self.state_since = ticks_ms()
+
+    def poll(self):
+        '''
+        never blocks: True once the sensor has finished a conversion since it was last
+        configured. while it hasn't this reads the data ready flag once and returns False,
+        and after ready_timeout_ms the state becomes STATE_FAILED until restart().
+        '''
+        if self.state == STATE_READY:
+            return True
+        if self.state == STATE_FAILED:
+            return False
+        # DR_STATUS rather than STATUS, which aliases F_STATUS when the fifo is on
+        self.i2c.readfrom_mem_into(MPL3115_I2CADDR, MPL3115_DR_STATUS, self.STA_reg)
+        if self.STA_reg[0] & DR_STATUS_PTDR:
+            self.state = STATE_READY
+            return True
+        if ticks_diff(ticks_ms(), self.state_since) > self.ready_timeout_ms:
+            self.state = STATE_FAILED
+        return False
+
+    async def wait_ready(self, poll_ms=50):
+        ''' poll() from a uasyncio task until the sensor is ready, raises if it gives up '''
+        try:
+            from uasyncio import sleep_ms
+        except ImportError:
+            from asyncio import sleep
+            sleep_ms = lambda ms: sleep(ms / 1000)
+        while not self.poll():
+            if self.state == STATE_FAILED:
+                raise MPL3115A2exception("MPL3115A2 not ready after {} ms".format(self.ready_timeout_ms))
+            await sleep_ms(poll_ms)
+
+    def enable_fifo(self, step=0):
+        '''
+        have the sensor take a sample every 2**step seconds on its own and keep the
+        newest 32 in its fifo for drain_fifo(). with the fifo on, registers 0x01-0x05
+        read from the fifo, so use the fifo_* readers instead of pressure()/temperature().
+        '''
+        self.fifo = True
+        self.fifo_step = step
+        self.restart()
+
+    def drain_fifo(self):
+        '''
+        read every sample waiting in the fifo in one burst, returns how many there were.
+        0 while the sensor isn't ready yet.
+        '''
+        self.fifo_count = 0  # nothing stale is left to read if the bus errors out
+        if not self.poll():
+            return 0
+        self.i2c.readfrom_mem_into(MPL3115_I2CADDR, MPL3115_FIFO_STATUS, self.STA_reg)
+        status = self.STA_reg[0]
+        if status & FIFO_OVERFLOW:
+            self.fifo_overflows += 1  # samples were overwritten before being drained
+        count = min(status & FIFO_COUNT_MASK, FIFO_CAPACITY)
+        if count:
+            self.i2c.readfrom_mem_into(MPL3115_I2CADDR, MPL3115_FIFO_DATA, self.fifo_views[count])
+        self.fifo_count = count
+        return count
 
-    def _read_status(self):
-        while True:
-            self.i2c.readfrom_mem_into(MPL3115_I2CADDR, MPL3115_STATUS, self.STA_reg)
+    def fifo_pressure_quarters(self, i):
+        ''' pressure of drained sample i in quarters of a Pa '''
+        return MPL3115A2.pressure_quarters(self.fifo_buf, i * FIFO_SAMPLE_SIZE)
 
-            if(self.STA_reg[0] == 0):
-                time.sleep(0.01)
-                pass
-            elif(self.STA_reg[0] & 0x04) == 4:
-                return True
-            else:
-                return False
+    def fifo_temperature_256ths(self, i):
+        ''' temperature of drained sample i in 256ths of a degree C '''
+        return MPL3115A2.temperature_256ths(self.fifo_buf, i * FIFO_SAMPLE_SIZE + 3)
+
+    def _fifo_pressure_total(self):
+        total = 0
+        for i in range(self.fifo_count):
+            total += self.fifo_pressure_quarters(i)
+        return total
+
+    def _fifo_temperature_total(self):
+        total = 0
+        for i in range(self.fifo_count):
+            total += self.fifo_temperature_256ths(i)
+        return total
+
+    def fifo_mean_pressure(self):
+        ''' mean pressure in Pa of the last drained samples, None when there weren't any '''
+        if not self.fifo_count:
+            return None
+        return self._fifo_pressure_total() / (4 * self.fifo_count)
+
+    def fifo_mean_pressure_pa(self):
+        ''' fifo_mean_pressure() in whole Pa as an int, rounded '''
+        if not self.fifo_count:
+            return None
+        return (self._fifo_pressure_total() + 2 * self.fifo_count) // (4 * self.fifo_count)
+
+    def fifo_mean_temperature(self):
+        if not self.fifo_count:
+            return None
+        return self._fifo_temperature_total() / (256 * self.fifo_count)
+
+    def fifo_mean_temperature_centi(self):
+        ''' fifo_mean_temperature() in hundredths of a degree C as an int '''
+        if not self.fifo_count:
+            return None
+        return (self._fifo_temperature_total() * 100) // (256 * self.fifo_count)
+
+    def read_all(self):
+        '''
+        pressure in Pa and temperature in C from the same conversion, read in one transaction
+        into a reused buffer. the last_* readers return them again without touching the bus.
+        None while the sensor isn't ready yet.
+        '''
+        if self.mode == ALTITUDE:
+            raise MPL3115A2exception("Incorrect Measurement Mode MPL3115A2")
+        self.out_valid = False
+        if not self.poll():
+            return None
+        self.i2c.readfrom_mem_into(MPL3115_I2CADDR, MPL3115_PRESSURE_DATA_MSB, self.out_buf)
+        self.out_valid = True
+        return self.last_pressure(), self.last_temperature()
+
+    def last_pressure(self):
+        ''' pressure of the last read_all() in Pa, None if it failed '''
+        if not self.out_valid:
+            return None
+        return MPL3115A2.pressure_quarters(self.out_buf, 0) / 4.0
+
+    def last_pressure_pa(self):
+        ''' last_pressure() in whole Pa as an int, the fractional quarter Pa bits are dropped '''
+        if not self.out_valid:
+            return None
+        return MPL3115A2.pressure_quarters(self.out_buf, 0) >> 2
+
+    def last_temperature(self):
+        if not self.out_valid:
+            return None
+        return MPL3115A2.temperature_256ths(self.out_buf, 3) / 256.0
+
+    def last_temperature_centi(self):
+        ''' last_temperature() in hundredths of a degree C as an int '''
+        if not self.out_valid:
+            return None
+        return (MPL3115A2.temperature_256ths(self.out_buf, 3) * 100) >> 8
 
     def pressure(self):
         if self.mode == ALTITUDE:
             raise MPL3115A2exception("Incorrect Measurement Mode MPL3115A2")
+        if not self.poll():
+            return None
+
+        self.i2c.readfrom_mem_into(MPL3115_I2CADDR, MPL3115_PRESSURE_DATA_MSB, self.out_pressure_view)
 
-        out_pressure = self.i2c.readfrom_mem(MPL3115_I2CADDR, MPL3115_PRESSURE_DATA_MSB, 3)
+        return MPL3115A2.pressure_quarters(self.out_buf, 0) / 4.0
 
-        pressure_int = (out_pressure[0] << 10) + (out_pressure[1] << 2) + ((out_pressure[2] >> 6) & 0x3)
-        pressure_frac = (out_pressure[2] >> 4) & 0x03
+    def pressure_pa(self):
+        ''' pressure in whole Pa as an int, the fractional quarter Pa bits are dropped '''
+        if self.mode == ALTITUDE:
+            raise MPL3115A2exception("Incorrect Measurement Mode MPL3115A2")
+        if not self.poll():
+            return None
 
-        return float(pressure_int + pressure_frac / 4.0)
+        self.i2c.readfrom_mem_into(MPL3115_I2CADDR, MPL3115_PRESSURE_DATA_MSB, self.out_pressure_view)
+
+        return MPL3115A2.pressure_quarters(self.out_buf, 0) >> 2
 
     def altitude(self):
         if self.mode == PRESSURE:
             raise MPL3115A2exception("Incorrect Measurement Mode MPL3115A2")
+        if not self.poll():
+            return None
 
         out_alt = self.i2c.readfrom_mem(MPL3115_I2CADDR, MPL3115_PRESSURE_DATA_MSB, 3)
 
@@ -104,13 +296,29 @@ class MPL3115A2:
         return float(alt_int + alt_frac / 16.0)
 
     def temperature(self):
-        OUT_T_MSB = self.i2c.readfrom_mem(MPL3115_I2CADDR, MPL3115_TEMP_DATA_MSB, 1)
-        OUT_T_LSB = self.i2c.readfrom_mem(MPL3115_I2CADDR, MPL3115_TEMP_DATA_LSB, 1)
+        if not self.poll():
+            return None
+        self.i2c.readfrom_mem_into(MPL3115_I2CADDR, MPL3115_TEMP_DATA_MSB, self.out_temperature_view)
+
+        return MPL3115A2.temperature_256ths(self.out_buf, 3) / 256.0
 
-        temp_int = OUT_T_MSB[0]
-        temp_frac = OUT_T_LSB[0]
+    def temperature_centi(self):
+        ''' temperature in hundredths of a degree C as an int '''
+        if not self.poll():
+            return None
+        self.i2c.readfrom_mem_into(MPL3115_I2CADDR, MPL3115_TEMP_DATA_MSB, self.out_temperature_view)
 
+        return (MPL3115A2.temperature_256ths(self.out_buf, 3) * 100) >> 8
+
+    @staticmethod
+    def pressure_quarters(buf, offset):
+        ''' 20 bit pressure (msb, csb, lsb) at offset in quarters of a Pa '''
+        return buf[offset] << 12 | buf[offset + 1] << 4 | buf[offset + 2] >> 4
+
+    @staticmethod
+    def temperature_256ths(buf, offset):
+        ''' signed 12 bit temperature (msb, lsb) at offset in 256ths of a degree C '''
+        temp_int = buf[offset]
         if temp_int > 127:
             temp_int -= 256
-
-        return float(temp_int + temp_frac / 256.0)
+        return temp_int * 256 + buf[offset + 1]
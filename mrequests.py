@@ -7,9 +7,22 @@ try:
 except ImportError:
     import usocket as socket
 
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    from time import monotonic
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
 
 MICROPY = sys.implementation.name == "micropython"
 MAX_READ_SIZE = 4 * 1024
+MAX_DRAIN_SIZE = 16 * 1024  # unread body a closed response reads to keep its connection
+IDLE_TIMEOUT_MS = 60_000
 
 
 def encode_basic_auth(user, password):
@@ -128,19 +141,28 @@ class RequestContext:
 
 
 class Response:
-    def __init__(self, sock, sockfile, save_headers=False):
+    def __init__(self, sock, sockfile, save_headers=False, session=None, key=None):
         self.sock = sock
         self.sf = sockfile
         self.encoding = "utf-8"
         self._cached = None
         self._chunk_size = 0
         self._content_size = 0
+        self._remaining = None  # body bytes left to read, None without a Content-Length
+        self._finished = False  # the whole body has been read
+        self._session = session
+        self._key = key
+        # the connection can go back to the session, until the server says otherwise
+        self._reusable = session is not None
         self.chunked = False
         self.status_code = None
         self.reason = ""
         self.headers = [] if save_headers else None
 
     def read(self, size=MAX_READ_SIZE):
+        if self._finished:
+            return b""
+
         if self.chunked:
             if self._chunk_size == 0:
                 l = self.sf.readline()
@@ -152,10 +174,11 @@ class Response:
 
                 if self._chunk_size == 0:
                     # End of message
-                    sep = sf.read(2)
+                    sep = self.sf.read(2)
                     if sep != b"\r\n":
                         raise ValueError("Expected final chunk separator, read %r instead." % sep)
 
+                    self._finished = True
                     return b""
 
             data = self.sf.read(min(size, self._chunk_size))
@@ -167,11 +190,28 @@ class Response:
                     raise ValueError("Expected chunk separator, read %r instead." % sep)
 
             return data
-        else:
+        elif self._remaining is None:
+            # no Content-Length, the body ends where the server closes the connection
             if size:
                 return self.sf.read(size)
             else:
-                return self.sf.read(self._content_size)
+                return self.sf.read()
+        else:
+            if not size or size > self._remaining:
+                size = self._remaining
+
+            data = self.sf.read(size)
+            self._remaining -= len(data)
+
+            if not data:
+                # the server closed the connection short of the Content-Length
+                self._reusable = False
+                self._remaining = 0
+
+            if self._remaining == 0:
+                self._finished = True
+
+            return data
 
     def save(self, fn, chunk_size=1024):
         read = 0
@@ -199,7 +239,10 @@ class Response:
             # print("Chunked response detected.")
         elif data[:15].lower() == b"content-length:":
             self._content_size = int(data.split(b":", 1)[1])
+            self._remaining = self._content_size
             # print("Content length: %i" % self._content_size)
+        elif data[:11].lower() == b"connection:" and b"close" in data[11:].lower():
+            self._reusable = False
 
     # overwrite this method, if you want to process/store headers differently
     def add_header(self, data):
@@ -208,23 +251,65 @@ class Response:
         if self.headers is not None:
             self.headers.append(data)
 
+    def _start_body(self, method, version):
+        """Called once the headers are read, to tell where the body ends."""
+        if method == "HEAD" or self.status_code in (204, 304) or self.status_code < 200:
+            self.chunked = False
+            self._remaining = 0
+
+        if version == b"HTTP/1.0" or not self.chunked and self._remaining is None:
+            self._reusable = False
+
+        if not self.chunked and self._remaining == 0:
+            self._finished = True
+
+    def _drain(self):
+        """Read what's left of a short body, so the connection can take the next request."""
+        drained = 0
+        try:
+            while not self._finished and drained <= MAX_DRAIN_SIZE:
+                data = self.read(MAX_READ_SIZE)
+                if not data and not self._finished:
+                    break
+                drained += len(data)
+        except (OSError, ValueError):
+            self._reusable = False
+
+    def _release(self):
+        if self.sock is None:
+            return
+
+        if self._reusable and not self._finished:
+            self._drain()
+
+        if self._reusable and self._finished:
+            self._session._release(self._key, self.sock, self.sf)
+        else:
+            close_connection(self.sock, self.sf)
+
+        self.sock = None
+        self.sf = None
+
     def close(self):
-        if not MICROPY:
-            self.sf.close()
-            self.sf = None
-        if self.sock:
-            self.sock.close()
-            self.sock = None
+        self._release()
         self._cached = None
 
     @property
     def content(self):
         if self._cached is None:
             try:
-                self._cached = self.read(size=None)
+                if self.chunked:
+                    parts = []
+                    while True:
+                        data = self.read()
+                        if not data:
+                            break
+                        parts.append(data)
+                    self._cached = b"".join(parts)
+                else:
+                    self._cached = self.read(size=None)
             finally:
-                self.sock.close()
-                self.sock = None
+                self._release()
         return self._cached
 
     @property
@@ -237,6 +322,122 @@ class Response:
         return ujson.loads(self.content)
 
 
+def connect(ctx, timeout=None):
+    """Open a socket to the context's host, wrapped in TLS for https. Returns (sock, sockfile)."""
+    # print("Resolving host address...")
+    ai = socket.getaddrinfo(ctx.host, ctx.port, 0, socket.SOCK_STREAM)
+    ai = ai[0]
+
+    # print("Creating socket...")
+    sock = socket.socket(ai[0], ai[1], ai[2])
+    sock.settimeout(timeout)
+    try:
+        # print("Connecting to %s:%i..." % (ctx.host, ctx.port))
+        sock.connect(ai[-1])
+        if ctx.scheme == "https":
+            try:
+                import ssl
+            except ImportError:
+                import ussl as ssl
+
+            # print("Wrapping socket with SSL")
+            create_ctx = getattr(ssl, 'create_default_context', None)
+            if create_ctx:
+                sock = create_ctx().wrap_socket(sock, server_hostname=ctx.host)
+            else:
+                sock = ssl.wrap_socket(sock, server_hostname=ctx.host)
+    except OSError:
+        sock.close()
+        raise
+
+    return sock, sock if MICROPY else sock.makefile("rwb")
+
+
+def close_connection(sock, sf):
+    if not MICROPY:
+        sf.close()
+    sock.close()
+
+
+def send_request(ctx, sock, sf, headers, data, json, encoding, response_class, save_headers, session):
+    """Write the request on an open connection and read the response's status line and headers."""
+    # the head goes out in one write: on a kept connection a request split over several
+    # small segments waits on the server's delayed ack between them
+    head = [b"%s %s HTTP/1.1\r\n" % (ctx.method.encode("ascii"), ctx.path.encode("ascii"))]
+
+    if not b"Host" in headers:
+        head.append(b"Host: %s\r\n" % ctx.host.encode())
+
+    for k, val in headers.items():
+        head.append(k if isinstance(k, bytes) else k.encode('ascii'))
+        head.append(b": ")
+        head.append(val if isinstance(val, bytes) else val.encode('ascii'))
+        head.append(b"\r\n")
+
+    if data and ctx.method not in ("GET", "HEAD"):
+        data = data if isinstance(data, bytes) else data.encode(encoding or "utf-8")
+
+        if json is not None:
+            head.append(b"Content-Type: application/json")
+            if encoding:
+                head.append(b"; charset=%s" % encoding.encode())
+            head.append(b"\r\n")
+
+        head.append(b"Content-Length: %d\r\n" % len(data))
+    else:
+        data = None
+
+    head.append(b"Connection: keep-alive\r\n\r\n" if session else b"Connection: close\r\n\r\n")
+
+    if data and len(data) <= MAX_READ_SIZE:
+        head.append(data)
+        data = None
+
+    sf.write(b"".join(head))
+
+    if data:
+        sf.write(data)
+
+    if not MICROPY:
+        sf.flush()
+
+    resp = response_class(sock, sf, save_headers=save_headers, session=session,
+                          key=(ctx.scheme, ctx.host, ctx.port))
+    l = b""
+    i = 0
+    while True:
+        c = sf.read(1)
+        if not c:
+            # what a kept connection the server has since closed reads as
+            raise OSError("Connection closed before the response")
+        l += c
+        i += 1
+
+        if l.endswith(b"\r\n") or i > MAX_READ_SIZE:
+            break
+
+    # print("Response: %s" % l.decode("ascii"))
+    l = l.split(None, 2)
+    resp.status_code = int(l[1])
+
+    if len(l) > 2:
+        resp.reason = l[2].rstrip()
+
+    while True:
+        line = sf.readline()
+        if not line or line == b"\r\n":
+            break
+
+        if line.startswith(b"Location:"):
+            ctx.set_location(resp.status_code, line[9:].strip().decode("ascii"))
+
+        # print("Header: %r" % line)
+        resp.add_header(line)
+
+    resp._start_body(ctx.method, l[0])
+    return resp
+
+
 def request(
     method,
     url,
@@ -249,6 +450,7 @@ def request(
     save_headers=False,
     max_redirects=1,
     timeout=None,
+    session=None,
 ):
     if auth:
         headers.update(auth if callable(auth) else encode_basic_auth(auth[0], auth[1]))
@@ -266,99 +468,109 @@ def request(
             raise ValueError("Protocol scheme %s not supported." % ctx.scheme)
 
         ctx.redirect = False
+        conn = session._acquire((ctx.scheme, ctx.host, ctx.port)) if session else None
 
-        # print("Resolving host address...")
-        ai = socket.getaddrinfo(ctx.host, ctx.port, 0, socket.SOCK_STREAM)
-        ai = ai[0]
+        if conn is None:
+            sock, sf = connect(ctx, timeout)
+            if session:
+                session.connects += 1
+        else:
+            sock, sf = conn
+            session.reuses += 1
 
-        # print("Creating socket...")
-        sock = socket.socket(ai[0], ai[1], ai[2])
-        sock.settimeout(timeout)
         try:
-            # print("Connecting to %s:%i..." % (ctx.host, ctx.port))
-            sock.connect(ai[-1])
-            if ctx.scheme == "https":
-                try:
-                    import ssl
-                except ImportError:
-                    import ussl as ssl
-
-                # print("Wrapping socket with SSL")
-                create_ctx = getattr(ssl, 'create_default_context', None)
-                if create_ctx:
-                    sock = create_ctx().wrap_socket(sock, server_hostname=ctx.host)
-                else:
-                    sock = ssl.wrap_socket(sock, server_hostname=ctx.host)
-
-            sf = sock if MICROPY else sock.makefile("rwb")
-            sf.write(b"%s %s HTTP/1.1\r\n" % (ctx.method.encode("ascii"), ctx.path.encode("ascii")))
+            resp = send_request(ctx, sock, sf, headers, data, json, encoding, response_class, save_headers, session)
+        except OSError:
+            close_connection(sock, sf)
+            if conn is None:
+                raise
 
-            if not b"Host" in headers:
-                sf.write(b"Host: %s\r\n" % ctx.host.encode())
+            # the server closed the kept connection while it was idle, send it again on a new one
+            session.reconnects += 1
+            sock, sf = connect(ctx, timeout)
+            try:
+                resp = send_request(ctx, sock, sf, headers, data, json, encoding, response_class, save_headers,
+                                    session)
+            except OSError:
+                close_connection(sock, sf)
+                raise
 
-            for k, val in headers.items():
-                sf.write(k if isinstance(k, bytes) else k.encode('ascii'))
-                sf.write(b": ")
-                sf.write(val if isinstance(val, bytes) else val.encode('ascii'))
-                sf.write(b"\r\n")
+        if ctx.redirect:
+            # print("Redirect to: %s" % ctx.url)
+            resp.close()
+            max_redirects -= 1
 
-            if data and ctx.method not in ("GET", "HEAD"):
-                if json is not None:
-                    sf.write(b"Content-Type: application/json")
-                    if encoding:
-                        sf.write(b"; charset=%s" % encoding.encode())
-                    sf.write(b"\r\n")
+            if max_redirects < 0:
+                raise ValueError("Maximum redirection count exceeded.")
 
-                sf.write(b"Content-Length: %d\r\n" % len(data))
+        else:
+            break
 
-            sf.write(b"Connection: close\r\n\r\n")
+    return resp
 
-            if data and ctx.method not in ("GET", "HEAD"):
-                sf.write(data if isinstance(data, bytes) else data.encode(encoding or "utf-8"))
 
-            if not MICROPY:
-                sf.flush()
+class Session:
+    """Keeps a connection per scheme, host and port open between requests.
 
-            resp = response_class(sock, sf, save_headers=save_headers)
-            l = b""
-            i = 0
-            while True:
-                l += sf.read(1)
-                i += 1
+    A connection goes back to the session when its response is closed or its content
+    read, as long as the whole body could be read and the server didn't ask to close
+    it. Connections left unused for longer than idle_timeout_ms are closed before the
+    next request, and a request that finds its kept connection closed by the server
+    is sent again on a new one.
 
-                if l.endswith(b"\r\n") or i > MAX_READ_SIZE:
-                    break
+    A session is meant for one thread at a time.
+    """
 
-            # print("Response: %s" % l.decode("ascii"))
-            l = l.split(None, 2)
-            resp.status_code = int(l[1])
+    def __init__(self, idle_timeout_ms=IDLE_TIMEOUT_MS):
+        self.idle_timeout_ms = idle_timeout_ms
+        self.connects = 0
+        self.reuses = 0
+        self.reconnects = 0
+        self._idle = {}  # (scheme, host, port) -> (sock, sockfile, ticks_ms() when it went idle)
 
-            if len(l) > 2:
-                resp.reason = l[2].rstrip()
+    def request(self, method, url, **kw):
+        return request(method, url, session=self, **kw)
 
-            while True:
-                l = sf.readline()
-                if not l or l == b"\r\n":
-                    break
+    def head(self, url, **kw):
+        return self.request("HEAD", url, **kw)
 
-                if l.startswith(b"Location:"):
-                    ctx.set_location(resp.status_code, l[9:].strip().decode("ascii"))
+    def get(self, url, **kw):
+        return self.request("GET", url, **kw)
 
-                # print("Header: %r" % l)
-                resp.add_header(l)
-        except OSError:
-            sock.close()
-            raise
+    def post(self, url, **kw):
+        return self.request("POST", url, **kw)
 
-        if ctx.redirect:
-            # print("Redirect to: %s" % ctx.url)
-            sock.close()
-            max_redirects -= 1
+    def put(self, url, **kw):
+        return self.request("PUT", url, **kw)
 
-            if max_redirects < 0:
-                raise ValueError("Maximum redirection count exceeded.")
+    def patch(self, url, **kw):
+        return self.request("PATCH", url, **kw)
 
-        else:
-            break
+    def delete(self, url, **kw):
+        return self.request("DELETE", url, **kw)
 
-    return resp
+    def close(self):
+        for key in list(self._idle):
+            self._close(key)
+
+    def _acquire(self, key):
+        now = ticks_ms()
+        for idle_key in list(self._idle):
+            if ticks_diff(now, self._idle[idle_key][2]) > self.idle_timeout_ms:
+                self._close(idle_key)
+
+        conn = self._idle.pop(key, None)
+        return conn[:2] if conn else None
+
+    def _release(self, key, sock, sf):
+        if key in self._idle:
+            self._close(key)
+        self._idle[key] = (sock, sf, ticks_ms())
+
+    def _close(self, key):
+        sock, sf, _ = self._idle.pop(key)
+        close_connection(sock, sf)
+
+    def __repr__(self):
+        return "<Session %i connects, %i reuses, %i reconnects, %i idle>" % (
+            self.connects, self.reuses, self.reconnects, len(self._idle))
@@ -0,0 +1,99 @@
+from time import ticks_us, ticks_add, ticks_diff, sleep_ms
+import uasyncio as asyncio
+
+US_PER_MS = 1000
+
+
+class Periodic:
+    '''
+    the schedule of an asyncio task that runs every period_ms, or of a _thread through
+    wait_blocking(). the deadlines are a fixed grid from the first one, so a late run
+    doesn't push the ones after it back; runs that were missed entirely are skipped,
+    not run back to back.
+
+    keeps how late each run started (its jitter) and how long it took, the first to
+    see what the other tasks cost sampling and the second what it costs them.
+    '''
+
+    def __init__(self, name, period_ms, first_in_ms=0):
+        self.name = name
+        self.period_us = period_ms * US_PER_MS  # keep it well inside ticks_diff()'s +-536 s
+        self.runs = 0
+        self.skipped = 0
+        self.total_late_us = 0
+        self.max_late_us = 0
+        self.total_run_us = 0
+        self.max_run_us = 0
+        self.__next_us = ticks_add(ticks_us(), first_in_ms * US_PER_MS)
+        self.__started_us = 0
+
+    async def wait(self):
+        ''' sleep until the next deadline, then mark the run as started '''
+        delay_ms = self.__delay_ms()
+        if delay_ms > 0:
+            await asyncio.sleep_ms(delay_ms)
+        self.__start()
+
+    def wait_blocking(self):
+        ''' wait() for a _thread that doesn't run an event loop '''
+        delay_ms = self.__delay_ms()
+        if delay_ms > 0:
+            sleep_ms(delay_ms)
+        self.__start()
+
+    def __delay_ms(self):
+        return (ticks_diff(self.__next_us, ticks_us()) + US_PER_MS - 1) // US_PER_MS
+
+    def __start(self):
+        now = ticks_us()
+        late_us = ticks_diff(now, self.__next_us)
+        if late_us >= self.period_us:
+            missed = late_us // self.period_us
+            self.skipped += missed
+            self.__next_us = ticks_add(self.__next_us, missed * self.period_us)
+            late_us -= missed * self.period_us
+        self.runs += 1
+        self.total_late_us += late_us
+        if late_us > self.max_late_us:
+            self.max_late_us = late_us
+        self.__next_us = ticks_add(self.__next_us, self.period_us)
+        self.__started_us = now
+
+    def done(self):
+        took = ticks_diff(ticks_us(), self.__started_us)
+        self.total_run_us += took
+        if took > self.max_run_us:
+            self.max_run_us = took
+
+    def mean_late_us(self):
+        return self.total_late_us // self.runs if self.runs else 0
+
+    def mean_run_us(self):
+        return self.total_run_us // self.runs if self.runs else 0
+
+    def __repr__(self):
+        return "{} every {} ms: {} runs, {} skipped, late mean {} us max {} us, took mean {} us max {} us".format(
+            self.name, self.period_us // US_PER_MS, self.runs, self.skipped, self.mean_late_us(),
+            self.max_late_us, self.mean_run_us(), self.max_run_us)
+
+
+async def run_periodic(periodic, func):
+    ''' call func() on periodic's schedule forever, printing what it raises instead of stopping '''
+    while True:
+        await periodic.wait()
+        try:
+            func()
+        except Exception as e:
+            print("The {} task failed. {}".format(periodic.name, e))
+        periodic.done()
+
+
+def run_periodic_blocking(periodic, func):
+    ''' run_periodic() as the body of a _thread '''
+    while True:
+        periodic.wait_blocking()
+        try:
+            func()
+        except Exception as e:
+            print("The {} thread failed. {}".format(periodic.name, e))
+        periodic.done()
@@ -0,0 +1,188 @@
+from array import array
+from time import ticks_diff
+try:
+    from micropython import schedule
+except ImportError:
+    schedule = None
+
+COUNTER_MASK = 0x3FFFFFFF  # pulse counters wrap here so they stay MicroPython small ints
+
+
+class PulseBuffer:
+    '''
+    ring of ticks_ms() timestamps written by an interrupt handler and read by a consumer.
+    record() only compares and stores small ints into storage allocated up front,
+    so it is safe to call from a hard irq. the capacity must be a power of two.
+
+    the irq side owns the written counter and the consumer side owns its cursors, so
+    nothing is shared read-modify-write between them. if the consumer falls more than
+    capacity pulses behind, the oldest pulses are overwritten and counted as lost.
+
+    drain is the consumer: record() hands it to micropython.schedule() each time
+    another half of the buffer has been written, so a fast pulse train is consumed
+    as it comes in instead of overflowing the buffer before the next regular call.
+    '''
+
+    def __init__(self, capacity=2048, debounce_ms=0, drain=None):
+        if capacity < 2 or capacity & (capacity - 1):
+            raise ValueError("PulseBuffer capacity must be a power of two")
+        self.capacity = capacity
+        self.debounce_ms = debounce_ms
+        self.__stamps = array("L", [0] * capacity)
+        self.__mask = capacity - 1
+        self.__written = 0  # pulses recorded (mod COUNTER_MASK + 1), only changed by record()
+        self.__full = False  # every slot has been written at least once
+        self.__last_stamp = 0
+        self.__consumed = 0  # consumer cursor: next pulse consume() looks at
+        self.__window_start = 0  # consumer cursor: oldest pulse in the sliding window
+        self.__trailing = 0  # consumer cursor: oldest pulse inside count_within()'s window
+        self.lost = 0
+        self.bounces = 0  # irq side: pulses ignored for coming within debounce_ms of the last one
+        self.__half_mask = (capacity >> 1) - 1
+        self.__drain = drain if schedule else None
+        self.__drain_pending = False  # set by the irq, cleared when the scheduled drain runs
+        self.__run_drain_ref = self.__run_drain  # bound here, binding it in the irq would allocate
+
+    def record(self, now_ms):
+        '''
+        irq side: store one pulse, ignoring bounces closer than debounce_ms to the last
+        pulse. only small int compares and stores into preallocated storage, no float
+        or object is made, so it can run in a hard irq.
+        '''
+        written = self.__written
+        # a negative diff is a last pulse more than half a ticks period (~6.2 days) ago, not a bounce
+        if written and 0 <= ticks_diff(now_ms, self.__last_stamp) < self.debounce_ms:
+            self.bounces = (self.bounces + 1) & COUNTER_MASK
+            return
+        self.__last_stamp = now_ms
+        mask = self.__mask
+        self.__stamps[written & mask] = now_ms
+        if written & mask == mask:
+            self.__full = True
+        self.__written = (written + 1) & COUNTER_MASK
+        if written & self.__half_mask == self.__half_mask and self.__drain is not None and not self.__drain_pending:
+            self.__drain_pending = True
+            try:
+                schedule(self.__run_drain_ref, None)
+            except RuntimeError:  # the schedule queue is full, try again after the next half
+                self.__drain_pending = False
+
+    def __run_drain(self, _):
+        self.__drain_pending = False
+        self.__drain()
+
+    def written(self):
+        return self.__written
+
+    def stamp(self, n):
+        return self.__stamps[n & self.__mask]
+
+    def newest(self):
+        return self.__stamps[(self.__written - 1) & self.__mask]
+
+    def __oldest_held(self, written):
+        ''' counter of the oldest pulse that hasn't been overwritten yet '''
+        if self.__full:
+            return (written - self.capacity) & COUNTER_MASK
+        return 0
+
+    def __behind(self, cursor, written):
+        return (written - cursor) & COUNTER_MASK
+
+    def held(self):
+        ''' number of pulses still in the buffer '''
+        return self.capacity if self.__full else self.__written
+
+    def last_interval(self):
+        '''
+        ms between the two newest pulses, None until there are two or when they are
+        further apart than ticks_diff() can tell (2**29 ms, ~6.2 days)
+        '''
+        if self.held() < 2:
+            return None
+        written = self.__written
+        interval_ms = ticks_diff(self.stamp(written - 1), self.stamp(written - 2))
+        return interval_ms if interval_ms >= 0 else None
+
+    def __catch_up(self, written):
+        ''' consumed cursor, moved past pulses that were overwritten before being consumed '''
+        consumed = self.__consumed
+        behind = self.__behind(consumed, written)
+        if behind > self.capacity:
+            self.lost += behind - self.capacity
+            consumed = (written - self.capacity) & COUNTER_MASK
+        return consumed
+
+    def take_new(self):
+        ''' consumer side: the number of pulses recorded since the last take_new() or consume() '''
+        written = self.__written  # read once, the irq may keep adding
+        new_pulses = self.__behind(self.__catch_up(written), written)
+        self.__consumed = written
+        return new_pulses
+
+    def consume(self, window_ms):
+        '''
+        consumer side: walk the pulses recorded since the last call and return how many
+        there were and the most pulses seen in any window_ms long window ending at one of
+        them. the window slides across calls, so a gust spanning two calls isn't split.
+        each pulse is visited once by each cursor, so the cost is O(new pulses).
+        '''
+        written = self.__written  # read once, the irq may keep adding
+        consumed = self.__catch_up(written)
+        window_start = self.__window_start
+        if self.__behind(window_start, written) > self.capacity:
+            window_start = consumed
+        new_pulses = self.__behind(consumed, written)
+        peak = 0
+        while consumed != written:
+            newest_stamp = self.stamp(consumed)
+            while ticks_diff(newest_stamp, self.stamp(window_start)) >= window_ms:
+                window_start = (window_start + 1) & COUNTER_MASK
+            consumed = (consumed + 1) & COUNTER_MASK
+            in_window = (consumed - window_start) & COUNTER_MASK
+            if in_window > peak:
+                peak = in_window
+        self.__consumed = consumed
+        self.__window_start = window_start
+        return new_pulses, peak
+
+    def count_within(self, now_ms, window_ms):
+        '''
+        pulses in the last window_ms before now_ms. a trailing cursor only moves forward
+        as pulses age out of the window, so over time each pulse is looked at once no
+        matter how often this is called. meant to be called with the same window_ms.
+        '''
+        written = self.__written
+        trailing = self.__trailing
+        if self.__behind(trailing, written) > self.held():
+            trailing = self.__oldest_held(written)
+        while trailing != written and not self.__within(now_ms, self.stamp(trailing), window_ms):
+            trailing = (trailing + 1) & COUNTER_MASK
+        self.__trailing = trailing
+        return self.__behind(trailing, written)
+
+    def count_since(self, now_ms, window_ms):
+        ''' pulses in the last window_ms before now_ms, walking back from the newest '''
+        written = self.__written
+        oldest = self.__oldest_held(written)
+        count = 0
+        n = written
+        while n != oldest:
+            n = (n - 1) & COUNTER_MASK
+            if not self.__within(now_ms, self.stamp(n), window_ms):
+                break
+            count += 1
+        return count
+
+    @staticmethod
+    def __within(now_ms, stamp, window_ms):
+        '''
+        stamp is in the window_ms before now_ms. a stamp recorded just after now_ms was
+        read comes out a little negative; one more than window_ms negative is really
+        from over half a ticks period (~6.2 days) ago, ticks_diff() can't tell them apart
+        '''
+        age_ms = ticks_diff(now_ms, stamp)
+        return -window_ms <= age_ms < window_ms
+
+    def __repr__(self):
+        return "{} pulses recorded, {} bounces ignored, {} lost".format(self.__written, self.bounces, self.lost)
@@ -0,0 +1,198 @@
+from array import array
+
+MISSING = float("nan")  # stored in place of a failed sensor read
+MISSING_INT = -0x40000000  # same for integer buffers; the smallest MicroPython small int
+FLOAT_TYPECODES = ("f", "d")
+
+
+class RingBuffer:
+    '''
+    fixed capacity circular buffer backed by a typed array.
+    storage is allocated once in the constructor, push() overwrites the oldest
+    slot in place so adding a sample never shifts or allocates.
+    iteration and indexing go from oldest (0) to newest (-1).
+    '''
+
+    def __init__(self, capacity, typecode="f", fill=0.0):
+        if capacity < 1:
+            raise ValueError("RingBuffer capacity must be at least 1")
+        self.capacity = capacity
+        self.typecode = typecode
+        self.is_float = typecode in FLOAT_TYPECODES
+        self.__buf = array(typecode, [fill] * capacity)
+        self.__head = 0  # slot of the oldest value, which is also where the next push lands
+
+    def __len__(self):
+        return self.capacity
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.capacity
+        if not 0 <= index < self.capacity:
+            raise IndexError("RingBuffer index out of range")
+        index += self.__head
+        if index >= self.capacity:
+            index -= self.capacity
+        return self.__buf[index]
+
+    def __iter__(self):
+        buf = self.__buf
+        for i in range(self.__head, self.capacity):
+            yield buf[i]
+        for i in range(self.__head):
+            yield buf[i]
+
+    def __repr__(self):
+        return "RingBuffer({})".format(list(self))
+
+    def push(self, val):
+        ''' store val in place of the oldest value and return the value that was evicted '''
+        buf = self.__buf
+        head = self.__head
+        evicted = buf[head]
+        buf[head] = val
+        head += 1
+        if head == self.capacity:
+            head = 0
+        self.__head = head
+        return evicted
+
+    def newest(self):
+        return self.__buf[self.__head - 1]
+
+    def add_to_newest(self, val):
+        self.__buf[self.__head - 1] += val
+
+    def fill(self, val):
+        buf = self.__buf
+        for i in range(self.capacity):
+            buf[i] = val
+        self.__head = 0
+
+
+class RunningWindow(RingBuffer):
+    '''
+    RingBuffer that keeps a running sum and count of its usable values, updated
+    as each value is pushed in and evicted out, so mean() is O(1) at any capacity.
+    missing values (MISSING / MISSING_INT) are left out of the mean, so fill a
+    window with the missing value to start it empty. the sum is rebuilt from the
+    buffer once every capacity pushes so float rounding can't drift over long uptimes.
+    integer buffers keep an integer sum and return a rounded integer mean.
+    '''
+
+    def __init__(self, capacity, typecode="f", fill=0.0):
+        super().__init__(capacity, typecode, fill)
+        self.resync()
+
+    def push(self, val):
+        evicted = super().push(val)
+        if RunningWindow.usable(evicted):
+            self.__sum -= evicted
+            self.__count -= 1
+        val = self.newest()  # read back the stored value so add and evict round the same
+        if RunningWindow.usable(val):
+            self.__sum += val
+            self.__count += 1
+        self.__pushes_until_resync -= 1
+        if not self.__pushes_until_resync:
+            self.resync()
+        return evicted
+
+    def fill(self, val):
+        super().fill(val)
+        self.resync()
+
+    def resync(self):
+        total = 0.0 if self.is_float else 0
+        count = 0
+        for val in self:
+            if RunningWindow.usable(val):
+                total += val
+                count += 1
+        self.__sum = total
+        self.__count = count
+        self.__pushes_until_resync = self.capacity
+
+    def sum(self):
+        return self.__sum
+
+    def count(self):
+        return self.__count
+
+    def mean(self):
+        if not self.__count:
+            return 0.0 if self.is_float else 0
+        if self.is_float:
+            return self.__sum / self.__count
+        return round_div(self.__sum, self.__count)
+
+    @staticmethod
+    def usable(val):
+        # nan is the only value not equal to itself
+        return val == val and val != MISSING_INT
+
+
+class SampleRing:
+    '''
+    single producer, single consumer queue of fixed width records, for handing samples
+    from one thread to another without a lock. the records are stored flat in one typed
+    array, a None field as the missing value. the producer only ever writes its count of
+    records pushed and the consumer its count of records popped, each after the record's
+    fields, so neither sees a half written record. capacity is a power of two so the
+    counts can wrap at COUNT_MASK and still map to the same slot.
+    a push onto a full ring is dropped, the consumer keeps what it hasn't read yet.
+    '''
+
+    COUNT_MASK = 0x3FFFFFFF  # keeps the counts small ints
+
+    def __init__(self, capacity, width, typecode="f"):
+        if capacity < 1 or capacity & (capacity - 1):
+            raise ValueError("SampleRing capacity must be a power of two")
+        self.capacity = capacity
+        self.width = width
+        self.missing = MISSING if typecode in FLOAT_TYPECODES else MISSING_INT
+        self.dropped = 0
+        self.__buf = array(typecode, [self.missing] * (capacity * width))
+        self.__written = 0  # only push() writes it
+        self.__read = 0  # only pop_into() writes it
+
+    def __len__(self):
+        return (self.__written - self.__read) & SampleRing.COUNT_MASK
+
+    def push(self, record):
+        ''' copy record in, False if the ring was full and it was dropped '''
+        written = self.__written
+        if (written - self.__read) & SampleRing.COUNT_MASK >= self.capacity:
+            self.dropped += 1
+            return False
+        buf = self.__buf
+        missing = self.missing
+        i = (written & (self.capacity - 1)) * self.width
+        for val in record:
+            buf[i] = missing if val is None else val
+            i += 1
+        self.__written = (written + 1) & SampleRing.COUNT_MASK
+        return True
+
+    def pop_into(self, record):
+        ''' copy the oldest record into the list record, False if there was none '''
+        read = self.__read
+        if read == self.__written:
+            return False
+        buf = self.__buf
+        i = (read & (self.capacity - 1)) * self.width
+        for field in range(self.width):
+            val = buf[i + field]
+            record[field] = val if RunningWindow.usable(val) else None
+        self.__read = (read + 1) & SampleRing.COUNT_MASK
+        return True
+
+    def __repr__(self):
+        return "{} of {} queued, {} dropped".format(len(self), self.capacity, self.dropped)
+
+
+def round_div(numerator, denominator):
+    ''' integer division rounded half away from zero, without going through a float '''
+    if (numerator < 0) != (denominator < 0):
+        return -((abs(numerator) + abs(denominator) // 2) // abs(denominator))
+    return (abs(numerator) + abs(denominator) // 2) // abs(denominator)
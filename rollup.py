@@ -0,0 +1,162 @@
+from array import array
+from ring_buffer import MISSING_INT, FLOAT_TYPECODES
+
+ROLLUP_TWO_MINUTE = 0
+ROLLUP_HOURLY = 1
+ROLLUP_DAILY = 2
+INT_SUM_TYPECODE = "q"  # a day of whole Pa adds up past a 32 bit int when midnight never comes
+
+
+class RollupLevel:
+    '''
+    one resolution of a Rollup: a circle of closed buckets plus the open bucket being filled.
+    each bucket keeps the min, max, sum and count of what went into it, integer levels
+    an exact integer sum. all of the storage is allocated in the constructor.
+    '''
+
+    def __init__(self, capacity, typecode="f"):
+        is_float = typecode in FLOAT_TYPECODES
+        zero = 0.0 if is_float else 0
+        self.capacity = capacity
+        self.__min = array(typecode, [zero] * capacity)
+        self.__max = array(typecode, [zero] * capacity)
+        self.__sum = array("f" if is_float else INT_SUM_TYPECODE, [zero] * capacity)
+        self.__count = array("L", [0] * capacity)
+        self.__head = 0  # slot the next closed bucket is written to
+        self.__closed = 0  # number of closed buckets held, up to capacity
+        self.reset_open()
+
+    def reset_open(self):
+        self.open_min = 0
+        self.open_max = 0
+        self.open_sum = 0
+        self.open_count = 0
+
+    def add(self, val):
+        self.merge(val, val, val, 1)
+
+    def merge(self, bucket_min, bucket_max, bucket_sum, bucket_count):
+        if not bucket_count:
+            return
+        if not self.open_count or bucket_min < self.open_min:
+            self.open_min = bucket_min
+        if not self.open_count or bucket_max > self.open_max:
+            self.open_max = bucket_max
+        self.open_sum += bucket_sum
+        self.open_count += bucket_count
+
+    def merge_open_into(self, level):
+        level.merge(self.open_min, self.open_max, self.open_sum, self.open_count)
+
+    def close(self):
+        ''' keep the open bucket as the newest closed bucket and start a new, empty one '''
+        head = self.__head
+        self.__min[head] = self.open_min
+        self.__max[head] = self.open_max
+        self.__sum[head] = self.open_sum
+        self.__count[head] = self.open_count
+        head += 1
+        if head == self.capacity:
+            head = 0
+        self.__head = head
+        if self.__closed < self.capacity:
+            self.__closed += 1
+        self.reset_open()
+
+    def closed_count(self):
+        return self.__closed
+
+    def bucket(self, age):
+        ''' (min, max, sum, count) of a closed bucket, age 0 is the newest '''
+        if not 0 <= age < self.__closed:
+            raise IndexError("RollupLevel only holds {} closed buckets".format(self.__closed))
+        i = self.__head - 1 - age
+        if i < 0:
+            i += self.capacity
+        return self.__min[i], self.__max[i], self.__sum[i], self.__count[i]
+
+    def fold_into(self, level, buckets):
+        ''' merge the newest closed buckets into level's open bucket '''
+        for age in range(min(buckets, self.__closed)):
+            level.merge(*self.bucket(age))
+
+
+class Rollup:
+    '''
+    min/max/mean/count series of one metric at 2 minute, hourly and daily resolution.
+    add() only touches the open 2 minute bucket; close_period() folds it into the open
+    hour and every periods_per_hour periods the hour is folded into the open day, so
+    each level is fed from the one below it. close_day() is called at midnight.
+    reading the stats of today, the current hour or the last n hours folds at most
+    n + 3 buckets, so it is constant time for a fixed n and never scans samples.
+    '''
+
+    def __init__(self, periods_per_hour=30, hours=24, days=7, typecode="f"):
+        self.periods_per_hour = periods_per_hour
+        self.levels = (
+            RollupLevel(periods_per_hour, typecode),
+            RollupLevel(hours, typecode),
+            RollupLevel(days, typecode)
+        )
+        self.__scratch = RollupLevel(1, typecode)  # reused to fold buckets for the stats readers
+        self.__periods_this_hour = 0
+        self.hours_closed = 0  # counts up forever, tells readers when the hourly level changed
+
+    def add(self, val):
+        if val is None or val != val or val == MISSING_INT:
+            return  # nan is the only value not equal to itself
+        self.levels[ROLLUP_TWO_MINUTE].add(val)
+
+    def close_period(self):
+        two_minute, hourly = self.levels[ROLLUP_TWO_MINUTE], self.levels[ROLLUP_HOURLY]
+        two_minute.merge_open_into(hourly)
+        two_minute.close()
+        self.__periods_this_hour += 1
+        if self.__periods_this_hour >= self.periods_per_hour:
+            self.close_hour()
+
+    def close_hour(self):
+        hourly, daily = self.levels[ROLLUP_HOURLY], self.levels[ROLLUP_DAILY]
+        hourly.merge_open_into(daily)
+        hourly.close()
+        self.__periods_this_hour = 0
+        self.hours_closed += 1
+
+    def close_day(self):
+        ''' the partial hour is closed too so that hourly buckets line up with midnight '''
+        two_minute = self.levels[ROLLUP_TWO_MINUTE]
+        two_minute.merge_open_into(self.levels[ROLLUP_HOURLY])
+        two_minute.close()
+        self.close_hour()
+        self.levels[ROLLUP_DAILY].close()
+
+    def period(self):
+        return self.__stats(ROLLUP_TWO_MINUTE, 0)
+
+    def this_hour(self):
+        return self.__stats(ROLLUP_HOURLY, 0)
+
+    def today(self):
+        return self.__stats(ROLLUP_DAILY, 0)
+
+    def last_hours(self, hours):
+        ''' stats over the newest closed hours plus the hour in progress '''
+        return self.__stats(ROLLUP_HOURLY, hours)
+
+    def history(self, level, age):
+        ''' (min, max, mean, count) of a closed bucket of level, age 0 is the newest '''
+        return Rollup.to_stats(*self.levels[level].bucket(age))
+
+    def __stats(self, level, closed_buckets):
+        scratch = self.__scratch
+        scratch.reset_open()
+        self.levels[level].fold_into(scratch, closed_buckets)
+        for lower in range(level + 1):  # the open buckets at and below level hold what isn't folded up yet
+            self.levels[lower].merge_open_into(scratch)
+        return Rollup.to_stats(scratch.open_min, scratch.open_max, scratch.open_sum, scratch.open_count)
+
+    @staticmethod
+    def to_stats(bucket_min, bucket_max, bucket_sum, bucket_count):
+        if not bucket_count:
+            return None
+        return bucket_min, bucket_max, bucket_sum / bucket_count, bucket_count
@@ -0,0 +1,100 @@
+from time import ticks_ms, ticks_add, ticks_diff
+
+STATE_OK = "ok"
+STATE_FAILING = "failing"  # the last reads failed, still read every sample
+STATE_DOWN = "down"  # not initialized or backed off, only retried when the backoff is up
+STATES = (STATE_OK, STATE_FAILING, STATE_DOWN)  # a state as a small int is its index here
+FAILURES_TO_BACK_OFF = 3
+BASE_BACKOFF_MS = 10_000
+MAX_BACKOFF_MS = 600_000
+
+
+class SensorHealth:
+    '''
+    keeps one sensor object and the record of its reads. after failures_to_back_off
+    failures in a row the sensor is dropped and due() says no until the backoff is up;
+    then the sensor is made again with init() (a part that was unplugged or browned out
+    needs its configuration written again) and read once. every failed retry doubles
+    the backoff up to max_backoff_ms, one good read resets it all.
+
+    errors are printed when the state changes instead of on every failed read, so a
+    dead sensor costs a ticks_diff() per sample.
+    '''
+
+    def __init__(self, name, init, failures_to_back_off=FAILURES_TO_BACK_OFF, base_backoff_ms=BASE_BACKOFF_MS,
+            max_backoff_ms=MAX_BACKOFF_MS):
+        self.name = name
+        self.init = init  # makes and configures the sensor, raises if it can't
+        self.failures_to_back_off = failures_to_back_off
+        self.base_backoff_ms = base_backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.sensor = None
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.recoveries = 0
+        self.backoff_ms = 0
+        self.retry_at = ticks_ms()
+        self.last_read_ok = False
+        self.last_error = None
+
+    def due(self, now_ms=None):
+        '''
+        True when the sensor should be read this sample, making it first if it was
+        dropped. False while it's backed off, or when making it failed.
+        '''
+        if self.sensor is not None and not self.backoff_ms:
+            return True
+        if now_ms is None:
+            now_ms = ticks_ms()
+        if ticks_diff(now_ms, self.retry_at) < 0:
+            self.last_read_ok = False
+            return False
+        if self.sensor is None:
+            try:
+                self.sensor = self.init()
+            except Exception as e:
+                self.failed(e, now_ms)
+                return False
+        return True
+
+    def succeeded(self):
+        if self.backoff_ms or self.consecutive_failures >= self.failures_to_back_off:
+            self.recoveries += 1
+            print("The {} is back after {} failed reads.".format(self.name, self.consecutive_failures))
+        self.consecutive_failures = 0
+        self.backoff_ms = 0
+        self.last_read_ok = True
+        self.last_error = None
+
+    def failed(self, error, now_ms=None):
+        self.consecutive_failures += 1
+        self.failures += 1
+        self.last_read_ok = False
+        self.last_error = error
+        if self.consecutive_failures == 1:
+            print("There was an error reading from the {}. {}".format(self.name, error))
+        if self.consecutive_failures < self.failures_to_back_off:
+            return
+        if self.backoff_ms:
+            self.backoff_ms = min(self.backoff_ms * 2, self.max_backoff_ms)
+        else:
+            self.backoff_ms = self.base_backoff_ms
+            print("The {} failed {} reads in a row, backing off, next try in {} s. {}".format(
+                self.name, self.consecutive_failures, self.backoff_ms // 1000, error))
+        self.sensor = None
+        self.retry_at = ticks_add(ticks_ms() if now_ms is None else now_ms, self.backoff_ms)
+
+    def good(self):
+        ''' the sensor's last read worked, so its values are this sample's '''
+        return self.last_read_ok
+
+    def state(self):
+        if self.backoff_ms or self.sensor is None:
+            return STATE_DOWN
+        if self.consecutive_failures:
+            return STATE_FAILING
+        return STATE_OK
+
+    def __repr__(self):
+        return "{}: {}, {} failures, {} in a row, {} recoveries, backoff {} ms".format(
+            self.name, self.state(), self.failures, self.consecutive_failures, self.recoveries, self.backoff_ms)
@@ -0,0 +1,120 @@
+'''
+AM2320.measure() and its crc16 against the bit-by-bit checksum and slice unpacking the
+driver used before. the i2c bus is faked with a recorded, valid reply and the 2 ms wake
+up wait is skipped so only the driver's own work is measured.
+
+on MicroPython (copy it with am2320.py to the board or run it with the unix port) the
+bytes allocated per measure() are the gc.mem_alloc() delta with the gc disabled. on
+CPython the time per call is printed instead.
+
+run from the repo root:  python3 tools/bench_am2320.py
+'''
+import sys
+
+if sys.implementation.name != "micropython":
+    import struct
+    import host_compat  # noqa: F401  (ticks_*, const() and the repo root on sys.path)
+    sys.modules.setdefault("ustruct", struct)
+
+import ustruct
+import am2320
+from am2320 import AM2320
+
+MICROPY = sys.implementation.name == "micropython"
+CALLS = 2000
+REPLY = b'\x03\x04\x02\x32\x00\xd7'  # 56.2 %, 21.5 C
+
+
+class FakeI2C:
+    def __init__(self, reply):
+        self.reply = reply
+
+    def writeto(self, address, buf):
+        pass
+
+    def readfrom_mem_into(self, address, memaddr, buf):
+        buf[:] = self.reply
+
+
+class LegacyAM2320(AM2320):
+    ''' the measure() and crc16() the driver had before the table and the in place checksum '''
+
+    def measure(self):
+        buf = self.buf
+        address = self.address
+        try:
+            self.i2c.writeto(address, b'')
+        except OSError:
+            pass
+        self.i2c.writeto(address, b'\x03\x00\x04')
+        am2320.time.sleep_ms(2)
+        self.i2c.readfrom_mem_into(address, 0, buf)
+        crc = ustruct.unpack('<H', bytearray(buf[-2:]))[0]
+        if (crc != self.crc16(buf[:-2])):
+            raise Exception("checksum error")
+
+    def crc16(self, buf, length=None):
+        crc = 0xFFFF
+        for c in buf:
+            crc ^= c
+            for i in range(8):
+                if crc & 0x01:
+                    crc >>= 1
+                    crc ^= 0xA001
+                else:
+                    crc >>= 1
+        return crc
+
+    def humidity(self):
+        return (self.buf[2] << 8 | self.buf[3]) * 0.1
+
+    def temperature(self):
+        t = ((self.buf[4] & 0x7f) << 8 | self.buf[5]) * 0.1
+        if self.buf[4] & 0x80:
+            t = -t
+        return t
+
+
+def signed_reply():
+    crc = AM2320().crc16(REPLY)
+    return REPLY + bytes((crc & 0xFF, crc >> 8))
+
+
+def measure_cost(func):
+    func()  # warm up
+    if MICROPY:
+        import gc
+        gc.collect()
+        gc.disable()
+        start = gc.mem_alloc()
+        for _ in range(CALLS):
+            func()
+        used = (gc.mem_alloc() - start) / CALLS
+        gc.enable()
+        return used
+    import time
+    start = time.perf_counter_ns()
+    for _ in range(CALLS):
+        func()
+    return (time.perf_counter_ns() - start) / CALLS
+
+
+def main():
+    am2320.time.sleep_ms = lambda ms: None
+    reply = signed_reply()
+    unit = "bytes allocated per call" if MICROPY else "ns per call"
+    print("{:<10} {:>12} {:>12}   ({})".format("", "crc16", "measure", unit))
+    for name, cls in (("bitwise", LegacyAM2320), ("table", AM2320)):
+        sensor = cls(FakeI2C(reply))
+        data = bytearray(reply)
+        if cls is LegacyAM2320:
+            crc_cost = measure_cost(lambda: sensor.crc16(data[:-2]))  # how measure() used to call it
+        else:
+            crc_cost = measure_cost(lambda: sensor.crc16(data, 6))
+        measure_call_cost = measure_cost(sensor.measure)
+        print("{:<10} {:>12.1f} {:>12.1f}   {:.1f} % {:.1f} C".format(
+            name, crc_cost, measure_call_cost, sensor.humidity(), sensor.temperature()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+'''
+allocations made by one 2-minute Weather cycle (24 samples, 5 rain tips, wind pulses,
+gust checks and the update/serialize step of main.update_weather_metrics) with the
+float path against Weather(fixed_point=True).
+
+the allocation count needs MicroPython (copy it to the board or run it with the
+unix port): it is the gc.mem_alloc() delta with the gc disabled. CPython has no
+equivalent (its float freelist and heap allocated ints hide the difference) so
+there only the time per cycle and the published values are printed; that time says
+nothing about allocations. what fixed point saves in allocations hasn't been
+measured yet.
+
+run from the repo root:  python3 tools/bench_fixed_point.py
+                  or:  MICROPYPATH=.:tools micropython tools/bench_fixed_point.py
+'''
+import sys
+
+if sys.implementation.name != "micropython":
+    import host_compat  # noqa: F401  (ticks_* and the repo root on sys.path)
+
+import weather
+
+SAMPLES_PER_CYCLE = 24
+CYCLES = 50
+MICROPY = sys.implementation.name == "micropython"
+
+
+def sample_values(fixed_point, i):
+    temperature_c = 21.5 + (i % 7) * 0.13
+    humidity = 55.0 + (i % 5) * 0.4
+    pressure_pa = 101325 + (i % 3)
+    if fixed_point:
+        return round(temperature_c * weather.CENTI), round(humidity * weather.CENTI), pressure_pa
+    return temperature_c, humidity, float(pressure_pa)
+
+
+def run_cycle(weather_obj, samples, now_ms):
+    for i, (temperature, humidity, pressure) in enumerate(samples):
+        weather_obj.add_temperature_reading(temperature)
+        weather_obj.add_humidity_reading(humidity)
+        weather_obj.add_pressure_reading(pressure)
+        weather_obj.add_wind_dir_reading(2200)
+        for _ in range(10):
+            now_ms += 500  # 10 anemometer pulses per 5 s sample
+            weather_obj.wind_pulses.record(now_ms)
+        weather_obj.check_wind_gust()
+        if i % 5 == 0:
+            weather_obj.rain_tips.record(now_ms)  # 5 bucket tips per cycle
+        weather_obj.check_rain_tips()
+    weather_obj.set_wind_direction(weather_obj.calculate_avg_wind_dir())
+    weather_obj.set_temperature(weather_obj.average_data_points(weather_obj.get_temperature_list()))
+    weather_obj.set_humidity(weather_obj.average_data_points(weather_obj.get_humidity_list()))
+    weather_obj.set_dew_point()
+    weather_obj.set_pressure(weather_obj.average_data_points(weather_obj.get_pressure_list()))
+    weather_obj.set_wind_speed(weather_obj.calculate_avg_wind_speed(120))
+    weather_obj.set_rain_count_hourly(weather_obj.calculate_hourly_rain(now_ms))
+    weather_obj.set_rain_rate(weather_obj.calculate_rain_rate(now_ms))
+    weather_obj.get_weather_data()
+    weather_obj.reset_wind_gust()
+    return now_ms
+
+
+def measure(fixed_point):
+    weather_obj = weather.Weather(sensor_data_pts=SAMPLES_PER_CYCLE, fixed_point=fixed_point)
+    samples = [sample_values(fixed_point, i) for i in range(SAMPLES_PER_CYCLE)]
+    now_ms = run_cycle(weather_obj, samples, 0)  # warm up
+    if MICROPY:
+        import gc
+        gc.collect()
+        gc.disable()
+        start = gc.mem_alloc()
+        for _ in range(CYCLES):
+            now_ms = run_cycle(weather_obj, samples, now_ms)
+        used = (gc.mem_alloc() - start) // CYCLES
+        gc.enable()
+        return used, weather_obj.get_weather_data()
+    import time
+    start = time.perf_counter_ns()
+    for _ in range(CYCLES):
+        now_ms = run_cycle(weather_obj, samples, now_ms)
+    used = (time.perf_counter_ns() - start) // CYCLES
+    return used, weather_obj.get_weather_data()
+
+
+def main():
+    unit = "bytes allocated per cycle" if MICROPY else "ns per cycle"
+    used = {}
+    for fixed_point in (False, True):
+        used[fixed_point], data = measure(fixed_point)
+        print("{:<12} {:>8} {}".format("fixed point" if fixed_point else "float", used[fixed_point], unit))
+        print("    {}".format(data))
+    if MICROPY:
+        print("fixed point saves {} bytes per cycle".format(used[False] - used[True]))
+    else:
+        print("CPython timing only, allocations aren't measured; run it on MicroPython for those")
+
+
+if __name__ == '__main__':
+    main()
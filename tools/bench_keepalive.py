@@ -0,0 +1,173 @@
+'''
+what reusing connections with mrequests.Session saves over a new connection per request.
+
+a local HTTP/1.1 server that keeps connections alive answers the station's two uploads,
+a wunderground style GET and a telegraf style json POST, over http and, when openssl is
+there to make a self-signed certificate, https. each is timed as mrequests.get()/post(),
+a connection (and tls handshake) per request, and on a Session. the server counts the
+connections it accepted. the last runs pause past the server's idle timeout between
+requests, the way the station's 2 minute uploads outlast most servers' keep-alive: a
+connection per request, a Session that tries its closed connection before reconnecting,
+and a Session whose idle limit is under the server's, which reconnects straight away.
+
+the latencies are CPython's over loopback: they show the round trips and the handshake
+a kept connection saves, not what they cost an ESP32, where the handshake alone takes
+seconds.
+
+run from the repo root:  python3 tools/bench_keepalive.py [--requests N]
+'''
+import http.server
+import json
+import os
+import shutil
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import host_compat  # noqa: F401  (ticks_*, const() and the repo root on sys.path)
+import mrequests
+
+REQUESTS = 200
+SERVER_IDLE_TIMEOUT_S = 0.5
+IDLE_RUN_REQUESTS = 20
+UPLOAD = {"Temperature": 61.3, "Humidity": 72.1, "Pressure": 29.91, "Wind": {"Speed": 4.2, "Gust": 9.1}}
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = SERVER_IDLE_TIMEOUT_S  # an idle kept connection is closed after this
+    wbufsize = -1  # the status line, headers and body go out together when the reply is flushed
+    disable_nagle_algorithm = True  # or a kept tls connection's first reply waits behind the session tickets
+    connections = 0
+    chunked = False
+
+    def setup(self):
+        super().setup()
+        Handler.connections += 1
+
+    def do_GET(self):
+        self.reply(b"success\n")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.reply(b"")
+
+    def reply(self, body):
+        self.send_response(200 if body else 204)
+        self.send_header("Content-Type", "text/plain")
+        if Handler.chunked and body:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(body), body))
+        else:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(certfile=None):
+    server = http.server.ThreadingHTTPServer(("localhost", 0), Handler)
+    server.daemon_threads = True
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_certificate(scratch):
+    ''' a self-signed certificate for localhost that the client trusts, None without openssl '''
+    if not shutil.which("openssl"):
+        return None
+    certfile = os.path.join(scratch, "localhost.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+        "-addext", "subjectAltName=DNS:localhost", "-keyout", certfile, "-out", certfile],
+        check=True, capture_output=True)
+    os.environ["SSL_CERT_FILE"] = certfile  # ssl.create_default_context() loads it as a trusted ca
+    return certfile
+
+
+def upload(requester, base_url):
+    ''' one update's uploads, what api_utils does with the response '''
+    response = requester.get(base_url + "/weatherstation/updateweatherstation.php?ID=KSIM&tempf=61.3")
+    response.text
+    response = requester.post(base_url + "/telegraf", data=json.dumps(UPLOAD))
+    response.close()
+
+
+def time_uploads(requester, base_url, count, pause_s=0.0):
+    times_ms = []
+    for _ in range(count):
+        if pause_s:
+            time.sleep(pause_s)
+        start = time.perf_counter()
+        upload(requester, base_url)
+        times_ms.append((time.perf_counter() - start) * 1000 / 2)
+    return times_ms
+
+
+def report(label, times_ms, connections, session=None):
+    times_ms = sorted(times_ms)
+    print("  {:<34} {:>8.3f} {:>8.3f} {:>8.3f} {:>8,}  {}".format(label, statistics.mean(times_ms),
+        statistics.median(times_ms), times_ms[int(len(times_ms) * 0.95)], connections,
+        repr(session) if session else ""))
+
+
+def bench(base_url, count):
+    print("{}  ({} updates of a GET and a POST, ms per request)".format(base_url, count))
+    print("  {:<34} {:>8} {:>8} {:>8} {:>8}".format("", "mean", "median", "p95", "conns"))
+    for chunked in (False, True):
+        Handler.chunked = chunked
+        body = "chunked" if chunked else "content-length"
+        Handler.connections = 0
+        times_ms = time_uploads(mrequests, base_url, count)
+        report("new connection each, " + body, times_ms, Handler.connections)
+        Handler.connections = 0
+        session = mrequests.Session()
+        times_ms = time_uploads(session, base_url, count)
+        session.close()
+        report("Session, " + body, times_ms, Handler.connections, session)
+    Handler.chunked = False
+    pause_s = SERVER_IDLE_TIMEOUT_S * 2
+    print("  the server closes the connection between requests:")
+    Handler.connections = 0
+    times_ms = time_uploads(mrequests, base_url, IDLE_RUN_REQUESTS, pause_s)
+    report("new connection each", times_ms, Handler.connections)
+    for label, idle_timeout_ms in (("Session, tries the closed one", mrequests.IDLE_TIMEOUT_MS),
+                                   ("Session, idle limit under server's", int(SERVER_IDLE_TIMEOUT_S * 1000) // 2)):
+        Handler.connections = 0
+        session = mrequests.Session(idle_timeout_ms)
+        times_ms = time_uploads(session, base_url, IDLE_RUN_REQUESTS, pause_s)
+        session.close()
+        report(label, times_ms, Handler.connections, session)
+
+
+def main():
+    count = REQUESTS
+    if "--requests" in sys.argv:
+        count = int(sys.argv[sys.argv.index("--requests") + 1])
+    scratch = tempfile.mkdtemp(prefix="station-keepalive-")
+    try:
+        server = start_server()
+        bench("http://localhost:{}".format(server.server_address[1]), count)
+        certfile = make_certificate(scratch)
+        if certfile is None:
+            print("no openssl to make a certificate with, skipping https")
+            return
+        server = start_server(certfile)
+        bench("https://localhost:{}".format(server.server_address[1]), count)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
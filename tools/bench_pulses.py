@@ -0,0 +1,161 @@
+'''
+what the anemometer's irq path costs and whether a fast pulse train gets through it.
+
+first a check that pulses coming after a gap longer than ticks_diff() can span (2**29
+ms, ~6.2 days) are recorded, not ignored as bounces, and that the first rain tip after
+such a dry spell is a rain rate of 0, not one made up from the time since it. then PulseBuffer.record(), the
+whole of the irq handler's work: on MicroPython (copy
+it with pulse_buffer.py to the board or run it with the unix port) us per pulse and
+bytes allocated per pulse, the gc.mem_alloc() delta with the gc disabled, which has
+to be 0 for a hard irq. on CPython it's ns per pulse.
+
+then, on CPython, main.py on the simulated station with the anemometer pulsing at a
+fixed rate up to several kHz, debounce off. every edge has to end up recorded and none
+may be overwritten before it's consumed. each rate also runs without the drain that
+PulseBuffer schedules every half buffer, leaving the pulses to the 5 s samples.
+
+run from the repo root:  python3 tools/bench_pulses.py [--minutes M] [--rates HZ,HZ,...]
+'''
+import sys
+
+MICROPY = sys.implementation.name == "micropython"
+if not MICROPY:
+    import host_compat  # noqa: F401  (ticks_*, const() and the repo root on sys.path)
+
+from time import ticks_add
+from pulse_buffer import PulseBuffer
+import weather
+
+PULSES = 20000
+RATES_HZ = (250, 1000, 2000, 5000)
+DAY_MS = 86_400_000
+GAPS_MS = ((1 << 29) + 1, 7 * DAY_MS, 12 * DAY_MS)  # past the reach of ticks_diff()
+TIPS_AFTER_GAP = 20
+RAIN_DEBOUNCE_MS = 500
+RATE_AFTER_TIP_MS = (1000, 60_000, 120_000)
+
+
+def check_ticks_wrap():
+    ''' tips after a long dry spell are recorded, whatever the ticks wrapped to meanwhile '''
+    for gap_ms in GAPS_MS:
+        for start_ms in (0, (1 << 30) - 1000):
+            tips = PulseBuffer(64, RAIN_DEBOUNCE_MS)
+            tips.record(start_ms)
+            now_ms = ticks_add(start_ms, gap_ms)
+            for _ in range(TIPS_AFTER_GAP):
+                tips.record(now_ms)
+                now_ms = ticks_add(now_ms, 1000)
+            tips.record(ticks_add(now_ms, -1000 + RAIN_DEBOUNCE_MS // 2))  # and a real bounce is still one
+            if tips.written() != TIPS_AFTER_GAP + 1 or tips.bounces != 1:
+                raise AssertionError("{} tips {} ms after the last one: {}".format(TIPS_AFTER_GAP, gap_ms, repr(tips)))
+    return "tips after gaps of {} ms all recorded".format(", ".join(str(gap_ms) for gap_ms in GAPS_MS))
+
+
+def check_rain_rate_after_gap():
+    ''' a tip days after the one before it is a rate of about 0 on both paths '''
+    for fixed_point in (False, True):
+        for gap_ms in (3 * DAY_MS,) + GAPS_MS:
+            weather_obj = weather.Weather(fixed_point=fixed_point)
+            weather_obj.rain_tips.record(0)
+            tip_ms = ticks_add(0, gap_ms)
+            weather_obj.rain_tips.record(tip_ms)
+            interval_ms = weather_obj.rain_tips.last_interval()
+            if interval_ms != (gap_ms if gap_ms < 1 << 29 else None):
+                raise AssertionError("tips {} ms apart: last_interval() {}".format(gap_ms, interval_ms))
+            for after_ms in RATE_AFTER_TIP_MS:
+                rate = weather_obj.calculate_rain_rate(ticks_add(tip_ms, after_ms))
+                if rate >= 0.001:
+                    raise AssertionError("{} ms after a tip {} ms after the last one, fixed point {}: rate {}".format(
+                        after_ms, gap_ms, fixed_point, rate))
+    return "the first tip after {} ms dry is a rate of 0".format(", ".join(str(gap_ms) for gap_ms in GAPS_MS))
+
+
+def record_cost(debounce_ms, step_ms):
+    ''' cost of record() for pulses step_ms apart, bounces when step_ms < debounce_ms '''
+    buffer = PulseBuffer(2048, debounce_ms)
+    record = buffer.record
+    record(0)
+    if MICROPY:
+        import gc
+        from time import ticks_us, ticks_diff
+        gc.collect()
+        gc.disable()
+        start_alloc = gc.mem_alloc()
+        start = ticks_us()
+        for i in range(PULSES):
+            record(i * step_ms)
+        took = ticks_diff(ticks_us(), start) / PULSES
+        used = (gc.mem_alloc() - start_alloc) / PULSES
+        gc.enable()
+        return "{:.1f} us and {:.2f} bytes allocated per pulse".format(took, used)
+    import time
+    start = time.perf_counter_ns()
+    for i in range(PULSES):
+        record(i * step_ms)
+    return "{:.0f} ns per pulse".format((time.perf_counter_ns() - start) / PULSES)
+
+
+def run_station(rate_hz, minutes, drain):
+    ''' main.py with the anemometer at rate_hz, returns (edges, recorded, bounces, lost) '''
+    import contextlib
+    import importlib
+    import json
+    import os
+    import shutil
+    import tempfile
+    from sim import SimStation, ScriptedScenario
+    import sim.station
+    from simulate import example_config
+
+    sim.station.MIN_EDGE_GAP_US = 1
+    import weather
+    wind_mph = rate_hz * weather.ANEMOMETER_CONSTANT / weather.KMH_PER_MPH
+    scenario = ScriptedScenario([(0, {"wind_mph": wind_mph})])
+    scenario.bounce_rate = 0.0
+    station = SimStation(scenario)
+    station.install()  # main.py imports the station's modules afresh, patch those copies
+    importlib.import_module("weather").WIND_DEBOUNCE_MS = 0
+    if not drain:
+        importlib.import_module("pulse_buffer").schedule = None
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="station-pulses-")
+    try:
+        os.makedirs(os.path.join(scratch, "conf"))
+        with open(os.path.join(scratch, "conf", "config.json"), "w") as fp:
+            json.dump(example_config(), fp)
+        os.chdir(scratch)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            main_globals = station.run_main(minutes / 60)
+    finally:
+        station.uninstall()
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+    pulses = main_globals["wind_pulses"]
+    return station.stats["wind_edges"], pulses.written(), pulses.bounces, pulses.lost
+
+
+def main():
+    print("ticks wrap: {}".format(check_ticks_wrap()))
+    print("ticks wrap: {}".format(check_rain_rate_after_gap()))
+    print("PulseBuffer.record(), the irq handler's work:")
+    print("  pulses recorded:  {}".format(record_cost(0, 1)))
+    print("  bounces ignored:  {}".format(record_cost(5, 1)))
+    if MICROPY:
+        return
+    minutes = 2.0
+    rates = RATES_HZ
+    if "--minutes" in sys.argv:
+        minutes = float(sys.argv[sys.argv.index("--minutes") + 1])
+    if "--rates" in sys.argv:
+        rates = [int(rate) for rate in sys.argv[sys.argv.index("--rates") + 1].split(",")]
+    print("main.py on the simulated station for {} min per rate, anemometer debounce off:".format(minutes))
+    print("{:>8} {:>10} {:>10} {:>10} {:>10}  {}".format("rate Hz", "edges", "recorded", "bounces", "lost", "drain"))
+    for rate_hz in rates:
+        for drain in (True, False):
+            edges, recorded, bounces, lost = run_station(rate_hz, minutes, drain)
+            print("{:>8} {:>10,} {:>10,} {:>10,} {:>10,}  {}".format(rate_hz, edges, recorded, bounces, lost,
+                "every half buffer" if drain else "samples only"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+'''
+host-side benchmark of the per-sample cost of a Weather sample window:
+the old list.append() + list.pop(0) against RingBuffer.push(), and of the
+aggregate step: averaging a list copy against RunningWindow.mean().
+
+run from the repo root:  python3 tools/bench_ring_buffer.py
+'''
+import time
+import tracemalloc
+
+import host_compat  # noqa: F401  (puts the repo root on sys.path)
+from ring_buffer import RingBuffer, RunningWindow
+
+WINDOW_SIZES = (24, 60, 240, 1000, 10000)
+SAMPLES = 200_000
+AGGREGATES = 2_000
+
+
+def list_window(size):
+    window = [0.0] * size
+
+    def add(val):
+        window.append(val)
+        window.pop(0)
+    return add
+
+
+def ring_window(size):
+    return RingBuffer(size).push
+
+
+def time_per_sample(add):
+    start = time.perf_counter_ns()
+    for i in range(SAMPLES):
+        add(i * 0.5)
+    return (time.perf_counter_ns() - start) / SAMPLES
+
+
+def peak_alloc(add):
+    ''' peak bytes allocated while pushing samples into an already built window '''
+    tracemalloc.start()
+    for i in range(10_000):
+        add(i * 0.5)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def list_average(size):
+    window = [i * 0.5 for i in range(size)]
+
+    def average():
+        list_with_no_nones = [x for x in window if x]
+        return sum(list_with_no_nones) / len(list_with_no_nones)
+    return average
+
+
+def running_average(size):
+    window = RunningWindow(size)
+    for i in range(size):
+        window.push(i * 0.5)
+    return window.mean
+
+
+def time_per_aggregate(average):
+    start = time.perf_counter_ns()
+    for _ in range(AGGREGATES):
+        average()
+    return (time.perf_counter_ns() - start) / AGGREGATES
+
+
+def main():
+    print("{:>8} {:>14} {:>14} {:>16} {:>16}".format(
+        "window", "list ns/sample", "ring ns/sample", "list peak bytes", "ring peak bytes"))
+    for size in WINDOW_SIZES:
+        print("{:>8} {:>14.1f} {:>14.1f} {:>16} {:>16}".format(
+            size,
+            time_per_sample(list_window(size)),
+            time_per_sample(ring_window(size)),
+            peak_alloc(list_window(size)),
+            peak_alloc(ring_window(size))
+        ))
+    print()
+    print("{:>8} {:>14} {:>14} {:>14}".format("window", "list avg ns", "running ns", "running push ns"))
+    for size in WINDOW_SIZES:
+        print("{:>8} {:>14.1f} {:>14.1f} {:>14.1f}".format(
+            size,
+            time_per_aggregate(list_average(size)),
+            time_per_aggregate(running_average(size)),
+            time_per_sample(RunningWindow(size).push)
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+'''
+single adc readings against WindVane bursts for a vane resting a few adc counts from
+the boundary between two sectors of the direction table, with gaussian adc noise.
+prints how often consecutive samples disagree on the sector (a flip) and what a burst
+costs.
+
+on MicroPython (copy it with wind_vane.py and weather.py to the board or run it with
+the unix port) the cost is us per burst and bytes allocated per burst, the gc.mem_alloc()
+delta with the gc disabled; the adc is faked so that's the mapping's cost on top of
+len(samples) adc reads. on CPython it's ns per burst.
+
+run from the repo root:  python3 tools/bench_wind_vane.py [--noise ADC_COUNTS]
+'''
+import random
+import sys
+
+if sys.implementation.name != "micropython":
+    import host_compat  # noqa: F401  (ticks_*, const() and the repo root on sys.path)
+
+import weather
+from wind_vane import WindVane
+
+MICROPY = sys.implementation.name == "micropython"
+SAMPLES = 2000
+BURSTS = 500
+
+
+class NoisyADC:
+    def __init__(self, centre, noise):
+        self.centre = centre
+        self.noise = noise
+
+    def read(self):
+        return max(0, min(weather.WIND_ADC_RESOLUTION - 1, int(random.gauss(self.centre, self.noise))))
+
+
+class RecordedADC:
+    ''' plays back readings taken up front so the timing doesn't include the noise generator '''
+
+    def __init__(self, readings):
+        self.readings = readings
+        self.i = 0
+
+    def read(self):
+        self.i = (self.i + 1) % len(self.readings)
+        return self.readings[self.i]
+
+
+def flips(sectors):
+    return sum(1 for i in range(1, len(sectors)) if sectors[i] != sectors[i - 1])
+
+
+def burst_cost(vane, table):
+    vane.read_sector(table)  # warm up
+    if MICROPY:
+        import gc
+        from time import ticks_us, ticks_diff
+        gc.collect()
+        gc.disable()
+        start_alloc = gc.mem_alloc()
+        start = ticks_us()
+        for _ in range(BURSTS):
+            vane.read_sector(table)
+        took = ticks_diff(ticks_us(), start) / BURSTS
+        used = (gc.mem_alloc() - start_alloc) / BURSTS
+        gc.enable()
+        return "{:.0f} us and {:.1f} bytes allocated per burst".format(took, used)
+    import time
+    start = time.perf_counter_ns()
+    for _ in range(BURSTS):
+        vane.read_sector(table)
+    return "{:.0f} ns per burst".format((time.perf_counter_ns() - start) / BURSTS)
+
+
+def main():
+    noise = 25
+    if "--noise" in sys.argv:
+        noise = float(sys.argv[sys.argv.index("--noise") + 1])
+    random.seed(1)
+    table = weather.WIND_DIR_TABLE
+    start, end = weather.WIND_DIR_CALIBRATION["N"]  # W/NW starts at end
+    distances = (5, 15, 30)
+    print("flips in {} samples of a vane resting inside N, noise sd {} adc counts".format(SAMPLES, noise))
+    print("{:<14}".format("counts from W/NW") + "".join("{:>8}".format(d) for d in distances))
+    rows = [("single read", None)] + [("burst of {}".format(n), n) for n in (4, 8, 16, 32)]
+    for name, samples in rows:
+        line = "{:<14}".format(name)
+        for distance in distances:
+            adc = NoisyADC(end - distance, noise)
+            if samples is None:
+                sectors = [table[adc.read()] for _ in range(SAMPLES)]
+            else:
+                vane = WindVane(adc, samples)
+                sectors = [vane.read_sector(table) for _ in range(SAMPLES)]
+            line += "{:>8}".format(flips(sectors))
+        print(line)
+    adc = NoisyADC(end - distances[0], noise)
+    readings = [adc.read() for _ in range(1024)]
+    for samples in (4, 8, 16, 32):
+        print("burst of {:<5} {}".format(samples, burst_cost(WindVane(RecordedADC(readings), samples), table)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''
+checks of DS18B20Scheduler against a fake bus: the pipelined reads, and that a bus
+that stops answering the convert broadcast (no presence pulse, a short) makes the
+probes read None instead of the last good temperature forever.
+
+run from the repo root:  python3 tools/check_ds18b20_scheduler.py
+'''
+import host_compat  # noqa: F401  (ticks_*, const() and the repo root on sys.path)
+
+from ds18b20_scheduler import DS18B20Scheduler, CONVERSION_MS
+
+ROMS = (b"probe-a", b"probe-b")
+
+
+class FakeDS18X20:
+    ''' the probes read their conversion's number of degrees C, convert_temp() fails while shorted '''
+
+    def __init__(self):
+        self.shorted = False
+        self.conversions = 0
+
+    def scan(self):
+        return list(ROMS)
+
+    def convert_temp(self):
+        if self.shorted:
+            raise OSError("no presence pulse")
+        self.conversions += 1
+
+    def read_temp(self, rom):
+        return 20.0 + self.conversions + ROMS.index(rom)
+
+
+def check_pipeline():
+    ds = FakeDS18X20()
+    probes = DS18B20Scheduler(ds)
+    probes.tick(0)
+    if probes.mean() is not None or probes.tick(CONVERSION_MS - 1):
+        raise AssertionError("a reading before the first conversion finished")
+    if not probes.tick(CONVERSION_MS) or probes.mean() != 21.5:
+        raise AssertionError("the first conversion read {}".format(probes.mean()))
+    return "{} probes read together, {} conversions".format(probes.count(), ds.conversions)
+
+
+def check_convert_fails():
+    ds = FakeDS18X20()
+    probes = DS18B20Scheduler(ds)
+    now_ms = 0
+    probes.tick(now_ms)
+    now_ms += CONVERSION_MS
+    probes.tick(now_ms)
+    if probes.mean() is None:
+        raise AssertionError("no reading before the bus failed")
+    ds.shorted = True
+    for _ in range(3):
+        now_ms += CONVERSION_MS
+        try:
+            probes.tick(now_ms)
+        except OSError:
+            pass
+        else:
+            raise AssertionError("a failed convert_temp() wasn't raised to the caller")
+        if probes.mean() is not None or probes.temperature(0) is not None:
+            raise AssertionError("the last good reading {} stood in after convert_temp() failed".format(probes.mean()))
+    ds.shorted = False
+    now_ms += CONVERSION_MS
+    probes.tick(now_ms)  # starts a conversion, there was none to read
+    if probes.mean() is not None:
+        raise AssertionError("a reading without a conversion")
+    now_ms += CONVERSION_MS
+    if not probes.tick(now_ms) or probes.mean() is None:
+        raise AssertionError("no reading once the bus answered again")
+    return "None while convert_temp() failed ({} times), read again once it didn't".format(probes.convert_errors)
+
+
+def main():
+    print("pipeline: {}".format(check_pipeline()))
+    print("convert fails: {}".format(check_convert_fails()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+'''
+lets the station modules import on CPython for the host-side tools:
+adds the MicroPython-only time.ticks_* functions, the const() builtin and
+the ujson module name. importing it also puts the repo root on sys.path.
+'''
+import builtins
+import json
+import os
+import sys
+import time
+
+TICKS_PERIOD = 1 << 30  # MicroPython's ticks wrap at 2**30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALF_PERIOD = TICKS_PERIOD >> 1
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def ticks_ms():
+    return int(time.monotonic() * 1000) & TICKS_MAX
+
+
+def ticks_us():
+    return int(time.monotonic() * 1000000) & TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(new, old):
+    return ((new - old + TICKS_HALF_PERIOD) & TICKS_MAX) - TICKS_HALF_PERIOD
+
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    time.sleep(us / 1000000)
+
+
+for _name, _func in (
+    ("ticks_ms", ticks_ms), ("ticks_us", ticks_us), ("ticks_add", ticks_add),
+    ("ticks_diff", ticks_diff), ("sleep_ms", sleep_ms), ("sleep_us", sleep_us)
+):
+    if not hasattr(time, _name):
+        setattr(time, _name, _func)
+
+if not hasattr(builtins, "const"):
+    builtins.const = lambda val: val
+
+sys.modules.setdefault("ujson", json)
+
+
+def expose_class_consts(cls):
+    '''
+    MicroPython inlines a class body's X = const(...) names, so the drivers use them bare
+    inside their methods. CPython doesn't, so copy them into the driver module's globals.
+    '''
+    module_globals = sys.modules[cls.__module__].__dict__
+    for name, val in vars(cls).items():
+        if name.isupper() and isinstance(val, int):
+            module_globals.setdefault(name, val)
@@ -0,0 +1,578 @@
+'''
+re-runs the Weather aggregation over a recorded sample log on the host, to backfill
+reports or re-derive them after the aggregation changes. every 2 minute report main.py
+would have made is rebuilt: averages (with the outlier filters), wind vector mean,
+dew point, wind speed and gust, hourly and daily rain and rain rate.
+
+the log is a csv file, one record per line, times are unwrapped epoch milliseconds:
+    S,<t_ms>,<temperature C>,<humidity %>,<pressure Pa>,<wind vane adc>    one 5 s sample
+    W,<t_ms>                                                              one anemometer pulse
+    R,<t_ms>                                                              one rain bucket tip
+an empty reading field is a failed read. pulses and tips are the raw reed switch edges,
+debouncing is done by the replay the same way PulseBuffer does it on the device.
+
+there are two engines giving the same reports:
+    scalar  feeds the log through weather.Weather sample by sample the way main.py does.
+            it's the reference and only needs the standard library.
+    numpy   does the per-sample and per-pulse work as array operations and only finishes
+            each report (unit conversion and rounding) with Weather's own methods.
+both take Weather's arguments, fixed_point and filters among them: with fixed_point the
+readings go in as the fixed point drivers give them, hundredths of a degree C and of a
+percent and whole Pa. a report is made after every SAMPLES_PER_UPDATE samples and the
+daily rain resets after the first report of each local midnight hour.
+
+run from the repo root:
+    python3 tools/replay.py LOG [--engine auto|numpy|scalar] [--utc-offset-hours H] [--out CSV]
+    python3 tools/replay.py --check [--hours H]    parity and speed of the engines on a synthetic log
+                                                   and a week long dry spell across a ticks wrap, float,
+                                                   fixed point and with a filter turned off
+'''
+import argparse
+import csv
+import math
+import random
+import sys
+import time
+from array import array
+
+from host_compat import TICKS_MAX
+from time import ticks_diff
+import weather
+from ring_buffer import round_div
+from api_utils import TEMPERATURE_KEY, PRESSURE_KEY, HUMIDITY_KEY, DEW_POINT_KEY, WIND_KEY, \
+    WIND_DIRECTION_KEY, WIND_SPEED_KEY, WIND_GUST_KEY, RAIN_KEY, RAIN_COUNT_DAILY_KEY, \
+    RAIN_COUNT_HOURLY_KEY, RAIN_RATE_KEY
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SAMPLE_PERIOD_MS = 5000  # main.DATA_POINT_CHECK_PERIOD
+SAMPLES_PER_UPDATE = 24  # main.DATA_POINTS_PER_UPDATE
+UPDATES_PER_HOUR = 30  # main.UPDATES_PER_HOUR
+HOUR_MS = weather.HOUR_MS
+REPORT_FIELDS = (
+    "t_ms", "temperature", "humidity", "pressure", "dew_point",
+    "wind_direction", "wind_speed", "wind_gust",
+    "rain_hourly", "rain_daily", "rain_rate",
+    "rejected_temperature", "rejected_humidity", "rejected_pressure"
+)
+FILTERED_KEYS = (TEMPERATURE_KEY, HUMIDITY_KEY, PRESSURE_KEY)
+DRY_SPELL_MS = 7 * 24 * HOUR_MS  # past the 2**29 ms ticks_diff() reaches
+
+
+class SampleLog:
+    ''' columns of a recorded log, failed reads are nan '''
+
+    def __init__(self):
+        self.t_ms = array("q")
+        self.temperature = array("d")
+        self.humidity = array("d")
+        self.pressure = array("d")
+        self.wind_adc = array("l")
+        self.wind_stamps = array("q")
+        self.rain_stamps = array("q")
+
+    def __len__(self):
+        return len(self.t_ms)
+
+    def add_sample(self, t_ms, temperature, humidity, pressure, wind_adc):
+        self.t_ms.append(t_ms)
+        self.temperature.append(math.nan if temperature is None else temperature)
+        self.humidity.append(math.nan if humidity is None else humidity)
+        self.pressure.append(math.nan if pressure is None else pressure)
+        self.wind_adc.append(wind_adc)
+
+    def sort_stamps(self):
+        self.wind_stamps = array("q", sorted(self.wind_stamps))
+        self.rain_stamps = array("q", sorted(self.rain_stamps))
+
+
+def read_log(path):
+    log = SampleLog()
+    with open(path, newline="") as log_file:
+        for row in csv.reader(log_file):
+            if not row or row[0].startswith("#"):
+                continue
+            if row[0] == "S":
+                readings = [float(field) if field else None for field in row[2:5]]
+                log.add_sample(int(row[1]), *readings, int(row[5]))
+            elif row[0] == "W":
+                log.wind_stamps.append(int(row[1]))
+            elif row[0] == "R":
+                log.rain_stamps.append(int(row[1]))
+            else:
+                raise ValueError("Unknown record in {}: {}".format(path, row))
+    log.sort_stamps()
+    return log
+
+
+def write_log(log, path):
+    def field(val):
+        return "" if val != val else repr(val)
+    with open(path, "w", newline="") as log_file:
+        writer = csv.writer(log_file)
+        for i in range(len(log)):
+            writer.writerow(("S", log.t_ms[i], field(log.temperature[i]), field(log.humidity[i]),
+                             field(log.pressure[i]), log.wind_adc[i]))
+        writer.writerows(("W", stamp) for stamp in log.wind_stamps)
+        writer.writerows(("R", stamp) for stamp in log.rain_stamps)
+
+
+def synthetic_log(hours, seed=1, start_ms=1_700_000_000_000):
+    '''
+    a log with the things the aggregation has to deal with: failed reads, outliers,
+    gusts, reed switch bounces, rain showers and a local midnight
+    '''
+    rng = random.Random(seed)
+    log = SampleLog()
+    samples = hours * HOUR_MS // SAMPLE_PERIOD_MS
+    adc_centres = [(start + end) // 2 for start, end in weather.WIND_DIR_CALIBRATION.values()]
+    wind_adc = adc_centres[0]
+    for i in range(samples):
+        t_ms = start_ms + i * SAMPLE_PERIOD_MS + rng.randint(0, 3)
+        day_angle = 2 * math.pi * i * SAMPLE_PERIOD_MS / (24 * HOUR_MS)
+        temperature = 12 + 8 * math.sin(day_angle) + rng.gauss(0, 0.1)
+        humidity = min(100.0, 70 - 20 * math.sin(day_angle) + rng.gauss(0, 0.5))
+        pressure = 101325 + 400 * math.sin(day_angle / 3) + rng.gauss(0, 8)
+        outlier = rng.random()
+        if outlier < 0.003:
+            temperature = 85.0  # ds18b20 power on value
+        elif outlier < 0.006:
+            humidity = rng.choice((0.0, 6553.5))
+        elif outlier < 0.009:
+            pressure = rng.choice((0.0, pressure + 2500))
+        if rng.random() < 0.01:
+            temperature = None
+        if rng.random() < 0.01:
+            humidity = None
+        if rng.random() < 0.01:
+            pressure = None
+        if rng.random() < 0.1:
+            wind_adc = rng.choice(adc_centres)
+        log.add_sample(t_ms, temperature, humidity, pressure, wind_adc + rng.randint(-20, 20))
+    end_ms = start_ms + samples * SAMPLE_PERIOD_MS
+    t_ms = start_ms
+    while t_ms < end_ms:
+        gusting = (t_ms // 20_000) % 7 == 0
+        t_ms += 1 + int(rng.expovariate(1 / (40 if gusting else 250)))
+        log.wind_stamps.append(t_ms)
+        if rng.random() < 0.05:
+            log.wind_stamps.append(t_ms + rng.randint(1, 6))  # bounce
+    for _ in range(hours // 6 + 1):
+        t_ms = rng.randrange(start_ms, end_ms)
+        for _ in range(rng.randint(5, 60)):
+            t_ms += rng.randint(20_000, 600_000)
+            log.rain_stamps.append(t_ms)
+            if rng.random() < 0.1:
+                log.rain_stamps.append(t_ms + rng.randint(10, 400))  # bounce
+    log.sort_stamps()
+    return log
+
+
+def dry_spell_log(seed=1):
+    '''
+    a synthetic_log() with a shower, DRY_SPELL_MS without a tip and another shower,
+    longer than ticks_diff() reaches. it starts just before ticks_ms() wraps.
+    '''
+    rng = random.Random(seed)
+    start_ms = ((1_700_000_000_000 >> 30) + 1 << 30) - 2 * HOUR_MS
+    log = synthetic_log(DRY_SPELL_MS // HOUR_MS + 12, seed, start_ms)
+    rain_stamps = []
+    t_ms = start_ms + HOUR_MS
+    for shower in range(2):
+        for _ in range(40):
+            t_ms += rng.randint(20_000, 300_000)
+            rain_stamps.append(t_ms)
+            if rng.random() < 0.1:
+                rain_stamps.append(t_ms + rng.randint(10, 400))  # bounce
+        t_ms += DRY_SPELL_MS
+    log.rain_stamps = array("q", sorted(rain_stamps))
+    return log
+
+
+def is_midnight_hour(t_ms, utc_offset_ms):
+    return (t_ms + utc_offset_ms) // HOUR_MS % 24 == 0
+
+
+def daily_resets(update_times, utc_offset_ms):
+    ''' per report, whether main.py's midnight check resets the daily rain right after it '''
+    needs_reset = True
+    resets = []
+    for t_ms in update_times:
+        reset = False
+        if is_midnight_hour(t_ms, utc_offset_ms):
+            if needs_reset:
+                reset = True
+                needs_reset = False
+        else:
+            needs_reset = True
+        resets.append(reset)
+    return resets
+
+
+def seconds_between_updates(update_times, first_sample_ms):
+    ''' the delta main.py passes to calculate_avg_wind_speed; it boots one sample period before the first sample '''
+    previous = first_sample_ms - SAMPLE_PERIOD_MS
+    deltas = []
+    for t_ms in update_times:
+        deltas.append((t_ms - previous) // 1000)
+        previous = t_ms
+    return deltas
+
+
+def make_report(t_ms, data, rejected):
+    wind = data[WIND_KEY]
+    rain = data[RAIN_KEY]
+    return (
+        t_ms, data[TEMPERATURE_KEY], data[HUMIDITY_KEY], data[PRESSURE_KEY], data[DEW_POINT_KEY],
+        wind[WIND_DIRECTION_KEY], wind[WIND_SPEED_KEY], wind[WIND_GUST_KEY],
+        rain[RAIN_COUNT_HOURLY_KEY], rain[RAIN_COUNT_DAILY_KEY], rain[RAIN_RATE_KEY]
+    ) + tuple(rejected)
+
+
+def reading_columns(log, fixed_point=False):
+    ''' the log's temperature, humidity and pressure columns in the units Weather takes, nan for a failed read '''
+    columns = (log.temperature, log.humidity, log.pressure)
+    if not fixed_point:
+        return columns
+    scales = (weather.CENTI, weather.CENTI, 1)
+    return tuple(array("d", (val if val != val else float(round(val * scale)) for val in column))
+                 for column, scale in zip(columns, scales))
+
+
+def weather_filters(weather_args):
+    ''' the outlier filters a Weather made with weather_args uses '''
+    filters = weather_args.get("filters")
+    if filters is None:
+        return weather.default_filters(weather_args.get("fixed_point", False))
+    return filters
+
+
+def replay_scalar(log, utc_offset_ms=0, **weather_args):
+    ''' feed the log through Weather the way main.py's timer and update loop do '''
+    weather_obj = weather.Weather(
+        updates_per_hr=UPDATES_PER_HOUR, sensor_data_pts=SAMPLES_PER_UPDATE, **weather_args
+    )
+    temperatures, humidities, pressures = reading_columns(log, weather_obj.fixed_point)
+    as_reading = int if weather_obj.fixed_point else float
+
+    def reading(val):
+        return None if val != val else as_reading(val)
+
+    updates = len(log) // SAMPLES_PER_UPDATE
+    update_times = [log.t_ms[(k + 1) * SAMPLES_PER_UPDATE - 1] for k in range(updates)]
+    resets = daily_resets(update_times, utc_offset_ms)
+    deltas = seconds_between_updates(update_times, log.t_ms[0]) if updates else []
+    wind_stamps, rain_stamps = log.wind_stamps, log.rain_stamps
+    next_wind = next_rain = 0
+    reports = []
+    for i in range(updates * SAMPLES_PER_UPDATE):
+        now_ms = log.t_ms[i]
+        # the irqs record every edge up to this sample before the timer callback runs
+        while next_wind < len(wind_stamps) and wind_stamps[next_wind] <= now_ms:
+            weather_obj.wind_pulses.record(wind_stamps[next_wind] & TICKS_MAX)
+            next_wind += 1
+        while next_rain < len(rain_stamps) and rain_stamps[next_rain] <= now_ms:
+            weather_obj.rain_tips.record(rain_stamps[next_rain] & TICKS_MAX)
+            next_rain += 1
+        weather_obj.add_humidity_reading(reading(humidities[i]))
+        weather_obj.add_wind_dir_reading(log.wind_adc[i])
+        weather_obj.add_temperature_reading(reading(temperatures[i]))
+        weather_obj.add_pressure_reading(reading(pressures[i]))
+        weather_obj.check_wind_gust()
+        weather_obj.check_rain_tips()
+        if (i + 1) % SAMPLES_PER_UPDATE:
+            continue
+        k = i // SAMPLES_PER_UPDATE
+        now_ticks = now_ms & TICKS_MAX
+        weather_obj.set_wind_direction(weather_obj.calculate_avg_wind_dir())
+        weather_obj.set_temperature(weather_obj.average_data_points(weather_obj.get_temperature_list()))
+        weather_obj.set_humidity(weather_obj.average_data_points(weather_obj.get_humidity_list()))
+        weather_obj.set_dew_point()
+        weather_obj.set_pressure(weather_obj.average_data_points(weather_obj.get_pressure_list()))
+        weather_obj.set_wind_speed(weather_obj.calculate_avg_wind_speed(deltas[k]))
+        weather_obj.check_rain_tips()
+        weather_obj.set_rain_count_hourly(weather_obj.calculate_hourly_rain(now_ticks))
+        weather_obj.set_rain_rate(weather_obj.calculate_rain_rate(now_ticks))
+        weather_obj.close_rollup_period()
+        rejected = [weather_obj.get_rejected_count(key) for key in FILTERED_KEYS]
+        reports.append(make_report(now_ms, weather_obj.get_weather_data(), rejected))
+        weather_obj.reset_wind_gust()
+        if resets[k]:
+            weather_obj.reset_daily_rain_count()
+            weather_obj.close_rollup_day()
+    return reports
+
+
+def debounce(np, stamps, debounce_ms):
+    '''
+    the stamps PulseBuffer.record() keeps. an edge further than debounce_ms from the edge
+    before it is always kept, since the last kept edge can't be any closer; only the
+    runs of close edges need walking one by one, and those are rare.
+    '''
+    if not len(stamps):
+        return stamps
+    keep = np.ones(len(stamps), dtype=bool)
+    keep[1:] = np.diff(stamps) >= debounce_ms
+    close = np.flatnonzero(~keep)
+    if not len(close):
+        return stamps
+    kept_before = keep[close - 1].tolist()
+    stamps_before = stamps[close - 1].tolist()
+    close_stamps = stamps[close].tolist()
+    last_kept = 0
+    for n, i in enumerate(close.tolist()):
+        if kept_before[n]:
+            last_kept = stamps_before[n]  # a run starts after a kept edge
+        if close_stamps[n] - last_kept >= debounce_ms:
+            keep[i] = True
+            last_kept = close_stamps[n]
+    return stamps[keep]
+
+
+def hampel(np, values, filt, fixed_point=False):
+    '''
+    what add_*_reading pushes for each reading: the stored value (float32, or the int
+    itself with fixed_point), or nan for a failed or rejected read, plus the rejected
+    mask. filt is the HampelFilter Weather would use; its history is the in-range
+    readings, so the windows are slices of those.
+    '''
+    present = ~np.isnan(values)
+    in_range = present.copy()
+    stored = values if fixed_point else values.astype(np.float32)
+    if filt is None:
+        return np.where(present, stored, np.nan), np.zeros(len(values), dtype=bool)
+    if filt.low is not None:
+        in_range &= values >= filt.low
+    if filt.high is not None:
+        in_range &= values <= filt.high
+    raw = values[in_range]
+    history = raw if fixed_point else raw.astype(np.float32).astype(np.float64)
+    accepted = np.ones(len(raw), dtype=bool)
+    limit_scale = filt.threshold * weather.HampelFilter.MAD_SCALE_MILLI
+    min_limit = filt.min_deviation * 1000
+    window = filt.window
+
+    def check(first, windows):
+        held = windows.shape[1]
+        median = np.sort(windows, axis=1)[:, held // 2]
+        mad = np.sort(np.abs(windows - median[:, None]), axis=1)[:, held // 2]
+        limit = np.maximum(limit_scale * mad, min_limit)
+        accepted[first:first + len(windows)] = np.abs(raw[first:first + len(windows)] - median) * 1000 <= limit
+
+    for j in range(3, min(window, len(raw))):  # the history is still filling up
+        check(j, history[None, :j])
+    if len(raw) > window:
+        check(window, np.lib.stride_tricks.sliding_window_view(history[:-1], window))
+    kept = np.zeros(len(values), dtype=bool)
+    kept[np.flatnonzero(in_range)[accepted]] = True
+    return np.where(kept, stored, np.nan), present & ~kept
+
+
+def mean(total, count, fixed_point):
+    ''' RunningWindow.mean() of a window holding count readings that add up to total '''
+    if not count:
+        return 0 if fixed_point else 0.0
+    return round_div(total, count) if fixed_point else total / count
+
+
+def rain_rate(weather_obj, rain, tips, now_ms):
+    '''
+    calculate_rain_rate() at now_ms once the first tips of the debounced stamps in rain
+    are recorded. the interval is taken in wrapped ticks as the device takes it, so two
+    tips further apart than ticks_diff() reaches are no interval, not the true one
+    '''
+    if tips < 2 or now_ms - rain[tips - 1] >= HOUR_MS:
+        return weather_obj.rain_rate_from_interval(None, HOUR_MS)
+    interval_ms = ticks_diff(rain[tips - 1] & TICKS_MAX, rain[tips - 2] & TICKS_MAX)
+    if interval_ms <= 0:
+        return weather_obj.rain_rate_from_interval(None, HOUR_MS)
+    return weather_obj.rain_rate_from_interval(interval_ms, now_ms - rain[tips - 1])
+
+
+def replay_numpy(log, utc_offset_ms=0, **weather_args):
+    ''' the same reports as replay_scalar(), with the per-sample work done as array operations '''
+    np = numpy
+    finisher = weather.Weather(
+        updates_per_hr=UPDATES_PER_HOUR, sensor_data_pts=SAMPLES_PER_UPDATE, **weather_args
+    )
+    fixed_point = finisher.fixed_point
+    filters = weather_filters(weather_args)
+    updates = len(log) // SAMPLES_PER_UPDATE
+    samples = updates * SAMPLES_PER_UPDATE
+    if not updates:
+        return []
+    t_ms = np.frombuffer(log.t_ms, dtype=np.int64)[:samples]
+    update_times = t_ms[SAMPLES_PER_UPDATE - 1::SAMPLES_PER_UPDATE]
+
+    # each 2 minute window holds exactly the samples of one report
+    means = {}
+    rejected = {}
+    for key, column in zip(FILTERED_KEYS, reading_columns(log, fixed_point)):
+        pushed, rejected_mask = hampel(np, np.frombuffer(column, dtype=np.float64)[:samples], filters[key], fixed_point)
+        pushed = pushed.reshape(updates, SAMPLES_PER_UPDATE)
+        # RunningWindow resyncs its sum on each report's last push, adding oldest to newest;
+        # a float sum depends on the order, and nansum() adds pairwise
+        totals = np.cumsum(np.nan_to_num(pushed.astype(np.float64)), axis=1)[:, -1]
+        if fixed_point:
+            totals = totals.astype(np.int64)  # the readings are ints, their sums exact in a float64
+        counts = (~np.isnan(pushed)).sum(axis=1).tolist()
+        means[key] = [mean(total, count, fixed_point) for total, count in zip(totals.tolist(), counts)]
+        rejected[key] = np.cumsum(rejected_mask)[SAMPLES_PER_UPDATE - 1::SAMPLES_PER_UPDATE].tolist()
+
+    adc = np.frombuffer(log.wind_adc, dtype=np.dtype("l"))[:samples]
+    if fixed_point:
+        coordinates = np.array(weather.WIND_DIR_COORDINATES_FIXED, dtype=np.int64)
+    else:
+        coordinates = np.array(weather.WIND_DIR_COORDINATES, dtype=np.float32).astype(np.float64)
+    table = np.frombuffer(weather.WIND_DIR_TABLE, dtype=np.uint8)
+    xy = coordinates[table[np.clip(adc, 0, weather.WIND_ADC_RESOLUTION - 1)]]
+    out_of_range = (adc < 0) | (adc >= weather.WIND_ADC_RESOLUTION)
+    xy[out_of_range] = coordinates[weather.WIND_DIRECTION_NAMES.index(weather.DEFAULT_WIND_DIRECTION)]
+    xy_sums = xy.reshape(updates, SAMPLES_PER_UPDATE, 2).sum(axis=1).tolist()
+
+    wind = debounce(np, np.frombuffer(log.wind_stamps, dtype=np.int64), weather.WIND_DEBOUNCE_MS)
+    wind_ends = np.searchsorted(wind, update_times, side="right")
+    # pulses in the gust window ending at each pulse, the window slides across reports
+    in_window = np.arange(1, len(wind) + 1) - np.searchsorted(wind, wind - weather.GUST_WINDOW_MS, side="right")
+    wind_starts = np.concatenate(([0], wind_ends[:-1]))
+    gust_peaks = np.maximum.reduceat(np.append(in_window, 0), wind_starts)
+    gust_peaks[wind_starts == wind_ends] = 0
+    wind_pulses = (wind_ends - wind_starts).tolist()
+    gust_peaks = gust_peaks.tolist()
+
+    rain = debounce(np, np.frombuffer(log.rain_stamps, dtype=np.int64), weather.RAIN_DEBOUNCE_MS)
+    rain_ends = np.searchsorted(rain, update_times, side="right")
+    rain_hourly = (rain_ends - np.searchsorted(rain, update_times - HOUR_MS, side="right")).tolist()
+    rain_ends = rain_ends.tolist()
+    rain = rain.tolist()
+    update_times = update_times.tolist()
+
+    resets = daily_resets(update_times, utc_offset_ms)
+    deltas = seconds_between_updates(update_times, int(t_ms[0]))
+    reports = []
+    daily_start = 0
+    for k, now_ms in enumerate(update_times):
+        angle = weather.Weather.get_angle_in_degrees(*xy_sums[k])
+        finisher.set_wind_direction(round(angle * weather.CENTI) if fixed_point else angle)
+        finisher.set_temperature(means[TEMPERATURE_KEY][k])
+        finisher.set_humidity(means[HUMIDITY_KEY][k])
+        finisher.set_dew_point()
+        finisher.set_pressure(means[PRESSURE_KEY][k])
+        if fixed_point:
+            finisher.set_wind_speed(finisher.do_fixed_point_wind_speed_calc(wind_pulses[k], deltas[k] * 1000))
+        else:
+            finisher.set_wind_speed(finisher.do_wind_speed_calc(wind_pulses[k], deltas[k]))
+        if gust_peaks[k]:
+            finisher.set_wind_gust(finisher.calculate_wind_gust(gust_peaks[k]))
+        tips = rain_ends[k]
+        if tips > daily_start:
+            finisher.set_rain_count_daily(tips - daily_start if fixed_point else finisher.rain_tips_to_units(tips - daily_start))
+        finisher.set_rain_count_hourly(rain_hourly[k] if fixed_point else finisher.rain_tips_to_units(rain_hourly[k]))
+        finisher.set_rain_rate(rain_rate(finisher, rain, tips, now_ms))
+        reports.append(make_report(now_ms, finisher.get_weather_data(), [rejected[key][k] for key in FILTERED_KEYS]))
+        finisher.reset_wind_gust()
+        if resets[k]:
+            finisher.reset_daily_rain_count()
+            daily_start = tips
+    return reports
+
+
+def replay(log, engine="auto", utc_offset_ms=0, **weather_args):
+    if engine == "auto":
+        engine = "scalar" if numpy is None else "numpy"
+    if engine == "numpy":
+        if numpy is None:
+            raise RuntimeError("the numpy engine needs numpy installed")
+        return replay_numpy(log, utc_offset_ms, **weather_args)
+    return replay_scalar(log, utc_offset_ms, **weather_args)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def check_configurations():
+    ''' (name, weather_args maker) of each Weather configuration check() compares the engines with '''
+    def no_temperature_filter():
+        filters = weather.default_filters()
+        filters[TEMPERATURE_KEY] = None
+        return {"filters": filters}
+    return (
+        ("float", dict),
+        ("fixed point", lambda: {"fixed_point": True}),
+        ("float, no temperature filter", no_temperature_filter)
+    )
+
+
+def check(hours):
+    '''
+    replay a synthetic log, and one with a dry spell across a ticks wrap, with both
+    engines in each configuration and compare every report field
+    '''
+    ok = True
+    for name, make_log, args in (("synthetic log", synthetic_log, (hours,)), ("dry spell log", dry_spell_log, ())):
+        log, seconds = timed(make_log, *args)
+        print("{}: {} samples, {} wind edges, {} rain edges ({:.1f} s to build)".format(
+            name, len(log), len(log.wind_stamps), len(log.rain_stamps), seconds))
+        for config, weather_args in check_configurations():
+            print("  {}:".format(config))
+            ok = check_configuration(log, weather_args) and ok
+    if numpy is not None:
+        print("the numpy engine is short of the millions of samples/s it was meant to reach")
+    return ok
+
+
+def check_configuration(log, weather_args):
+    ''' each engine gets Weather arguments of its own, a filter keeps its history between readings '''
+    scalar_reports, seconds = timed(lambda: replay_scalar(log, **weather_args()))
+    print("    scalar: {} reports, {:,.0f} samples/s".format(len(scalar_reports), len(log) / seconds))
+    if numpy is None:
+        print("    numpy isn't installed, so there is no vectorized engine to compare against")
+        return True
+    numpy_reports, seconds = timed(lambda: replay_numpy(log, **weather_args()))
+    print("    numpy:  {} reports, {:,.0f} samples/s".format(len(numpy_reports), len(log) / seconds))
+    mismatches = 0
+    for scalar_report, numpy_report in zip(scalar_reports, numpy_reports):
+        for field, scalar_val, numpy_val in zip(REPORT_FIELDS, scalar_report, numpy_report):
+            if scalar_val != numpy_val:
+                mismatches += 1
+                if mismatches <= 10:
+                    print("      t_ms {} {}: scalar {} numpy {}".format(scalar_report[0], field, scalar_val, numpy_val))
+    if len(scalar_reports) != len(numpy_reports):
+        mismatches += 1
+        print("      the engines made a different number of reports")
+    print("    parity: {}".format("ok" if not mismatches else "{} mismatched fields".format(mismatches)))
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replay recorded weather samples through the Weather aggregation")
+    parser.add_argument("log", nargs="?", help="sample log csv")
+    parser.add_argument("--engine", choices=("auto", "numpy", "scalar"), default="auto")
+    parser.add_argument("--utc-offset-hours", type=float, default=0.0, help="station local time, for the daily rain reset")
+    parser.add_argument("--out", help="write the reports here instead of stdout")
+    parser.add_argument("--check", action="store_true", help="compare the engines on a synthetic log")
+    parser.add_argument("--hours", type=int, default=72, help="length of the --check log")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(0 if check(args.hours) else 1)
+    if not args.log:
+        parser.error("a sample log or --check is needed")
+    reports = replay(read_log(args.log), args.engine, int(args.utc_offset_hours * HOUR_MS))
+    out_file = open(args.out, "w", newline="") if args.out else sys.stdout
+    try:
+        writer = csv.writer(out_file)
+        writer.writerow(REPORT_FIELDS)
+        writer.writerows(reports)
+    finally:
+        if args.out:
+            out_file.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+'''
+hardware simulation for running the station on CPython: fake machine, network,
+neopixel, onewire and ds18x20 modules backed by models of the station's sensors, a
+fake mrequests, and a virtual clock that runs a day of station time in seconds.
+tools/simulate.py runs main.py on it; see SimStation to drive it from other tools.
+'''
+from .clock import SimulationEnd, VirtualClock
+from .scenario import Conditions, DiurnalScenario, ScriptedScenario, SCENARIOS, load_scenario
+from .station import SimStation
@@ -0,0 +1,162 @@
+'''
+a fake uasyncio for the simulated station: the parts of its api main.py uses, with
+the event loop sleeping on the virtual clock. while every task sleeps the clock is
+advanced to the soonest wake up, firing the pin edges, timers and _thread resumes
+due on the way, so a task wakes exactly on time unless another task held the loop.
+'''
+import heapq
+from collections import deque
+from types import ModuleType
+
+from .clock import US_PER_MS, US_PER_S
+
+station = None
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class _Sleep:
+    __slots__ = ("us",)
+
+    def __init__(self, us):
+        self.us = us
+
+    def __await__(self):
+        yield self
+
+
+class Task:
+    def __init__(self, coro):
+        self.coro = coro
+        self.finished = False
+        self.result = None
+        self.exception = None
+        self.waiting = []  # tasks awaiting this one
+
+    def done(self):
+        return self.finished
+
+    def cancel(self):
+        if not self.finished:
+            loop.throw(self, CancelledError())
+        return True
+
+    def __await__(self):
+        while not self.finished:
+            yield self
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+
+class Loop:
+    def __init__(self):
+        self.ready = deque()
+        self.sleeping = []  # heap of (wake_us, seq, task)
+        self.seq = 0
+
+    def create_task(self, coro):
+        task = Task(coro)
+        self.ready.append((task, None))
+        return task
+
+    def throw(self, task, exception):
+        self.sleeping = [entry for entry in self.sleeping if entry[2] is not task]
+        heapq.heapify(self.sleeping)
+        self.ready.append((task, exception))
+
+    def step(self, task, exception):
+        station.stats["task_steps"] += 1
+        try:
+            awaited = task.coro.throw(exception) if exception else task.coro.send(None)
+        except StopIteration as e:
+            self.finish(task, e.value, None)
+            return
+        except BaseException as e:  # the clock's SimulationEnd among them
+            self.finish(task, None, e)
+            if not isinstance(e, (Exception, CancelledError)):
+                raise
+            return
+        if isinstance(awaited, _Sleep):
+            self.seq += 1
+            heapq.heappush(self.sleeping, (station.clock.now_us + awaited.us, self.seq, task))
+        elif isinstance(awaited, Task):
+            awaited.waiting.append(task)
+        else:
+            self.ready.append((task, None))
+
+    def finish(self, task, result, exception):
+        task.finished = True
+        task.result = result
+        task.exception = exception
+        for waiting in task.waiting:
+            self.ready.append((waiting, None))
+
+    def run_until_complete(self, main):
+        clock = station.clock
+        while not main.finished:
+            if self.ready:
+                task, exception = self.ready.popleft()
+                self.step(task, exception)
+                continue
+            if not self.sleeping:
+                raise RuntimeError("every task is waiting on another")
+            clock.sleep_us(max(0, self.sleeping[0][0] - clock.now_us))
+            while self.sleeping and self.sleeping[0][0] <= clock.now_us:
+                self.ready.append((heapq.heappop(self.sleeping)[2], None))
+        if main.exception is not None:
+            raise main.exception
+        return main.result
+
+
+loop = Loop()
+
+
+def sleep(s):
+    return _Sleep(int(s * US_PER_S))
+
+
+def sleep_ms(ms):
+    return _Sleep(int(ms * US_PER_MS))
+
+
+def create_task(coro):
+    return loop.create_task(coro)
+
+
+async def gather(*awaitables, return_exceptions=False):
+    tasks = [a if isinstance(a, Task) else create_task(a) for a in awaitables]
+    results = []
+    for task in tasks:
+        try:
+            results.append(await task)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results.append(e)
+    return results
+
+
+def run(coro):
+    return loop.run_until_complete(create_task(coro))
+
+
+def get_event_loop():
+    return loop
+
+
+def new_event_loop():
+    global loop
+    loop = Loop()
+    return loop
+
+
+def build_module():
+    new_event_loop()
+    module = ModuleType("uasyncio", "simulated uasyncio")
+    for member in (CancelledError, Task, sleep, sleep_ms, create_task, gather, run, get_event_loop,
+            new_event_loop):
+        setattr(module, member.__name__, member)
+    return module
@@ -0,0 +1,112 @@
+'''
+virtual time for the simulated station. ticks_ms(), sleep_ms() and friends read and
+advance this clock instead of the wall clock, so station time runs as fast as the code
+on top of it can execute. timers and pin edges are events on the clock that fire in
+time order while the station sleeps or waits on a bus.
+'''
+import heapq
+
+from host_compat import TICKS_MAX
+
+US_PER_MS = 1000
+US_PER_S = 1_000_000
+
+
+class SimulationEnd(BaseException):
+    '''
+    raised out of the clock once it passes its end. a BaseException so that the
+    station's own `except Exception` handlers don't swallow it.
+    '''
+
+
+class VirtualClock:
+    def __init__(self, start_epoch_s, end_ms=None):
+        self.start_epoch_s = start_epoch_s  # unix time the simulation starts at
+        self.now_us = 0
+        self.end_ms = end_ms
+        self.events_fired = 0
+        self.current_thread = None  # the simulated _thread running, None for the main thread
+        self.__events = []  # heap of [due_us, seq, callback, active]
+        self.__seq = 0
+        self.__firing = False
+
+    def ms(self):
+        ''' unwrapped milliseconds since the start '''
+        return self.now_us // US_PER_MS
+
+    def seconds(self):
+        return self.now_us / US_PER_S
+
+    def epoch_s(self):
+        ''' unix time now, as a float '''
+        return self.start_epoch_s + self.now_us / US_PER_S
+
+    def ticks_ms(self):
+        return (self.now_us // US_PER_MS) & TICKS_MAX
+
+    def ticks_us(self):
+        return self.now_us & TICKS_MAX
+
+    def call_at(self, due_us, callback):
+        ''' run callback() once the clock reaches due_us, returns a handle for cancel() '''
+        self.__seq += 1
+        event = [max(due_us, self.now_us), self.__seq, callback, True]
+        heapq.heappush(self.__events, event)
+        return event
+
+    def call_later(self, delay_us, callback):
+        return self.call_at(self.now_us + delay_us, callback)
+
+    @staticmethod
+    def cancel(event):
+        event[3] = False
+
+    def advance(self, us):
+        '''
+        move the clock forward, firing the events that come due on the way. an event's
+        callback can itself spend time (a driver sleeping or waiting on the bus); that
+        moves the clock without firing anything, and whatever came due meanwhile fires
+        late once the callback returns, the way a busy MicroPython core handles it.
+        '''
+        target = self.now_us + max(0, us)
+        if self.__firing:
+            self.now_us = target
+            return
+        events = self.__events
+        end_us = None if self.end_ms is None else self.end_ms * US_PER_MS
+        while events and events[0][0] <= target:
+            event = heapq.heappop(events)
+            if event[0] > self.now_us:
+                self.now_us = event[0]
+            if end_us is not None and self.now_us >= end_us:
+                raise SimulationEnd()
+            if event[3]:
+                self.events_fired += 1
+                self.__firing = True
+                try:
+                    event[2]()
+                finally:
+                    self.__firing = False
+                target = max(target, self.now_us)
+        self.now_us = target
+        if end_us is not None and self.now_us >= end_us:
+            raise SimulationEnd()
+
+    def next_due_us(self):
+        ''' when the next event is due, None when there isn't one '''
+        events = self.__events
+        while events and not events[0][3]:
+            heapq.heappop(events)
+        return events[0][0] if events else None
+
+    def sleep_ms(self, ms):
+        self.sleep_us(ms * US_PER_MS)
+
+    def sleep_us(self, us):
+        if self.current_thread is not None:
+            self.current_thread.sleep_us(int(us))  # the main thread's events fire meanwhile
+        else:
+            self.advance(int(us))
+
+    def sleep(self, s):
+        self.sleep_us(s * US_PER_S)
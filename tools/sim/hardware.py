@@ -0,0 +1,580 @@
+'''
+stand-ins for the MicroPython hardware modules main.py imports (machine, network,
+neopixel, onewire, ds18x20, micropython) and models of the parts on the station's buses: the AM2320
+and MPL3115A2 on i2c and the DS18B20 probes on 1-Wire. the models answer at register
+level with what the scenario says the weather is, so the real drivers run unchanged.
+bus transactions cost virtual time at the bus speed and fail at the scenario's rate.
+
+everything reaches the simulation through the module global station, set by
+SimStation.install().
+'''
+import calendar
+import math
+import time as _time
+from types import ModuleType
+
+from am2320 import build_crc16_table
+
+station = None
+
+ENODEV = 19
+ETIMEDOUT = 116
+I2C_BIT_TIME_BITS = 9  # 8 data bits and an ack per byte
+ONEWIRE_BYTE_US = 560  # 8 standard speed time slots
+ADC_READ_US = 30  # one esp32-c3 adc conversion through the MicroPython api
+DS18B20_FAMILY = 0x28
+DS18B20_CONVERSION_MS = 750
+DS18B20_POWER_ON_TEMP = 85.0
+AM2320_ADDRESS = 0x5c
+AM2320_AWAKE_MS = 3000  # the sensor goes back to sleep this long after its last access
+MPL3115A2_ADDRESS = 0x60
+MPL3115A2_WHO_AM_I_VALUE = 0xc4
+SCHEDULE_DEPTH = 4  # MICROPY_SCHEDULER_DEPTH, the port default
+EPOCH_2000 = 946684800  # MicroPython's epoch in unix time, also where the esp32 rtc starts at power on
+CRC16_TABLE = build_crc16_table()
+
+
+def crc16(data):
+    crc = 0xFFFF
+    for byte in data:
+        crc = (crc >> 8) ^ CRC16_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def crc8(data):
+    ''' dallas/maxim 1-Wire crc '''
+    crc = 0
+    for byte in data:
+        for _ in range(8):
+            mix = (crc ^ byte) & 0x01
+            crc >>= 1
+            if mix:
+                crc ^= 0x8C
+            byte >>= 1
+    return crc
+
+
+class AM2320Model:
+    def __init__(self):
+        self.awake_until_ms = -1
+        self.requested = False
+
+    def writeto(self, buf):
+        now_ms = station.clock.ms()
+        if now_ms >= self.awake_until_ms:
+            self.awake_until_ms = now_ms + AM2320_AWAKE_MS
+            raise OSError(ENODEV)  # asleep: the wake up write isn't acked
+        self.awake_until_ms = now_ms + AM2320_AWAKE_MS
+        self.requested = bytes(buf[:1]) == b'\x03'
+
+    def readfrom_mem_into(self, memaddr, buf):
+        if not self.requested or station.clock.ms() >= self.awake_until_ms:
+            raise OSError(ENODEV)
+        self.requested = False
+        conditions = station.conditions()
+        humidity = int(round(min(100.0, max(0.0, conditions.humidity + station.rng.gauss(0, 0.3))) * 10))
+        temperature = int(round((conditions.temperature_c + station.rng.gauss(0, 0.1)) * 10))
+        reply = bytearray((0x03, 0x04, humidity >> 8, humidity & 0xFF))
+        magnitude = min(abs(temperature), 0x7FFF)
+        reply += bytes((magnitude >> 8 | (0x80 if temperature < 0 else 0), magnitude & 0xFF))
+        crc = crc16(reply)
+        reply += bytes((crc & 0xFF, crc >> 8))
+        buf[:] = reply[:len(buf)]
+
+
+class MPL3115A2Model:
+    STATUS = 0x00
+    OUT_P_MSB = 0x01
+    DR_STATUS = 0x06
+    WHO_AM_I = 0x0c
+    F_STATUS = 0x0d
+    F_DATA = 0x0e
+    F_SETUP = 0x0f
+    CTRL_REG1 = 0x26
+    CTRL_REG2 = 0x27
+    FIFO_CAPACITY = 32
+    DR_STATUS_ALL_READY = 0x0e
+    F_OVF = 0x80
+
+    def __init__(self):
+        self.regs = bytearray(0x30)
+        self.regs[self.WHO_AM_I] = MPL3115A2_WHO_AM_I_VALUE
+        self.active_since_us = None
+        self.fifo = []
+        self.fifo_overflow = False
+        self.next_fifo_us = None
+        self.pending = bytearray()  # fifo bytes of a burst read that crosses samples
+
+    def fifo_mode(self):
+        return self.regs[self.F_SETUP] >> 6
+
+    def conversion_us(self):
+        oversampling = (self.regs[self.CTRL_REG1] >> 3) & 0x07
+        return (6 + 4 * (1 << oversampling)) * 1000  # datasheet table: ~6 ms plus ~4 ms per sample
+
+    def writeto_mem(self, memaddr, buf):
+        for i, byte in enumerate(buf):
+            reg = memaddr + i
+            if reg == self.CTRL_REG1:
+                was_active = self.regs[reg] & 0x01
+                if byte & 0x01 and not was_active:
+                    self.active_since_us = station.clock.now_us
+                    self.next_fifo_us = self.active_since_us + self.conversion_us()
+                elif not byte & 0x01:
+                    self.active_since_us = None
+            if reg == self.F_SETUP:
+                self.fifo = []
+                self.fifo_overflow = False
+            self.regs[reg] = byte
+
+    def ready(self):
+        return self.active_since_us is not None and \
+            station.clock.now_us - self.active_since_us >= self.conversion_us()
+
+    def sample(self, t_s):
+        conditions = station.scenario.conditions(t_s)
+        if self.regs[self.CTRL_REG1] & 0x80:
+            altitude = 44330.77 * (1 - (conditions.pressure_pa / 101326) ** 0.1902632)
+            raw = int(round(altitude * 16)) & 0xFFFFF
+            out = bytearray((raw >> 12 & 0xFF, raw >> 4 & 0xFF, (raw & 0x0F) << 4))
+        else:
+            quarters = int(round((conditions.pressure_pa + station.rng.gauss(0, 1.5)) * 4))
+            out = bytearray((quarters >> 12 & 0xFF, quarters >> 4 & 0xFF, (quarters & 0x0F) << 4))
+        sixteenths = int(round((conditions.temperature_c + station.rng.gauss(0, 0.05)) * 16))
+        out += bytes((sixteenths >> 4 & 0xFF, (sixteenths & 0x0F) << 4))
+        return out
+
+    def fill_fifo(self):
+        if self.active_since_us is None or not self.fifo_mode():
+            return
+        period_us = (1 << (self.regs[self.CTRL_REG2] & 0x0F)) * 1_000_000
+        now_us = station.clock.now_us
+        while self.next_fifo_us <= now_us:
+            self.fifo.append(self.sample(self.next_fifo_us / 1_000_000))
+            if len(self.fifo) > self.FIFO_CAPACITY:
+                self.fifo.pop(0)  # circular mode keeps the newest
+                self.fifo_overflow = True
+            self.next_fifo_us += period_us
+
+    def read(self, memaddr, nbytes):
+        if memaddr == self.DR_STATUS or (memaddr == self.STATUS and not self.fifo_mode()):
+            return bytes((self.DR_STATUS_ALL_READY if self.ready() else 0,)) + bytes(nbytes - 1)
+        if memaddr in (self.F_STATUS, self.STATUS):
+            self.fill_fifo()
+            status = len(self.fifo) | (self.F_OVF if self.fifo_overflow else 0)
+            self.fifo_overflow = False
+            return bytes((status,)) + bytes(nbytes - 1)
+        if memaddr == self.F_DATA or (memaddr == self.OUT_P_MSB and self.fifo_mode()):
+            self.fill_fifo()
+            out = self.pending
+            while len(out) < nbytes and self.fifo:
+                out += self.fifo.pop(0)
+            self.pending = out[nbytes:]
+            return bytes(out[:nbytes]) + bytes(max(0, nbytes - len(out)))
+        if memaddr == self.OUT_P_MSB:
+            out = self.sample(station.clock.seconds()) if self.ready() else bytes(5)
+            return bytes(out[:nbytes]) + bytes(max(0, nbytes - len(out)))
+        return bytes(self.regs[memaddr:memaddr + nbytes])
+
+    def readfrom_mem_into(self, memaddr, buf):
+        buf[:] = self.read(memaddr, len(buf))
+
+
+class DS18B20Model:
+    def __init__(self, serial, offset_c=0.0):
+        rom = bytearray((DS18B20_FAMILY,)) + serial.to_bytes(6, "little")
+        self.rom = bytes(rom + bytes((crc8(rom),)))
+        self.offset_c = offset_c
+        self.converting_since_us = None
+        self.scratch = DS18B20_POWER_ON_TEMP
+
+    def convert(self):
+        self.converting_since_us = station.clock.now_us
+
+    def read(self):
+        since = self.converting_since_us
+        if since is not None and station.clock.now_us - since >= DS18B20_CONVERSION_MS * 1000:
+            temperature = station.scenario.conditions(since / 1_000_000 + DS18B20_CONVERSION_MS / 1000).temperature_c
+            self.scratch = round((temperature + self.offset_c + station.rng.gauss(0, 0.05)) * 16) / 16
+            self.converting_since_us = None
+        return self.scratch
+
+
+# machine
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        self.__value = value or 0
+        self.handler = None
+        self.hard = False
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self.__value
+        self.__value = 1 if value else 0
+
+    def on(self):
+        self.__value = 1
+
+    def off(self):
+        self.__value = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self.handler = handler
+        self.hard = hard
+        station.attach_irq(self)
+
+    def __repr__(self):
+        return "Pin({})".format(self.id)
+
+
+class ADC:
+    ATTN_0DB = 0
+    ATTN_2_5DB = 1
+    ATTN_6DB = 2
+    ATTN_11DB = 3
+    WIDTH_12BIT = 3
+
+    def __init__(self, pin, atten=None):
+        self.pin = pin
+
+    def atten(self, attenuation):
+        pass
+
+    def width(self, width):
+        pass
+
+    def read(self):
+        station.clock.sleep_us(ADC_READ_US)
+        return station.adc_value(self.pin.id)
+
+    def read_u16(self):
+        return self.read() << 4
+
+
+class SoftI2C:
+    def __init__(self, scl=None, sda=None, freq=400_000, timeout=50_000):
+        self.scl = scl
+        self.sda = sda
+        self.freq = freq
+        self.timeout = timeout
+
+    def __transaction(self, address, nbytes):
+        ''' the bus time of the address byte plus nbytes, and the injected failures '''
+        station.stats["i2c_transactions"] += 1
+        station.clock.sleep_us((nbytes + 2) * I2C_BIT_TIME_BITS * 1_000_000 // self.freq)
+        device = station.i2c_devices.get(address)
+        if device is None:
+            station.stats["i2c_errors"] += 1
+            raise OSError(ENODEV)
+        if station.fault():
+            station.stats["i2c_errors"] += 1
+            raise OSError(ETIMEDOUT)
+        return device
+
+    def scan(self):
+        return sorted(station.i2c_devices)
+
+    def writeto(self, address, buf, stop=True):
+        device = self.__transaction(address, len(buf))
+        try:
+            device.writeto(buf)
+        except OSError:
+            station.stats["i2c_nacks"] += 1
+            raise
+        return len(buf)
+
+    def readfrom_into(self, address, buf, stop=True):
+        self.readfrom_mem_into(address, 0, buf)  # none of the modelled parts tell these apart
+
+    def writeto_mem(self, address, memaddr, buf, addrsize=8):
+        self.__transaction(address, len(buf) + 1).writeto_mem(memaddr, buf)
+
+    def readfrom_mem_into(self, address, memaddr, buf, addrsize=8):
+        device = self.__transaction(address, len(buf) + 2)
+        try:
+            device.readfrom_mem_into(memaddr, buf)
+        except OSError:
+            station.stats["i2c_nacks"] += 1
+            raise
+
+    def readfrom_mem(self, address, memaddr, nbytes, addrsize=8):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(address, memaddr, buf)
+        return bytes(buf)
+
+
+class I2C(SoftI2C):
+    def __init__(self, id=0, scl=None, sda=None, freq=400_000, timeout=50_000):
+        super().__init__(scl, sda, freq, timeout)
+        self.id = id
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.id = id
+        self.__event = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=None):
+        self.deinit()
+        period_us = int(1_000_000 / freq) if freq else period * 1000
+        self.__period_us = period_us
+        self.__mode = mode
+        self.__callback = callback
+        self.__event = station.clock.call_later(period_us, self.__fire)
+
+    def __fire(self):
+        if self.__mode == Timer.PERIODIC:
+            self.__event = station.clock.call_later(self.__period_us, self.__fire)
+        else:
+            self.__event = None
+        station.stats["timer_callbacks"] += 1
+        if self.__callback:
+            self.__callback(self)
+
+    def deinit(self):
+        if self.__event is not None:
+            station.clock.cancel(self.__event)
+            self.__event = None
+
+
+class RTC:
+    ''' keeps counting from whatever it was last set to, like the esp32's rtc. time.time() reads it too '''
+
+    def datetime(self, datetime=None):
+        if datetime is not None:
+            year, month, day, weekday, hours, minutes, seconds, subseconds = datetime
+            station.set_rtc(calendar.timegm((year, month, day, hours, minutes, seconds, 0, 0, 0)))
+            return
+        rtc_us = station.rtc_us()
+        now = _time.gmtime(rtc_us // 1_000_000)
+        return (now.tm_year, now.tm_mon, now.tm_mday, now.tm_wday, now.tm_hour, now.tm_min, now.tm_sec,
+            rtc_us % 1_000_000)
+
+
+def freq(hz=None):
+    return 160_000_000
+
+
+def idle():
+    station.clock.sleep_us(100)
+
+
+def lightsleep(ms=0):
+    station.clock.sleep_ms(ms)
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+def unique_id():
+    return b'\x5e\x5e\x5e\x00\x00\x01'
+
+
+# micropython
+
+def schedule(func, arg):
+    ''' run func(arg) as soon as the running python code lets it, from a queue of SCHEDULE_DEPTH '''
+    if station.scheduled >= SCHEDULE_DEPTH:
+        raise RuntimeError("schedule queue full")
+    station.scheduled += 1
+
+    def run():
+        station.scheduled -= 1
+        station.stats["scheduled_calls"] += 1
+        func(arg)
+
+    station.clock.call_later(0, run)
+    return None
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def const(val):
+    return val
+
+
+# network
+
+STA_IF = 0
+AP_IF = 1
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+ISCONNECTED_POLL_US = 1000  # what a call costs, so a busy wait on the link still moves time
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self.__active = False
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self.__active
+        self.__active = bool(is_active)
+
+    def config(self, *args, **kwargs):
+        if args and args[0] == "rssi":
+            return station.rssi()
+        if args:
+            return None
+        station.wifi_config.update(kwargs)
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        station.wifi_connect()
+
+    def disconnect(self):
+        station.wifi_disconnect()
+
+    def isconnected(self):
+        station.clock.sleep_us(ISCONNECTED_POLL_US)
+        return self.__active and station.wifi_connected()
+
+    def status(self, param=None):
+        if param == "rssi":
+            return station.rssi()
+        if self.isconnected():
+            return STAT_GOT_IP
+        return STAT_CONNECTING if station.wifi_wanted else STAT_IDLE
+
+    def ifconfig(self, config=None):
+        return ("192.168.86.42", "255.255.255.0", "192.168.86.1", "192.168.86.1")
+
+
+# neopixel
+
+class NeoPixel:
+    def __init__(self, pin, n, bpp=3, timing=1):
+        self.pin = pin
+        self.n = n
+        self.pixels = [(0,) * bpp] * n
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, index, val):
+        self.pixels[index] = tuple(val)
+
+    def __getitem__(self, index):
+        return self.pixels[index]
+
+    def fill(self, val):
+        self.pixels = [tuple(val)] * self.n
+
+    def write(self):
+        station.led_write(tuple(self.pixels))
+
+
+# onewire and ds18x20
+
+class OneWireError(Exception):
+    pass
+
+
+class OneWire:
+    SEARCH_ROM = 0xF0
+    MATCH_ROM = 0x55
+    SKIP_ROM = 0xCC
+
+    def __init__(self, pin):
+        self.pin = pin
+
+    def probes(self):
+        return station.onewire_probes.get(self.pin.id, ())
+
+    def spend(self, nbytes):
+        station.clock.sleep_us(480 * 2 + nbytes * ONEWIRE_BYTE_US)  # reset pulse and presence, then the bytes
+
+    def reset(self, required=False):
+        self.spend(0)
+        present = bool(self.probes())
+        if required and not present:
+            raise OneWireError
+        return present
+
+    def scan(self):
+        probes = self.probes()
+        self.spend(len(probes) * 24)  # a search reads 64 bits, their complements and writes 64 per device
+        return [bytearray(probe.rom) for probe in probes]
+
+
+class DS18X20:
+    def __init__(self, onewire):
+        self.ow = onewire
+
+    def scan(self):
+        return [rom for rom in self.ow.scan() if rom[0] in (0x10, 0x22, 0x28)]
+
+    def convert_temp(self):
+        self.ow.reset(True)
+        self.ow.spend(2)  # skip rom, convert t
+        for probe in self.ow.probes():
+            probe.convert()
+
+    def read_temp(self, rom):
+        self.ow.reset(True)
+        self.ow.spend(10 + 9)  # match rom with the rom, read scratchpad, then the 9 scratchpad bytes
+        station.stats["onewire_reads"] += 1
+        for probe in self.ow.probes():
+            if probe.rom == bytes(rom):
+                if station.fault():
+                    station.stats["onewire_errors"] += 1
+                    raise Exception("CRC error")
+                return probe.read()
+        station.stats["onewire_errors"] += 1
+        raise Exception("CRC error")  # nothing answered, the scratchpad reads as all ones
+
+
+def build_modules():
+    ''' the fake hardware modules, keyed by the names main.py imports them as '''
+    modules = {}
+    contents = {
+        "machine": (Pin, ADC, SoftI2C, I2C, Timer, RTC, freq, idle, lightsleep, disable_irq, enable_irq, unique_id),
+        "network": (WLAN,),
+        "neopixel": (NeoPixel,),
+        "onewire": (OneWire, OneWireError),
+        "ds18x20": (DS18X20,),
+        "micropython": (schedule, alloc_emergency_exception_buf, const),
+    }
+    for name, members in contents.items():
+        module = ModuleType(name, "simulated {} module".format(name))
+        for member in members:
+            setattr(module, member.__name__, member)
+        modules[name] = module
+    for name in ("STA_IF", "AP_IF", "STAT_IDLE", "STAT_CONNECTING", "STAT_GOT_IP"):
+        setattr(modules["network"], name, globals()[name])
+    return modules
+
+
+def wind_dir_adc(calibration, wind_dir_deg, directions):
+    ''' the middle of the calibrated adc range of the sector wind_dir_deg falls in '''
+    name = directions[int(math.floor(wind_dir_deg / 22.5 + 0.5)) % len(directions)]
+    start, end = calibration[name]
+    return (start + end) // 2
@@ -0,0 +1,167 @@
+'''
+a stand-in for mrequests that never touches the network. the time api answers with
+the simulation's local time, every other request is an upload that is recorded on the
+station and answered "success". a request costs latency_ms of virtual time and fails
+like a dropped connection when the wifi link is down or at the scenario's error rate.
+'''
+import time as _time
+from json import dumps, loads
+from types import ModuleType
+
+from .hardware import ETIMEDOUT
+
+station = None
+
+ECONNRESET = 104
+EHOSTUNREACH = 113
+TIME_API_PATH = "/api/timezone/"
+
+
+class Upload:
+    __slots__ = ("t_ms", "method", "url", "body", "status")
+
+    def __init__(self, t_ms, method, url, body, status):
+        self.t_ms = t_ms
+        self.method = method
+        self.url = url
+        self.body = body
+        self.status = status
+
+    def json(self):
+        return loads(self.body)
+
+
+class Response:
+    def __init__(self, status_code, text, url):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode()
+        self.url = url
+        self.headers = {"content-type": "application/json" if text.startswith("{") else "text/plain"}
+
+    def json(self):
+        return loads(self.text)
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return "<Response [{}]>".format(self.status_code)
+
+
+def time_api_text():
+    ''' what worldtimeapi.org says, for the simulation's clock in its utc offset '''
+    local_s = station.clock.epoch_s() + station.utc_offset_s
+    now = _time.gmtime(local_s)
+    offset_min = station.utc_offset_s // 60
+    return dumps({
+        "datetime": "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}.{:06d}{}{:02d}:{:02d}".format(
+            now.tm_year, now.tm_mon, now.tm_mday, now.tm_hour, now.tm_min, now.tm_sec,
+            int(local_s % 1 * 1_000_000), "-" if offset_min < 0 else "+", abs(offset_min) // 60, abs(offset_min) % 60),
+        "day_of_week": (now.tm_wday + 1) % 7,  # sunday is 0
+        "unixtime": int(station.clock.epoch_s()),
+        "utc_offset": "{}{:02d}:{:02d}".format("-" if offset_min < 0 else "+", abs(offset_min) // 60, abs(offset_min) % 60),
+    })
+
+
+def request(method, url, data=None, json=None, headers={}, **kwargs):
+    station.stats["http_requests"] += 1
+    station.clock.sleep_ms(station.request_latency_ms())
+    if not station.wifi_connected():
+        station.stats["http_errors"] += 1
+        raise OSError(EHOSTUNREACH)
+    if station.upload_fault():
+        station.stats["http_errors"] += 1
+        raise OSError(station.rng.choice((ECONNRESET, ETIMEDOUT)))
+    if TIME_API_PATH in url:
+        return Response(200, time_api_text(), url)
+    if json is not None:
+        data = dumps(json)
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode()
+    station.uploads.append(Upload(station.clock.ms(), method, url, data, 200))
+    return Response(200, "success", url)
+
+
+def head(url, **kwargs):
+    return request("HEAD", url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request("PATCH", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+
+class Session:
+    '''
+    request() behind mrequests.Session's api. it counts the connections a real session
+    would have opened and reused: one per host, kept while the requests on it succeed
+    and dropped once idle_timeout_ms passes without one.
+    '''
+
+    def __init__(self, idle_timeout_ms=60_000):
+        self.idle_timeout_ms = idle_timeout_ms
+        self.connects = 0
+        self.reuses = 0
+        self.reconnects = 0
+        self.__idle = {}  # host -> station ms its connection went idle
+
+    def request(self, method, url, **kwargs):
+        host = url.split("/")[2]
+        idle_since = self.__idle.pop(host, None)
+        if idle_since is not None and station.clock.ms() - idle_since <= self.idle_timeout_ms:
+            self.reuses += 1
+        else:
+            self.connects += 1
+        response = request(method, url, **kwargs)  # a failed request takes its connection with it
+        self.__idle[host] = station.clock.ms()
+        return response
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.__idle.clear()
+
+    def __repr__(self):
+        return "<Session %i connects, %i reuses, %i reconnects, %i idle>" % (
+            self.connects, self.reuses, self.reconnects, len(self.__idle))
+
+
+def build_module():
+    module = ModuleType("mrequests", "simulated mrequests")
+    for func in (request, head, get, post, put, patch, delete):
+        setattr(module, func.__name__, func)
+    module.Response = Response
+    module.Session = Session
+    return module
@@ -0,0 +1,180 @@
+'''
+the weather the simulated sensors measure, as a function of seconds since the start.
+a scenario also decides the faults: how often a sensor read fails and when the wifi
+link is down. conditions must be a pure function of time since sensors look at the
+same instant more than once (the barometer fills its fifo from the past).
+
+    DiurnalScenario   a daily temperature and humidity cycle, drifting pressure, gusty
+                      wind and random showers, all derived from a seed
+    ScriptedScenario  keyframes that are interpolated linearly, e.g. a front passing;
+                      load_scenario() reads them from a json file:
+                      {"keyframes": [{"hour": 0, "temperature_c": 12, ...}, ...],
+                       "read_error_rate": 0.01, "wifi_outages": [[start_hour, end_hour]]}
+'''
+import json
+import math
+import random
+
+DAY_S = 86400
+HOUR_S = 3600
+FIELDS = ("temperature_c", "humidity", "pressure_pa", "wind_mph", "wind_dir_deg", "rain_in_per_hr")
+
+
+class Conditions:
+    __slots__ = FIELDS
+
+    def __init__(self, temperature_c=15.0, humidity=60.0, pressure_pa=101325.0, wind_mph=0.0,
+            wind_dir_deg=270.0, rain_in_per_hr=0.0):
+        self.temperature_c = temperature_c
+        self.humidity = humidity
+        self.pressure_pa = pressure_pa
+        self.wind_mph = wind_mph
+        self.wind_dir_deg = wind_dir_deg
+        self.rain_in_per_hr = rain_in_per_hr
+
+    def __repr__(self):
+        return "Conditions({})".format(", ".join("{}={:.2f}".format(f, getattr(self, f)) for f in FIELDS))
+
+
+class Scenario:
+    read_error_rate = 0.0  # chance that any one sensor read fails
+    upload_error_rate = 0.0  # chance that any one http request fails
+    bounce_rate = 0.05  # chance that a reed switch edge bounces
+
+    def __init__(self, wifi_outages=()):
+        self.wifi_outages = [(start_s, end_s) for start_s, end_s in wifi_outages]
+
+    def conditions(self, t_s):
+        raise NotImplementedError
+
+    def link_up(self, t_s):
+        for start_s, end_s in self.wifi_outages:
+            if start_s <= t_s < end_s:
+                return False
+        return True
+
+
+class DiurnalScenario(Scenario):
+    def __init__(self, seed=1, read_error_rate=0.005, wifi_outages=()):
+        super().__init__(wifi_outages)
+        self.seed = seed
+        self.read_error_rate = read_error_rate
+        rng = random.Random(seed)
+        self.mean_temperature_c = rng.uniform(8, 22)
+        self.temperature_swing_c = rng.uniform(4, 9)
+        self.pressure_phase = rng.uniform(0, 2 * math.pi)
+        self.wind_phases = [rng.uniform(0, 2 * math.pi) for _ in range(4)]
+        self.__showers = {}  # day -> [(start_s, end_s, in_per_hr)]
+
+    def __day_showers(self, day):
+        showers = self.__showers.get(day)
+        if showers is None:
+            rng = random.Random(self.seed * 1_000_003 + day)
+            showers = []
+            for _ in range(rng.randint(0, 3)):
+                start_s = day * DAY_S + rng.uniform(0, DAY_S)
+                showers.append((start_s, start_s + rng.uniform(600, 3 * HOUR_S), rng.uniform(0.02, 1.2)))
+            self.__showers[day] = showers
+        return showers
+
+    def conditions(self, t_s):
+        day_angle = 2 * math.pi * (t_s / DAY_S - 0.375)  # coldest around 03:00, warmest around 15:00
+        raining = 0.0
+        for start_s, end_s, in_per_hr in self.__day_showers(int(t_s // DAY_S)):
+            if start_s <= t_s < end_s:
+                raining = max(raining, in_per_hr)
+        p = self.wind_phases
+        wind_mph = max(0.0, 6 + 4 * math.sin(t_s / 5400 + p[0]) + 3 * math.sin(t_s / 47 + p[1])
+            + 2 * math.sin(t_s / 7.3 + p[2]))
+        temperature_c = self.mean_temperature_c + self.temperature_swing_c * math.sin(day_angle)
+        if raining:
+            temperature_c -= 2
+        return Conditions(
+            temperature_c=temperature_c,
+            humidity=min(100.0, 65 - 20 * math.sin(day_angle) + (30 if raining else 0)),
+            pressure_pa=101325 + 900 * math.sin(t_s / (2.5 * DAY_S) + self.pressure_phase),
+            wind_mph=wind_mph,
+            wind_dir_deg=(225 + 80 * math.sin(t_s / 20000 + p[3]) + 25 * math.sin(t_s / 90)) % 360,
+            rain_in_per_hr=raining
+        )
+
+
+class ScriptedScenario(Scenario):
+    def __init__(self, keyframes, read_error_rate=0.0, upload_error_rate=0.0, wifi_outages=()):
+        '''
+        keyframes: (t_s, {field: value}) in time order. a field a keyframe leaves out
+        keeps its previous value; wind direction takes the short way round.
+        '''
+        super().__init__(wifi_outages)
+        self.read_error_rate = read_error_rate
+        self.upload_error_rate = upload_error_rate
+        self.times = []
+        self.frames = []
+        values = dict((f, getattr(Conditions(), f)) for f in FIELDS)
+        for t_s, frame in keyframes:
+            for field in frame:
+                if field not in FIELDS:
+                    raise ValueError("Unknown scenario field: {}".format(field))
+            values.update(frame)
+            self.times.append(t_s)
+            self.frames.append(dict(values))
+
+    def conditions(self, t_s):
+        times = self.times
+        if t_s <= times[0]:
+            return Conditions(**self.frames[0])
+        if t_s >= times[-1]:
+            return Conditions(**self.frames[-1])
+        i = 1
+        while times[i] < t_s:
+            i += 1
+        before, after = self.frames[i - 1], self.frames[i]
+        w = (t_s - times[i - 1]) / (times[i] - times[i - 1])
+        values = {}
+        for field in FIELDS:
+            start, end = before[field], after[field]
+            if field == "wind_dir_deg":
+                end = start + ((end - start + 180) % 360 - 180)
+                values[field] = (start + w * (end - start)) % 360
+            else:
+                values[field] = start + w * (end - start)
+        return Conditions(**values)
+
+
+# a cold front: warm and humid with a southerly breeze, pressure falling into a squall
+# line with heavy rain and a wind shift to the northwest, then clearing and cooler
+FRONT_KEYFRAMES = (
+    (0, {"temperature_c": 24, "humidity": 70, "pressure_pa": 101200, "wind_mph": 6, "wind_dir_deg": 180}),
+    (6 * HOUR_S, {"temperature_c": 27, "humidity": 75, "pressure_pa": 100700, "wind_mph": 12, "wind_dir_deg": 200}),
+    (8 * HOUR_S, {"pressure_pa": 100450, "wind_mph": 18, "rain_in_per_hr": 0.0}),
+    (8.5 * HOUR_S, {"temperature_c": 19, "humidity": 97, "wind_mph": 32, "wind_dir_deg": 260, "rain_in_per_hr": 2.5}),
+    (9.5 * HOUR_S, {"temperature_c": 16, "humidity": 92, "pressure_pa": 100900, "wind_mph": 20, "wind_dir_deg": 300,
+        "rain_in_per_hr": 0.3}),
+    (11 * HOUR_S, {"temperature_c": 14, "humidity": 60, "pressure_pa": 101500, "wind_mph": 10, "wind_dir_deg": 315,
+        "rain_in_per_hr": 0.0}),
+    (24 * HOUR_S, {"temperature_c": 9, "humidity": 55, "pressure_pa": 102100, "wind_mph": 4, "wind_dir_deg": 330}),
+)
+
+SCENARIOS = {
+    "diurnal": lambda seed: DiurnalScenario(seed),
+    "front": lambda seed: ScriptedScenario(FRONT_KEYFRAMES, read_error_rate=0.005,
+        wifi_outages=[(9 * HOUR_S, 9.25 * HOUR_S)]),
+}
+
+
+def load_scenario(name, seed=1):
+    ''' one of SCENARIOS by name, or a scripted scenario from a json file '''
+    if name in SCENARIOS:
+        return SCENARIOS[name](seed)
+    with open(name) as fp:
+        spec = json.load(fp)
+    keyframes = []
+    for frame in spec["keyframes"]:
+        frame = dict(frame)
+        keyframes.append((frame.pop("hour") * HOUR_S, frame))
+    return ScriptedScenario(
+        keyframes,
+        read_error_rate=spec.get("read_error_rate", 0.0),
+        upload_error_rate=spec.get("upload_error_rate", 0.0),
+        wifi_outages=[(start * HOUR_S, end * HOUR_S) for start, end in spec.get("wifi_outages", ())]
+    )
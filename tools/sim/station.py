@@ -0,0 +1,259 @@
+'''
+the simulated station: one virtual clock, a scenario, the parts on its buses and the
+signals on its pins. install() swaps the fake hardware modules, mrequests, uasyncio,
+_thread and a time module running on the virtual clock into sys.modules, so the station's own modules
+(imported fresh afterwards) and main.py run unchanged on CPython.
+'''
+import calendar
+import os
+import random
+import runpy
+import sys
+import time as _time
+from collections import Counter
+from types import ModuleType
+
+import host_compat
+from host_compat import TICKS_MAX, ticks_add, ticks_diff
+
+from . import aio, hardware, net, threads
+from .clock import SimulationEnd, VirtualClock, US_PER_S
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FAKE_MODULES = ("machine", "network", "neopixel", "onewire", "ds18x20", "micropython", "mrequests", "uasyncio", "_thread",
+    "time")
+# pins main.py wires the sensors to
+WIND_DIR_PIN = 4
+RAIN_PIN = 5
+WIND_SPEED_PIN = 6
+ONEWIRE_PIN = 19
+WIFI_CONNECT_MS = 1500  # association and dhcp
+REQUEST_LATENCY_MS = 180
+MIN_EDGE_GAP_US = 1000
+QUIET_RECHECK_US = US_PER_S  # how often a pulse source looks again while its rate is 0
+START_EPOCH_S = calendar.timegm((2026, 6, 1, 4, 0, 0))  # local midnight at UTC_OFFSET_S
+UTC_OFFSET_S = -4 * 3600
+
+
+class SimStation:
+    def __init__(self, scenario, start_epoch_s=START_EPOCH_S, utc_offset_s=UTC_OFFSET_S, seed=1, probes=1):
+        self.scenario = scenario
+        self.clock = VirtualClock(start_epoch_s)
+        self.utc_offset_s = utc_offset_s
+        self.rng = random.Random(seed)
+        self.stats = Counter()
+        self.uploads = []
+        self.led_writes = []  # (t_ms, pixels)
+        self.wifi_config = {}
+        self.wifi_wanted = False
+        self.wifi_ready_us = 0
+        self.i2c_devices = {hardware.AM2320_ADDRESS: hardware.AM2320Model(),
+            hardware.MPL3115A2_ADDRESS: hardware.MPL3115A2Model()}
+        self.onewire_probes = {ONEWIRE_PIN: [hardware.DS18B20Model(0x1000 + i, self.rng.gauss(0, 0.2))
+            for i in range(probes)]}
+        self.irq_pins = {}
+        self.scheduled = 0  # micropython.schedule() calls waiting to run
+        self.rtc_base_s = hardware.EPOCH_2000
+        self.rtc_set_at_us = 0
+        self.__saved_modules = None
+        self.__conditions_us = None
+        self.__conditions = None
+
+    # the environment
+
+    def conditions(self):
+        ''' the scenario's weather now, computed once per clock tick '''
+        if self.__conditions_us != self.clock.now_us:
+            self.__conditions = self.scenario.conditions(self.clock.seconds())
+            self.__conditions_us = self.clock.now_us
+        return self.__conditions
+
+    def fault(self):
+        return self.rng.random() < self.scenario.read_error_rate
+
+    def upload_fault(self):
+        return self.rng.random() < self.scenario.upload_error_rate
+
+    def adc_value(self, pin_id):
+        if pin_id != WIND_DIR_PIN:
+            return 0
+        weather = sys.modules["weather"]
+        adc = hardware.wind_dir_adc(weather.WIND_DIR_CALIBRATION, self.conditions().wind_dir_deg,
+            weather.WIND_DIRECTION_NAMES)
+        return max(0, min(weather.WIND_ADC_RESOLUTION - 1, int(self.rng.gauss(adc, 20))))
+
+    # wifi
+
+    def wifi_connect(self):
+        if not self.wifi_wanted:
+            self.wifi_wanted = True
+            self.wifi_ready_us = self.clock.now_us + WIFI_CONNECT_MS * 1000
+
+    def wifi_disconnect(self):
+        self.wifi_wanted = False
+
+    def wifi_connected(self):
+        return self.wifi_wanted and self.clock.now_us >= self.wifi_ready_us and \
+            self.scenario.link_up(self.clock.seconds())
+
+    def rssi(self):
+        return -60 + self.rng.randint(-6, 6) if self.wifi_connected() else -127
+
+    def request_latency_ms(self):
+        return REQUEST_LATENCY_MS + self.rng.expovariate(1 / 60)
+
+    def set_rtc(self, unix_s):
+        self.rtc_base_s = unix_s
+        self.rtc_set_at_us = self.clock.now_us
+
+    def rtc_us(self):
+        ''' unix time the rtc says it is, in microseconds '''
+        return self.rtc_base_s * US_PER_S + self.clock.now_us - self.rtc_set_at_us
+
+    def led_write(self, pixels):
+        self.led_writes.append((self.clock.ms(), pixels))
+
+    # pulses
+
+    def attach_irq(self, pin):
+        if pin.id not in self.irq_pins:
+            if pin.id == WIND_SPEED_PIN:
+                self.__start_pulses(pin, self.__wind_interval_us, "wind_edges")
+            elif pin.id == RAIN_PIN:
+                self.__start_pulses(pin, self.__rain_interval_us, "rain_edges")
+        self.irq_pins[pin.id] = pin
+
+    def __wind_interval_us(self):
+        weather = sys.modules["weather"]
+        pulses_per_s = self.conditions().wind_mph * weather.KMH_PER_MPH / weather.ANEMOMETER_CONSTANT
+        if pulses_per_s <= 0:
+            return None
+        return US_PER_S / pulses_per_s
+
+    def __rain_interval_us(self):
+        weather = sys.modules["weather"]
+        tips_per_hr = self.conditions().rain_in_per_hr * 25.4 / weather.RAIN_COUNT_CONSTANT
+        if tips_per_hr <= 0:
+            return None
+        interval_us = self.rng.expovariate(tips_per_hr / 3600) * US_PER_S
+        if interval_us > QUIET_RECHECK_US:
+            return None  # tips are a poisson process, so drawing again after the recheck is as good
+        return interval_us
+
+    def __start_pulses(self, pin, interval_us, stat):
+        '''
+        fire pin's handler at the rate interval_us() gives for the weather at each edge,
+        sometimes with a reed switch bounce right after it
+        '''
+        def edge():
+            handler = self.irq_pins[pin.id].handler
+            if handler:
+                self.stats[stat] += 1
+                handler(pin)
+                if self.rng.random() < self.scenario.bounce_rate:
+                    self.clock.call_later(self.rng.randint(200, 4000), bounce)
+            schedule()
+
+        def bounce():
+            handler = self.irq_pins[pin.id].handler
+            if handler:
+                handler(pin)
+
+        def schedule():
+            interval = interval_us()
+            if interval is None:
+                self.clock.call_later(QUIET_RECHECK_US, schedule)
+            else:
+                self.clock.call_later(max(MIN_EDGE_GAP_US, int(interval)), edge)
+
+        schedule()
+
+    # running the station
+
+    def time_module(self):
+        ''' the time module as MicroPython has it, running on the virtual clock '''
+        clock = self.clock
+        module = ModuleType("time", "simulated time module")
+        for name in dir(_time):
+            if not name.startswith("__"):
+                setattr(module, name, getattr(_time, name))
+
+        def time():
+            return self.rtc_us() // US_PER_S - hardware.EPOCH_2000
+
+        def localtime(secs=None):
+            if secs is None:
+                secs = time()
+            return _time.gmtime(secs + hardware.EPOCH_2000)[:8]
+
+        def mktime(t):
+            return calendar.timegm(tuple(t[:6]) + (0, 0, 0)) - hardware.EPOCH_2000
+
+        for name, func in (
+            ("ticks_ms", clock.ticks_ms), ("ticks_us", clock.ticks_us), ("ticks_cpu", clock.ticks_us),
+            ("ticks_add", ticks_add), ("ticks_diff", ticks_diff), ("sleep_ms", clock.sleep_ms),
+            ("sleep_us", clock.sleep_us), ("sleep", clock.sleep), ("localtime", localtime), ("gmtime", localtime),
+            ("mktime", mktime), ("time", time), ("time_ns", lambda: self.rtc_us() * 1000)
+        ):
+            setattr(module, name, func)
+        module.TICKS_MAX = TICKS_MAX
+        return module
+
+    def install(self):
+        if self.__saved_modules is not None:
+            return
+        hardware.station = self
+        net.station = self
+        aio.station = self
+        threads.station = self
+        fakes = hardware.build_modules()
+        fakes["mrequests"] = net.build_module()
+        fakes["uasyncio"] = aio.build_module()
+        fakes["_thread"] = threads.build_module()
+        fakes["time"] = self.time_module()
+        self.__saved_modules = {name: sys.modules.get(name) for name in FAKE_MODULES}
+        sys.modules.update(fakes)
+        for name in station_modules():
+            del sys.modules[name]  # imported again on top of the fakes
+        import mpl3115a2
+        host_compat.expose_class_consts(mpl3115a2.MPL3115A2)
+
+    def uninstall(self):
+        if self.__saved_modules is None:
+            return
+        for name in station_modules():
+            del sys.modules[name]
+        for name, module in self.__saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        self.__saved_modules = None
+
+    def run_main(self, hours, main_path=os.path.join(REPO_ROOT, "main.py")):
+        '''
+        run main.py for hours of station time. it reads conf/config.json from the current
+        directory. returns the module globals main.py had when the time was up.
+        '''
+        self.clock.end_ms = self.clock.ms() + int(hours * 3600 * 1000)
+        self.install()
+        main_globals = {}
+        try:
+            main_globals = runpy.run_path(main_path, init_globals={}, run_name="__main__")
+        except SimulationEnd:
+            frame = sys.exc_info()[2]
+            while frame.tb_next is not None:
+                frame = frame.tb_next
+                if frame.tb_frame.f_code.co_filename == main_path and frame.tb_frame.f_code.co_name == "<module>":
+                    main_globals = frame.tb_frame.f_globals
+        return main_globals
+
+
+def station_modules():
+    ''' names of the repo's own modules that are currently imported '''
+    names = []
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if path and os.path.dirname(os.path.abspath(path)) == REPO_ROOT:
+            names.append(name)
+    return names
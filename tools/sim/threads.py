@@ -0,0 +1,118 @@
+'''
+a fake _thread for the simulated station. each started thread is a real CPython thread,
+but only one of the station's threads runs at a time: a simulated thread runs as a
+clock event until it sleeps, then hands back to the main thread and is resumed by
+another event when its sleep is up. while it sleeps (an upload waiting on the network)
+the main thread's timers, pin edges and tasks go on, as they would on the device.
+'''
+import threading
+import traceback
+from types import ModuleType
+
+LOCK_POLL_US = 100
+
+station = None
+
+
+class SimThread:
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.finished = False
+        self.__thread = None
+        self.__go = threading.Semaphore(0)
+        self.__back = threading.Semaphore(0)
+
+    def resume(self):
+        ''' a clock event: run the thread until it sleeps or ends '''
+        previous = station.clock.current_thread
+        station.clock.current_thread = self
+        try:
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__body, daemon=True)
+                self.__thread.start()
+            else:
+                self.__go.release()
+            self.__back.acquire()
+        finally:
+            station.clock.current_thread = previous
+
+    def sleep_us(self, us):
+        ''' called on this thread: let the others run for us of station time '''
+        station.clock.call_later(us, self.resume)
+        self.__back.release()
+        self.__go.acquire()
+
+    def __body(self):
+        try:
+            self.func(*self.args, **self.kwargs)
+        except SystemExit:
+            pass
+        except BaseException:
+            print("Unhandled exception in thread started by {}".format(self.func))
+            traceback.print_exc()
+        finally:
+            self.finished = True
+            station.stats["threads_finished"] += 1
+            self.__back.release()
+
+
+class LockType:
+    def __init__(self):
+        self.__locked = False
+
+    def acquire(self, waitflag=1, timeout=-1):
+        waited_us = 0
+        while self.__locked:
+            if not waitflag or 0 <= timeout * 1_000_000 <= waited_us:
+                return False
+            station.clock.sleep_us(LOCK_POLL_US)
+            waited_us += LOCK_POLL_US
+        self.__locked = True
+        return True
+
+    def release(self):
+        if not self.__locked:
+            raise RuntimeError("release unlocked lock")
+        self.__locked = False
+
+    def locked(self):
+        return self.__locked
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def start_new_thread(func, args, kwargs=None):
+    thread = SimThread(func, args, kwargs or {})
+    station.stats["threads_started"] += 1
+    station.clock.call_later(0, thread.resume)
+    return id(thread)
+
+
+def allocate_lock():
+    return LockType()
+
+
+def get_ident():
+    return id(station.clock.current_thread) if station.clock.current_thread else 1
+
+
+def stack_size(size=None):
+    return 0
+
+
+def exit():
+    raise SystemExit
+
+
+def build_module():
+    module = ModuleType("_thread", "simulated _thread")
+    for member in (LockType, start_new_thread, allocate_lock, get_ident, stack_size, exit):
+        setattr(module, member.__name__, member)
+    return module
@@ -0,0 +1,155 @@
+'''
+runs main.py on the simulated hardware in tools/sim at accelerated time and reports
+what the station did: samples, pulses, bus traffic and failures, uploads, and how far
+the uploaded temperature, humidity and pressure were from the scenario's weather
+averaged over the same 2 minute report period.
+
+main.py's own output goes to --log (or nowhere). the config is conf/example_config.json
+with made up credentials unless --config names another; it's written to a scratch
+directory that main.py runs in.
+
+run from the repo root:
+    python3 tools/simulate.py [--hours H] [--scenario diurnal|front|FILE.json] [--seed N]
+        [--probes N] [--config FILE] [--log FILE]
+'''
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import host_compat  # noqa: F401  (ticks_*, const() and the repo root on sys.path)
+from sim import SimStation, load_scenario
+from sim.station import REPO_ROOT
+
+REPORT_PERIOD_S = 120
+TRUTH_STEP_S = 5
+PA_TO_INCHES = 0.00029530
+SIM_CREDENTIALS = {"station_id": "S1NJTVNUQVRJT04x", "station_key": "c2ltLWtleQ=="}  # KSIMSTATION1, sim-key
+SIM_DATABASE_HOST = "telegraf.sim"
+
+
+def example_config():
+    ''' the example config with base64 credentials in place of its placeholders '''
+    with open(os.path.join(REPO_ROOT, "conf", "example_config.json")) as fp:
+        config = json.load(fp)
+    config["weather_api"]["credentials"] = dict(SIM_CREDENTIALS)
+    config["database_api"]["host"] = SIM_DATABASE_HOST
+    return config
+
+
+def mean_truth(scenario, end_s, field):
+    ''' the scenario's field averaged over the report period ending at end_s '''
+    start_s = max(0, end_s - REPORT_PERIOD_S)
+    steps = range(int(start_s), int(end_s) + 1, TRUTH_STEP_S)
+    return sum(getattr(scenario.conditions(t_s), field) for t_s in steps) / len(steps)
+
+
+def upload_errors(station):
+    ''' uploaded value minus the scenario's, per metric, for every telegraf upload '''
+    errors = {"temperature F": [], "humidity %": [], "pressure inHg": []}
+    for upload in station.uploads:
+        if upload.method != "POST":
+            continue
+        data = upload.json()
+        end_s = upload.t_ms / 1000
+        if data.get("Temperature") is not None:
+            errors["temperature F"].append(data["Temperature"] - (mean_truth(station.scenario, end_s, "temperature_c")
+                * 9 / 5 + 32))
+        if data.get("Humidity") is not None:
+            errors["humidity %"].append(data["Humidity"] - mean_truth(station.scenario, end_s, "humidity"))
+        if data.get("Pressure") is not None:
+            errors["pressure inHg"].append(data["Pressure"]
+                - mean_truth(station.scenario, end_s, "pressure_pa") * PA_TO_INCHES)
+    return errors
+
+
+def report(station, hours, wall_s, log_lines, main_globals):
+    stats = station.stats
+    print("simulated {:.1f} h of station time in {:.1f} s ({:,.0f}x real time)".format(
+        hours, wall_s, hours * 3600 / wall_s))
+    print("clock events: {:,}   asyncio task steps: {:,}   main.py output lines: {:,}".format(
+        station.clock.events_fired, stats["task_steps"], log_lines))
+    sampling = main_globals.get("sampling")
+    if sampling is not None:
+        print("samples: {:,} ({:,} skipped), started late by mean {:,} us, max {:,} us".format(
+            sampling.runs, sampling.skipped, sampling.mean_late_us(), sampling.max_late_us))
+    print("upload threads: {:,} started".format(stats["threads_started"]))
+    wifi = main_globals.get("wifi")
+    if wifi is not None:
+        print("wifi: {:,} connects, {:,} drops, {:,} failed attempts, link up to first upload max {:,} ms".format(
+            wifi.connects, wifi.disconnects, wifi.failed_attempts, wifi.max_up_to_upload_ms))
+    print("wind edges: {:,}   rain edges: {:,}".format(stats["wind_edges"], stats["rain_edges"]))
+    print("i2c transactions: {:,} ({:,} failed, {:,} nacked e.g. the AM2320 waking up)".format(
+        stats["i2c_transactions"], stats["i2c_errors"], stats["i2c_nacks"]))
+    print("1-wire reads: {:,} ({:,} failed)".format(stats["onewire_reads"], stats["onewire_errors"]))
+    gets = sum(1 for upload in station.uploads if upload.method == "GET")
+    posts = sum(1 for upload in station.uploads if upload.method == "POST")
+    print("http requests: {:,} ({:,} failed)   uploads: {:,} wunderground, {:,} telegraf".format(
+        stats["http_requests"], stats["http_errors"], gets, posts))
+    api_utils = main_globals.get("api_utils")
+    if api_utils is not None:
+        session = api_utils.session
+        print("upload connections: {:,} opened, {:,} reused".format(session.connects, session.reuses))
+    for metric, errors in upload_errors(station).items():
+        if errors:
+            print("uploaded {} vs scenario: mean error {:+.3f}, worst {:.3f}".format(
+                metric, sum(errors) / len(errors), max(abs(error) for error in errors)))
+
+
+class LineCounter:
+    def __init__(self, out=None):
+        self.out = out
+        self.lines = 0
+
+    def write(self, text):
+        self.lines += text.count("\n")
+        if self.out:
+            self.out.write(text)
+
+    def flush(self):
+        if self.out:
+            self.out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run main.py on simulated hardware")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--scenario", default="diurnal", help="diurnal, front or a scenario json file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--probes", type=int, default=1, help="ds18b20 probes on the 1-Wire bus")
+    parser.add_argument("--config", help="config.json for main.py, the example config by default")
+    parser.add_argument("--log", help="file for main.py's output")
+    args = parser.parse_args()
+
+    station = SimStation(load_scenario(args.scenario, args.seed), seed=args.seed, probes=args.probes)
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="station-sim-")
+    log = open(args.log, "w") if args.log else None
+    out = LineCounter(log)
+    try:
+        os.makedirs(os.path.join(scratch, "conf"))
+        if args.config:
+            shutil.copy(args.config, os.path.join(scratch, "conf", "config.json"))
+        else:
+            with open(os.path.join(scratch, "conf", "config.json"), "w") as fp:
+                json.dump(example_config(), fp)
+        os.chdir(scratch)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(out):
+            main_globals = station.run_main(args.hours)
+        wall_s = time.perf_counter() - start
+    finally:
+        station.uninstall()
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+        if log:
+            log.close()
+    report(station, args.hours, wall_s, out.lines, main_globals)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+from time import ticks_ms, ticks_diff
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+STACK_SIZE = 16 * 1024  # an https request does its tls handshake on this stack
+MAX_PENDING = 4
+
+
+class UploadWorker:
+    '''
+    runs the station's network jobs (uploads, the time api) on a _thread of their own,
+    so a slow or stalled request never holds up sampling. submit() queues a job and
+    starts a thread to run the queue when there isn't one running; the thread exits
+    once the queue is empty instead of idling between uploads.
+
+    a job queued under a name that's already waiting replaces it, newer data being
+    what's worth sending, and past MAX_PENDING the oldest job is dropped. without
+    _thread the jobs run in submit().
+    '''
+
+    def __init__(self, max_pending=MAX_PENDING, stack_size=STACK_SIZE):
+        self.max_pending = max_pending
+        self.stack_size = stack_size
+        self.done = 0
+        self.failed = 0
+        self.replaced = 0
+        self.dropped = 0
+        self.last_ms = 0
+        self.max_ms = 0
+        self.__pending = []  # [(name, job, args)]
+        self.__running = False
+        self.__lock = _thread.allocate_lock() if _thread else None
+
+    def submit(self, name, job, *args):
+        if self.__lock is None:
+            self.__run_job(name, job, args)
+            return
+        with self.__lock:
+            pending = self.__pending
+            for i in range(len(pending)):
+                if pending[i][0] == name:
+                    pending.pop(i)
+                    self.replaced += 1
+                    break
+            if len(pending) >= self.max_pending:
+                pending.pop(0)
+                self.dropped += 1
+            pending.append((name, job, args))
+            if self.__running:
+                return
+            self.__running = True
+        try:
+            _thread.stack_size(self.stack_size)
+            _thread.start_new_thread(self.__run, ())
+        except Exception as e:
+            print("Couldn't start the upload thread, running the uploads here: ", e)
+            self.__run()
+
+    def busy(self):
+        return self.__running
+
+    def __run(self):
+        while True:
+            with self.__lock:
+                if not self.__pending:
+                    self.__running = False
+                    return
+                name, job, args = self.__pending.pop(0)
+            self.__run_job(name, job, args)
+
+    def __run_job(self, name, job, args):
+        start = ticks_ms()
+        try:
+            job(*args)
+            self.done += 1
+        except Exception as e:
+            self.failed += 1
+            print("The {} job failed. {}".format(name, e))
+        self.last_ms = ticks_diff(ticks_ms(), start)
+        if self.last_ms > self.max_ms:
+            self.max_ms = self.last_ms
+
+    def __repr__(self):
+        return "uploads: {} done, {} failed, {} replaced, {} dropped, last {} ms, max {} ms{}".format(
+            self.done, self.failed, self.replaced, self.dropped, self.last_ms, self.max_ms,
+            ", running" if self.__running else "")
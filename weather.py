@@ -1,10 +1,37 @@
-import time
-from math import pi, sin, cos, atan2, degrees, radians
-from api_utils import TEMPERATURE_KEY, WIND_KEY, WIND_GUST_KEY, \
+from math import pi, sin, cos, atan2, degrees, radians, sqrt
+from api_utils import TEMPERATURE_KEY, WIND_KEY, WIND_GUST_KEY, HEAT_INDEX_KEY, WIND_CHILL_KEY, \
+FEELS_LIKE_KEY, SEA_LEVEL_PRESSURE_KEY, PRESSURE_TENDENCY_KEY, \
 WIND_SPEED_KEY, WIND_DIRECTION_KEY, RAIN_KEY, RAIN_COUNT_DAILY_KEY, \
-RAIN_COUNT_HOURLY_KEY, PRESSURE_KEY, HUMIDITY_KEY, DEW_POINT_KEY
+RAIN_COUNT_HOURLY_KEY, RAIN_RATE_KEY, PRESSURE_KEY, HUMIDITY_KEY, DEW_POINT_KEY, \
+REJECTED_KEY, HEALTH_KEY
+from array import array
+from ring_buffer import RingBuffer, RunningWindow, MISSING, MISSING_INT, round_div
+from rollup import Rollup, ROLLUP_HOURLY
+from pulse_buffer import PulseBuffer
+from time import ticks_diff
+try:
+    from ucollections import namedtuple
+except ImportError:
+    from collections import namedtuple
 RAIN_COUNT_CONSTANT = 0.2794  # mm's rain
+RAIN_TIP_TENTH_MICRONS = 2794  # RAIN_COUNT_CONSTANT for integer math
+RAIN_DEBOUNCE_MS = 500  # a bucket can't tip twice this fast, anything closer is switch bounce
+RAIN_TIP_CAPACITY = 1024  # tip timestamps kept; an hour of a 10in/hr downpour is ~910 tips
+HOUR_MS = 3_600_000
 ANEMOMETER_CONSTANT = 2.4  # km/h
+GUST_WINDOW_MS = 3000  # WMO gust: highest 3 second average wind speed
+WIND_DEBOUNCE_MS = 5  # no less than 5ms between pulses of the reed switch
+WIND_PULSE_CAPACITY = 2048  # pulse timestamps kept; > 5 s worth at 300 pulses/s
+# fixed point mode keeps readings as scaled integers, see Weather(fixed_point=True)
+CENTI = 100  # values are stored in hundredths of their unit
+ANEMOMETER_CENTI_KMH = 240  # ANEMOMETER_CONSTANT in hundredths of a km/h
+KMH_PER_MPH_MILLI = 1609  # 1.6093 km/h per mph, in thousandths
+COORDINATE_SCALE = 1000  # wind direction coords are stored in thousandths
+KMH_PER_MPH = 1.6093
+LAPSE_RATE = 0.0065  # K/m, standard atmosphere temperature drop with altitude
+BAROMETRIC_EXPONENT = 5.257
+PRESSURE_TENDENCY_HOURS = 3
+PRESSURE_HISTORY = "PressureHistory"  # version key of the hourly pressure rollup
 N_NE_ANGLE_RAD = radians(22.5)
 NE_ANGLE_RAD = radians(45)
 DEG_22_5_X = cos(N_NE_ANGLE_RAD)  # N/NE
@@ -30,25 +57,165 @@ WIND_ANGLE_COORDINATE_DICT = {
     "N/NW": (DEG_22_5_X, -DEG_22_5_Y)
 }
 
-WIND_DIR_DICT = {
-    WIND_ANGLE_COORDINATE_DICT["E/NE"]: range(0, 132),
-    WIND_ANGLE_COORDINATE_DICT["E"]: range(132, 165),
-    WIND_ANGLE_COORDINATE_DICT["S/SE"]: range(165, 242),
-    WIND_ANGLE_COORDINATE_DICT["SE"]: range(242, 297),
-    WIND_ANGLE_COORDINATE_DICT["E/SE"]: range(297, 397),
-    WIND_ANGLE_COORDINATE_DICT["S"]: range(397, 709),
-    WIND_ANGLE_COORDINATE_DICT["NE"]: range(709, 927),
-    WIND_ANGLE_COORDINATE_DICT["N/NE"]: range(927, 1165),
-    WIND_ANGLE_COORDINATE_DICT["W/SW"]: range(1165, 1458),
-    WIND_ANGLE_COORDINATE_DICT["S/SW"]: range(1458, 1520),
-    WIND_ANGLE_COORDINATE_DICT["SW"]: range(1520, 1695),
-    WIND_ANGLE_COORDINATE_DICT["N/NW"]: range(1695, 2100),
-    WIND_ANGLE_COORDINATE_DICT["N"]: range(2100, 2480),
-    WIND_ANGLE_COORDINATE_DICT["W/NW"]: range(2480, 2863),
-    WIND_ANGLE_COORDINATE_DICT["NW"]: range(2863, 3403),
-    WIND_ANGLE_COORDINATE_DICT["W"]: range(3403, 3800)
+WIND_DIRECTION_NAMES = (
+    "N", "N/NE", "NE", "E/NE", "E", "E/SE", "SE", "S/SE",
+    "S", "S/SW", "SW", "W/SW", "W", "W/NW", "NW", "N/NW"
+)
+# index i of this tuple holds the (x, y) coords of WIND_DIRECTION_NAMES[i]
+WIND_DIR_COORDINATES = tuple(WIND_ANGLE_COORDINATE_DICT[name] for name in WIND_DIRECTION_NAMES)
+WIND_DIR_COORDINATES_FIXED = tuple(
+    (round(x * COORDINATE_SCALE), round(y * COORDINATE_SCALE)) for x, y in WIND_DIR_COORDINATES
+)
+WIND_ADC_RESOLUTION = 4096  # 12 bit adc
+DEFAULT_WIND_DIRECTION = "W"  # used for adc values not covered by the calibration
+
+# [start, end) adc ranges of each direction; conf/config.json can override these
+# under "wind_vane": {"calibration": {...}} for vanes with a different resistor network
+WIND_DIR_CALIBRATION = {
+    "E/NE": (0, 132),
+    "E": (132, 165),
+    "S/SE": (165, 242),
+    "SE": (242, 297),
+    "E/SE": (297, 397),
+    "S": (397, 709),
+    "NE": (709, 927),
+    "N/NE": (927, 1165),
+    "W/SW": (1165, 1458),
+    "S/SW": (1458, 1520),
+    "SW": (1520, 1695),
+    "N/NW": (1695, 2100),
+    "N": (2100, 2480),
+    "W/NW": (2480, 2863),
+    "NW": (2863, 3403),
+    "W": (3403, 3800)
 }
 
+def build_wind_dir_table(calibration=WIND_DIR_CALIBRATION):
+    '''
+    build the adc value -> direction index lookup table (one byte per possible adc value)
+    so that converting a reading is a single index instead of a search through the ranges
+    '''
+    table = bytearray(WIND_ADC_RESOLUTION)
+    default_index = WIND_DIRECTION_NAMES.index(DEFAULT_WIND_DIRECTION)
+    for adc_val in range(WIND_ADC_RESOLUTION):
+        table[adc_val] = default_index
+    for name, adc_range in calibration.items():
+        if name not in WIND_DIRECTION_NAMES:
+            raise ValueError("Unknown wind direction in calibration: {}".format(name))
+        start, end = adc_range
+        if not 0 <= start <= end <= WIND_ADC_RESOLUTION:
+            raise ValueError("Bad adc range for wind direction {}: {}".format(name, adc_range))
+        dir_index = WIND_DIRECTION_NAMES.index(name)
+        for adc_val in range(start, end):
+            table[adc_val] = dir_index
+    return table
+
+WIND_DIR_TABLE = build_wind_dir_table()
+
+class HampelFilter:
+    '''
+    streaming outlier check for one metric. a reading is rejected when it's outside
+    [low, high] or further from the median of the last window readings than
+    threshold scaled MADs (median absolute deviation, scaled to a standard deviation)
+    or min_deviation, whichever is bigger. every in-range reading joins the history,
+    rejected or not, so a real step change is accepted once it's half the window.
+    a sorted copy of the history is kept up to date on each reading, so the median
+    and MAD cost O(window) however big the Weather sample window is.
+    '''
+    MAD_SCALE_MILLI = 1483  # 1.4826 * 1000, turns a MAD into a std deviation for normal data
+
+    def __init__(self, window=7, threshold=3, min_deviation=0, low=None, high=None, typecode="f"):
+        missing = MISSING if typecode in ("f", "d") else MISSING_INT
+        self.window = window
+        self.threshold = threshold
+        self.min_deviation = min_deviation
+        self.low = low
+        self.high = high
+        self.__limit_milli = threshold * HampelFilter.MAD_SCALE_MILLI
+        self.__history = RingBuffer(window, typecode, missing)
+        self.__sorted = array(typecode, [missing] * window)
+        self.__held = 0
+
+    def check(self, val):
+        ''' True when val should be kept, False when it's an outlier '''
+        if (self.low is not None and val < self.low) or (self.high is not None and val > self.high):
+            return False  # can't be real, so it doesn't get to move the median either
+        accept = True
+        if self.__held >= 3:
+            median = self.__sorted[self.__held // 2]
+            limit_milli = max(self.__limit_milli * self.median_abs_deviation(median), self.min_deviation * 1000)
+            accept = abs(val - median) * 1000 <= limit_milli
+        self.__add(val)
+        return accept
+
+    def median_abs_deviation(self, median):
+        '''
+        the deviations left of the median shrink and the ones right of it grow, so they're
+        two sorted runs; walking both from the median finds the middle one in O(window)
+        '''
+        sorted_vals = self.__sorted
+        held = self.__held
+        left = held // 2 - 1
+        right = held // 2
+        deviation = 0
+        for _ in range(held // 2 + 1):
+            if left >= 0 and (right >= held or median - sorted_vals[left] < sorted_vals[right] - median):
+                deviation = median - sorted_vals[left]
+                left -= 1
+            else:
+                deviation = sorted_vals[right] - median
+                right += 1
+        return deviation
+
+    def __add(self, val):
+        sorted_vals = self.__sorted
+        held = self.__held
+        evicted = self.__history.push(val)
+        if held == self.window:
+            # drop the evicted reading from the sorted copy
+            i = self.__bisect(evicted, held)
+            while i < held - 1:
+                sorted_vals[i] = sorted_vals[i + 1]
+                i += 1
+            held -= 1
+        val = self.__history.newest()  # as stored, so a later eviction finds the same value
+        i = held
+        while i > 0 and sorted_vals[i - 1] > val:
+            sorted_vals[i] = sorted_vals[i - 1]
+            i -= 1
+        sorted_vals[i] = val
+        self.__held = held + 1
+
+    def __bisect(self, val, held):
+        sorted_vals = self.__sorted
+        low, high = 0, held
+        while low < high:
+            mid = (low + high) // 2
+            if sorted_vals[mid] < val:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+def default_filters(fixed_point=False):
+    ''' outlier filters for the readings Weather averages, in the units it's given them '''
+    scale = CENTI if fixed_point else 1
+    typecode = "i" if fixed_point else "f"
+    return {
+        # the ds18b20's 85C power on value and i2c garbage land outside of these ranges
+        TEMPERATURE_KEY: HampelFilter(min_deviation=2 * scale, low=-60 * scale, high=70 * scale, typecode=typecode),
+        HUMIDITY_KEY: HampelFilter(min_deviation=5 * scale, low=0, high=100 * scale, typecode=typecode),
+        PRESSURE_KEY: HampelFilter(min_deviation=300, low=30000, high=110000, typecode=typecode)
+    }
+
+# one update's values, frozen for the uploaders, see Weather.publish()
+WeatherSnapshot = namedtuple("WeatherSnapshot", (
+    "temperature", "humidity", "dew_point", "pressure", "sea_level_pressure", "pressure_tendency",
+    "heat_index", "wind_chill", "feels_like", "wind_direction", "wind_speed", "wind_gust",
+    "rain_hourly", "rain_daily", "rain_rate", "temperature_rejected", "humidity_rejected",
+    "pressure_rejected", "humidity_health", "pressure_health"
+))
+
 class Weather:
 
     def __init__(
@@ -57,31 +224,95 @@ class Weather:
         speed_units="MPH",
         rain_units="in",
         updates_per_hr=12,
-        sensor_data_pts=60
+        sensor_data_pts=60,
+        fixed_point=False,
+        wind_pulse_capacity=WIND_PULSE_CAPACITY,
+        rain_tip_capacity=RAIN_TIP_CAPACITY,
+        filters=None,
+        altitude_m=0
     ):
+        '''
+        with fixed_point=True readings are stored and aggregated as integers so the
+        sampling and averaging path never creates a float: temperature readings are
+        hundredths of a degree C, humidity hundredths of a percent, pressure whole Pa
+        and rain is counted in bucket tips. the values kept by the setters are
+        hundredths of the output units and are only turned into decimals when
+        get_weather_data() is called for serialization.
+
+        filters maps TEMPERATURE_KEY, HUMIDITY_KEY and PRESSURE_KEY to a HampelFilter (or
+        None to keep every reading); by default the ones from default_filters() are used.
+
+        heat index, wind chill, feels like, sea level pressure and the pressure tendency are
+        derived when get_weather_data() is called, and each is only recalculated when one of
+        the inputs it depends on has been set to a new value since it was last calculated.
+
+        get_weather_data() is the live dict the setters write into. publish() freezes it
+        into a WeatherSnapshot once per update, which is what gets serialized: the next
+        samples only ever change the live dict, never a snapshot that's being sent.
+        '''
         self.temp_units = temp_units
         self.speed_units = speed_units
         self.rain_units = rain_units
-        self.__rain_hourly_list = [0.0] * updates_per_hr
-        self.__wind_dir_list = [(0.0, 0.0)] * sensor_data_pts  # (x, y) tuple coords for each direction recorded
-        self.__temperature_list = [0.0] * sensor_data_pts
-        self.__pressure_list = [0.0] * sensor_data_pts
-        self.__humidity_list = [0.0] * sensor_data_pts
-        self.__rain_count_daily = 0.0
-        self.__rain_count_hourly = 0.0
-        self.__wind_direction = 0.0
-        self.__wind_speed = 0.0
+        self.fixed_point = fixed_point
+        typecode = "i" if fixed_point else "f"
+        zero = 0 if fixed_point else 0.0
+        missing = MISSING_INT if fixed_point else MISSING
+        # the rain gauge irq records each bucket tip's ticks_ms() here
+        self.rain_tips = PulseBuffer(rain_tip_capacity, RAIN_DEBOUNCE_MS)
+        self.__rain_tips_daily = 0
+        # x and y coords of each direction recorded are kept in two parallel buffers
+        self.__wind_dir_x_list = RunningWindow(sensor_data_pts, typecode, zero)
+        self.__wind_dir_y_list = RunningWindow(sensor_data_pts, typecode, zero)
+        # these start empty so a real 0 reading counts towards the average
+        self.__temperature_list = RunningWindow(sensor_data_pts, typecode, missing)
+        self.__pressure_list = RunningWindow(sensor_data_pts, typecode, missing)
+        self.__humidity_list = RunningWindow(sensor_data_pts, typecode, missing)
+        self.__filters = default_filters(fixed_point) if filters is None else filters
+        self.__rejected = {TEMPERATURE_KEY: 0, PRESSURE_KEY: 0, HUMIDITY_KEY: 0}
+        self.__sensor_health = {}  # reading key -> the state of the sensor it comes from, see set_sensor_health()
+        # min/max/mean history at 2 minute, hourly and daily resolution, in the units the readings come in
+        self.__rollups = {
+            key: Rollup(updates_per_hr, typecode=typecode)
+            for key in (TEMPERATURE_KEY, PRESSURE_KEY, HUMIDITY_KEY, WIND_SPEED_KEY, WIND_GUST_KEY)
+        }
+        self.__wind_dir_table = WIND_DIR_TABLE
+        self.__wind_dir_coordinates = WIND_DIR_COORDINATES_FIXED if fixed_point else WIND_DIR_COORDINATES
+        self.__rain_count_daily = zero
+        self.__rain_count_hourly = zero
+        self.__rain_rate = zero
+        self.__wind_direction = zero
+        self.__wind_speed = zero
+        # the anemometer irq records each pulse's ticks_ms() here; drain_wind_pulses() consumes them
+        self.__draining = False
+        self.__gust_pulses = 0
+        self.wind_pulses = PulseBuffer(wind_pulse_capacity, WIND_DEBOUNCE_MS, self.drain_wind_pulses)
         self.__wind_speed_pulses = 0
-        self.__wind_gust_pulses = 0
-        self.__max_wind_gust = 0.0
-        self.__temperature = 0.0
-        self.__pressure = 0.0
-        self.__humidity = 0.0
-        self.__dew_point = 0.0
+        self.__max_wind_gust = zero
+        self.__temperature = zero
+        self.__pressure = zero
+        self.__humidity = zero
+        self.__dew_point = zero
+        self.__pressure_pa = zero
+        self.altitude_m = altitude_m
+        # every input change stamps the input with the next version; a derived value is stale
+        # once any of its inputs has a newer version than the one it was calculated at
+        self.__version = 0
+        self.__input_versions = {
+            TEMPERATURE_KEY: 0, HUMIDITY_KEY: 0, WIND_SPEED_KEY: 0, PRESSURE_KEY: 0, PRESSURE_HISTORY: 0
+        }
+        self.__derived = (
+            (HEAT_INDEX_KEY, (TEMPERATURE_KEY, HUMIDITY_KEY), self.calculate_heat_index),
+            (WIND_CHILL_KEY, (TEMPERATURE_KEY, WIND_SPEED_KEY), self.calculate_wind_chill),
+            (FEELS_LIKE_KEY, (TEMPERATURE_KEY, HUMIDITY_KEY, WIND_SPEED_KEY), self.calculate_feels_like),
+            (SEA_LEVEL_PRESSURE_KEY, (PRESSURE_KEY, TEMPERATURE_KEY), self.calculate_sea_level_pressure),
+            (PRESSURE_TENDENCY_KEY, (PRESSURE_HISTORY,), self.calculate_pressure_tendency)
+        )
+        self.__derived_versions = {key: -1 for key, _, _ in self.__derived}
         self.__weather_dict = {
             RAIN_KEY: {
                 RAIN_COUNT_DAILY_KEY: self.__rain_count_daily,
-                RAIN_COUNT_HOURLY_KEY: self.__rain_count_hourly
+                RAIN_COUNT_HOURLY_KEY: self.__rain_count_hourly,
+                RAIN_RATE_KEY: self.__rain_rate
             },
             WIND_KEY: {
                 WIND_DIRECTION_KEY: self.__wind_direction,
@@ -91,19 +322,93 @@ class Weather:
             TEMPERATURE_KEY: self.__temperature,
             PRESSURE_KEY: self.__pressure,
             HUMIDITY_KEY: self.__humidity,
-            DEW_POINT_KEY: self.__dew_point
+            DEW_POINT_KEY: self.__dew_point,
+            HEAT_INDEX_KEY: 0.0,
+            WIND_CHILL_KEY: 0.0,
+            FEELS_LIKE_KEY: 0.0,
+            SEA_LEVEL_PRESSURE_KEY: 0.0,
+            PRESSURE_TENDENCY_KEY: None,  # until there are PRESSURE_TENDENCY_HOURS of history
+            REJECTED_KEY: self.__rejected,
+            HEALTH_KEY: self.__sensor_health
         }
+        self.__published = None
 
     def __repr__(self):
-        return repr(self.__weather_dict)
+        return repr(self.get_weather_data())
 
     def get_weather_data(self):
+        if self.fixed_point:
+            self.__convert_fixed_point_values()
+        self.__update_derived_values()
         return self.__weather_dict
 
+    def publish(self):
+        '''
+        snapshot the current values and make them the published ones. each update gets a
+        newly allocated tuple, not a recycled buffer: an upload that's queued, stalled or
+        held back for the wifi can hold a snapshot for several updates, and what was
+        published before has to stay as it was for whoever still holds it
+        '''
+        data = self.get_weather_data()
+        rain = data[RAIN_KEY]
+        wind = data[WIND_KEY]
+        rejected = self.__rejected
+        health = self.__sensor_health
+        self.__published = WeatherSnapshot(
+            data[TEMPERATURE_KEY], data[HUMIDITY_KEY], data[DEW_POINT_KEY], data[PRESSURE_KEY],
+            data[SEA_LEVEL_PRESSURE_KEY], data[PRESSURE_TENDENCY_KEY], data[HEAT_INDEX_KEY],
+            data[WIND_CHILL_KEY], data[FEELS_LIKE_KEY], wind[WIND_DIRECTION_KEY], wind[WIND_SPEED_KEY],
+            wind[WIND_GUST_KEY], rain[RAIN_COUNT_HOURLY_KEY], rain[RAIN_COUNT_DAILY_KEY], rain[RAIN_RATE_KEY],
+            rejected[TEMPERATURE_KEY], rejected[HUMIDITY_KEY], rejected[PRESSURE_KEY],
+            health.get(HUMIDITY_KEY), health.get(PRESSURE_KEY)
+        )
+        return self.__published
+
+    def get_published(self):
+        ''' the last publish()ed snapshot, None before the first '''
+        return self.__published
+
+    def __input_changed(self, key):
+        self.__version += 1
+        self.__input_versions[key] = self.__version
+
+    def __update_derived_values(self):
+        input_versions = self.__input_versions
+        for key, inputs, calculate in self.__derived:
+            calculated_at = self.__derived_versions[key]
+            for input_key in inputs:
+                if input_versions[input_key] > calculated_at:
+                    self.__weather_dict[key] = calculate()
+                    self.__derived_versions[key] = self.__version
+                    break
+
+    def set_altitude(self, altitude_m):
+        ''' station altitude in meters, for the sea level pressure '''
+        if altitude_m != self.altitude_m:
+            self.altitude_m = altitude_m
+            self.__input_changed(PRESSURE_KEY)
+
+    def __convert_fixed_point_values(self):
+        rain_dict = self.__weather_dict[RAIN_KEY]
+        rain_dict[RAIN_COUNT_DAILY_KEY] = self.rain_tips_to_units(self.__rain_count_daily)
+        rain_dict[RAIN_COUNT_HOURLY_KEY] = self.rain_tips_to_units(self.__rain_count_hourly)
+        rain_dict[RAIN_RATE_KEY] = self.__rain_rate / CENTI
+        wind_dict = self.__weather_dict[WIND_KEY]
+        wind_dict[WIND_DIRECTION_KEY] = self.__wind_direction / CENTI
+        wind_dict[WIND_SPEED_KEY] = self.__wind_speed / CENTI
+        wind_dict[WIND_GUST_KEY] = self.__max_wind_gust / CENTI
+        self.__weather_dict[TEMPERATURE_KEY] = self.__temperature / CENTI
+        self.__weather_dict[PRESSURE_KEY] = self.__pressure / CENTI
+        self.__weather_dict[HUMIDITY_KEY] = self.__humidity / CENTI
+        self.__weather_dict[DEW_POINT_KEY] = self.__dew_point / CENTI
+
     def get_rain_count_daily(self):
         return self.__rain_count_daily
 
     def set_rain_count_daily(self, val):
+        if self.fixed_point:
+            self.__rain_count_daily = val  # bucket tips
+            return
         self.__rain_count_daily = Weather.two_decimals(val)
         self.__weather_dict[RAIN_KEY][RAIN_COUNT_DAILY_KEY] = self.__rain_count_daily
 
@@ -111,13 +416,29 @@ class Weather:
         return self.__rain_count_hourly
 
     def set_rain_count_hourly(self, val):
+        if self.fixed_point:
+            self.__rain_count_hourly = val  # bucket tips
+            return
         self.__rain_count_hourly = Weather.two_decimals(val)
         self.__weather_dict[RAIN_KEY][RAIN_COUNT_HOURLY_KEY] = self.__rain_count_hourly
 
+    def get_rain_rate(self):
+        return self.__rain_rate
+
+    def set_rain_rate(self, val):
+        if self.fixed_point:
+            self.__rain_rate = val  # hundredths of rain_units per hour
+            return
+        self.__rain_rate = Weather.two_decimals(val)
+        self.__weather_dict[RAIN_KEY][RAIN_RATE_KEY] = self.__rain_rate
+
     def get_wind_gust(self):
         return self.__max_wind_gust
 
     def set_wind_gust(self, val):
+        if self.fixed_point:
+            self.__max_wind_gust = val
+            return
         self.__max_wind_gust = Weather.two_decimals(val)
         self.__weather_dict[WIND_KEY][WIND_GUST_KEY] = self.__max_wind_gust
 
@@ -125,6 +446,9 @@ class Weather:
         return self.__wind_direction
 
     def set_wind_direction(self, val):
+        if self.fixed_point:
+            self.__wind_direction = val
+            return
         self.__wind_direction = Weather.two_decimals(val)
         self.__weather_dict[WIND_KEY][WIND_DIRECTION_KEY] = self.__wind_direction
 
@@ -132,16 +456,32 @@ class Weather:
         return self.__wind_speed
 
     def set_wind_speed(self, val):
-        self.__wind_speed = Weather.two_decimals(val)
+        if not self.fixed_point:
+            val = Weather.two_decimals(val)
+        if val != self.__wind_speed:
+            self.__input_changed(WIND_SPEED_KEY)
+        self.__wind_speed = val
+        if self.fixed_point:
+            return
         self.__weather_dict[WIND_KEY][WIND_SPEED_KEY] = self.__wind_speed
 
     def get_temperature(self):
         return self.__temperature
 
     def set_temperature(self, val):
+        if self.fixed_point:
+            if not self.temp_units == "C":
+                val = Weather.centi_celsius2fahrenheit(val)
+            if val != self.__temperature:
+                self.__input_changed(TEMPERATURE_KEY)
+            self.__temperature = val
+            return
         if not self.temp_units == "C":
             val = Weather.celsius2fahrenheit(val)
-        self.__temperature = Weather.two_decimals(val)
+        val = Weather.two_decimals(val)
+        if val != self.__temperature:
+            self.__input_changed(TEMPERATURE_KEY)
+        self.__temperature = val
         self.__weather_dict[TEMPERATURE_KEY] = self.__temperature
 
     def get_temperature_list(self):
@@ -151,7 +491,13 @@ class Weather:
         return self.__humidity
 
     def set_humidity(self, humidity_val):
-        self.__humidity = Weather.two_decimals(humidity_val)
+        if not self.fixed_point:
+            humidity_val = Weather.two_decimals(humidity_val)
+        if humidity_val != self.__humidity:
+            self.__input_changed(HUMIDITY_KEY)
+        self.__humidity = humidity_val
+        if self.fixed_point:
+            return
         self.__weather_dict[HUMIDITY_KEY] = self.__humidity
 
     def get_humidity_list(self):
@@ -161,6 +507,12 @@ class Weather:
         return self.__pressure
 
     def set_pressure(self, pa_val):
+        if pa_val != self.__pressure_pa:
+            self.__input_changed(PRESSURE_KEY)
+        self.__pressure_pa = pa_val
+        if self.fixed_point:
+            self.__pressure = Weather.pa_to_centi_inches(pa_val)
+            return
         inches_val = Weather.pa_to_inches(pa_val)
         self.__pressure = Weather.two_decimals(inches_val)
         self.__weather_dict[PRESSURE_KEY] = self.__pressure
@@ -172,115 +524,342 @@ class Weather:
         return self.__dew_point
 
     def set_dew_point(self, val=None):
+        if self.fixed_point:
+            # the dew point formula needs floats, done once per update rather than per sample
+            self.__dew_point = round(self.calc_dew_point_with_humidity() * CENTI) if val is None else val
+            return
         if val is None:
             self.__dew_point = Weather.two_decimals(self.calc_dew_point_with_humidity())
         else:
             self.__dew_point = val
         self.__weather_dict[DEW_POINT_KEY] = self.__dew_point
 
-    def increment_rain(self):
-        if self.rain_units == "mm":
-            rain_count_daily = self.get_rain_count_daily() + RAIN_COUNT_CONSTANT
-            self.__rain_hourly_list[-1] += RAIN_COUNT_CONSTANT
+    def increment_rain(self, tips=1):
+        # the daily total is kept in tips so rounding each tip to two decimals can't add up
+        self.__rain_tips_daily += tips
+        if self.fixed_point:
+            self.set_rain_count_daily(self.__rain_tips_daily)
         else:
-            rain_constant = Weather.millimeters2inches(RAIN_COUNT_CONSTANT)
-            rain_count_daily = self.get_rain_count_daily() + rain_constant
-            self.__rain_hourly_list[-1] += rain_constant
-        self.set_rain_count_daily(rain_count_daily)
+            self.set_rain_count_daily(self.rain_tips_to_units(self.__rain_tips_daily))
+
+    def check_rain_tips(self):
+        ''' add the bucket tips the rain gauge irq recorded since the last call to the daily total '''
+        new_tips = self.rain_tips.take_new()
+        if new_tips:
+            self.increment_rain(new_tips)
 
     def add_wind_dir_reading(self, val):
-        self.__wind_dir_list.append(Weather.wind_adc_to_coordinate(val))
-        self.__wind_dir_list.pop(0)
+        if 0 <= val < WIND_ADC_RESOLUTION:
+            self.add_wind_dir_index(self.__wind_dir_table[val])
+        else:
+            self.add_wind_dir_index(WIND_DIRECTION_NAMES.index(DEFAULT_WIND_DIRECTION))
+
+    def add_wind_dir_index(self, dir_index):
+        ''' a reading already mapped to its index in WIND_DIRECTION_NAMES, e.g. by WindVane '''
+        x, y = self.__wind_dir_coordinates[dir_index]
+        self.__wind_dir_x_list.push(x)
+        self.__wind_dir_y_list.push(y)
+
+    def get_wind_dir_table(self):
+        ''' the adc value -> direction index table of the current calibration '''
+        return self.__wind_dir_table
+
+    def set_wind_dir_calibration(self, calibration=None):
+        if calibration:
+            self.__wind_dir_table = build_wind_dir_table(calibration)
+        else:
+            self.__wind_dir_table = WIND_DIR_TABLE
+
+    def set_filter(self, key, filt):
+        ''' replace the outlier filter of TEMPERATURE_KEY, HUMIDITY_KEY or PRESSURE_KEY, None turns it off '''
+        if key not in self.__rejected:
+            raise ValueError("no outlier filter for {}".format(key))
+        self.__filters[key] = filt
+
+    def get_rejected_count(self, key):
+        return self.__rejected[key]
+
+    def set_sensor_health(self, key, state):
+        ''' publish the state of the sensor behind the key's readings, e.g. a sensor_health state '''
+        self.__sensor_health[key] = state
+
+    def get_sensor_health(self, key):
+        return self.__sensor_health.get(key)
+
+    def __filtered_reading(self, key, val):
+        ''' val, or the missing value when there's no reading or the filter rejects it '''
+        if val is None:
+            return self.reading_or_missing(val)
+        filt = self.__filters.get(key)
+        if filt is not None and not filt.check(val):
+            self.__rejected[key] += 1
+            return self.reading_or_missing(None)
+        return val
 
     def add_temperature_reading(self, temp_val):
         # print("temperature reading was: {}".format(temp_val))
-        self.__temperature_list.append(temp_val)
-        self.__temperature_list.pop(0)
+        temp_val = self.__filtered_reading(TEMPERATURE_KEY, temp_val)
+        self.__temperature_list.push(temp_val)
+        self.__rollups[TEMPERATURE_KEY].add(temp_val)
 
     def add_pressure_reading(self, pres_pa_val):
         # print("pressure reading was: {}".format(pres_pa_val))
-        self.__pressure_list.append(pres_pa_val)
-        self.__pressure_list.pop(0)
+        pres_pa_val = self.__filtered_reading(PRESSURE_KEY, pres_pa_val)
+        self.__pressure_list.push(pres_pa_val)
+        self.__rollups[PRESSURE_KEY].add(pres_pa_val)
 
     def add_humidity_reading(self, humid_val):
         # print("humidity reading was: {}".format(humid_val))
-        self.__humidity_list.append(humid_val)
-        self.__humidity_list.pop(0)
-
-    def check_wind_gust(self, last_gust_start_time):
-        gust_window_start_time = time.ticks_ms()
-        if last_gust_start_time:
-            delta_t_gust = time.ticks_diff(gust_window_start_time, last_gust_start_time)
-            current_gust = self.calculate_wind_gust(delta_t_gust)
-            if current_gust > self.__max_wind_gust:
-                self.set_wind_gust(current_gust)
-        return gust_window_start_time
-
-    def add_wind_speed_pulse(self):
-        self.__wind_speed_pulses += 1
-        self.__wind_gust_pulses += 1
-
-    def calculate_wind_gust(self, delta_time_ms):
-        if not self.__wind_gust_pulses:
-            gust = 0.0
-        else:
-            gust = self.do_wind_speed_calc(self.__wind_gust_pulses, (delta_time_ms / 1000.0))
-        self.__wind_gust_pulses = 0
-        return gust
+        humid_val = self.__filtered_reading(HUMIDITY_KEY, humid_val)
+        self.__humidity_list.push(humid_val)
+        self.__rollups[HUMIDITY_KEY].add(humid_val)
+
+    def check_wind_gust(self):
+        '''
+        take the anemometer pulses recorded since the last call: they count towards the
+        average wind speed and the busiest 3 second window among them is the gust.
+        the 3 second window slides over the pulse timestamps, so it doesn't depend on
+        when or how regularly this is called.
+        '''
+        self.__draining = True  # a drain scheduled meanwhile leaves the pulses to this one
+        try:
+            self.__drain_wind_pulses()
+            gust_pulses = self.__gust_pulses
+            self.__gust_pulses = 0
+        finally:
+            self.__draining = False
+        current_gust = self.calculate_wind_gust(gust_pulses)
+        self.__rollups[WIND_GUST_KEY].add(current_gust)
+        if current_gust > self.__max_wind_gust:
+            self.set_wind_gust(current_gust)
+
+    def drain_wind_pulses(self):
+        '''
+        count the anemometer pulses recorded so far towards the wind speed and keep the
+        busiest gust window among them for check_wind_gust(). the pulse buffer schedules
+        this whenever the irq has filled half of it.
+        '''
+        if self.__draining:
+            return
+        self.__draining = True
+        try:
+            self.__drain_wind_pulses()
+        finally:
+            self.__draining = False
+
+    def __drain_wind_pulses(self):
+        new_pulses, gust_pulses = self.wind_pulses.consume(GUST_WINDOW_MS)
+        self.__wind_speed_pulses += new_pulses
+        if gust_pulses > self.__gust_pulses:
+            self.__gust_pulses = gust_pulses
+
+    def calculate_wind_gust(self, gust_pulses):
+        if self.fixed_point:
+            return self.do_fixed_point_wind_speed_calc(gust_pulses, GUST_WINDOW_MS)
+        if not gust_pulses:
+            return 0.0
+        return self.do_wind_speed_calc(gust_pulses, GUST_WINDOW_MS / 1000.0)
+
+    def calculate_wind_speed_over(self, now_ms, window_ms):
+        ''' average wind speed over the last window_ms, straight from the pulse timestamps '''
+        pulses = self.wind_pulses.count_since(now_ms, window_ms)
+        if self.fixed_point:
+            return self.do_fixed_point_wind_speed_calc(pulses, window_ms)
+        return self.do_wind_speed_calc(pulses, window_ms / 1000.0)
 
     def do_wind_speed_calc(self, wind_pulses, delta_time_s):
         return ANEMOMETER_CONSTANT * wind_pulses / (self.get_mph_divisor() * delta_time_s)
 
+    def do_fixed_point_wind_speed_calc(self, wind_pulses, delta_time_ms):
+        ''' speed in hundredths of speed_units, the pulses are counted over delta_time_ms '''
+        if not wind_pulses or delta_time_ms <= 0:
+            return 0
+        centi_kmh = ANEMOMETER_CENTI_KMH * 1000 * wind_pulses // delta_time_ms
+        if self.speed_units == "km/h":
+            return centi_kmh
+        return centi_kmh * 1000 // KMH_PER_MPH_MILLI
+
     def calculate_avg_wind_dir(self):
-        x_coord = sum(x for x, y in self.__wind_dir_list) / len(self.__wind_dir_list)
-        y_coord = sum(y for x, y in self.__wind_dir_list) / len(self.__wind_dir_list)
+        # atan2 only needs x and y on the same scale, so the sums aren't divided into means
+        x_coord = self.__wind_dir_x_list.sum()
+        y_coord = self.__wind_dir_y_list.sum()
+        if self.fixed_point:
+            return round(Weather.get_angle_in_degrees(x_coord, y_coord) * CENTI)
         return Weather.get_angle_in_degrees(x_coord, y_coord)
 
     def average_data_points(self, list):
-        list_with_no_nones = [x for x in list if x]
+        if isinstance(list, RunningWindow):
+            return list.mean()  # kept up to date on every push
+        # MISSING (nan) is the only value not equal to itself
+        list_with_no_nones = [x for x in list if x is not None and x == x]
         if list_with_no_nones:
             return sum(list_with_no_nones) / len(list_with_no_nones)
         else:
             return 0.0
 
     def calculate_avg_wind_speed(self, delta_time_s):
-        avg_wind_spd = self.do_wind_speed_calc(self.__wind_speed_pulses, delta_time_s)
+        self.__draining = True  # so a scheduled drain can't add pulses between the read and the reset
+        wind_speed_pulses = self.__wind_speed_pulses
         self.__wind_speed_pulses = 0
+        self.__draining = False
+        if self.fixed_point:
+            avg_wind_spd = self.do_fixed_point_wind_speed_calc(wind_speed_pulses, delta_time_s * 1000)
+        else:
+            avg_wind_spd = self.do_wind_speed_calc(wind_speed_pulses, delta_time_s)
+        self.__rollups[WIND_SPEED_KEY].add(avg_wind_spd)
         return avg_wind_spd
 
     def get_mph_divisor(self):
         mph_conversion_divisor = 1.0
         if not self.speed_units == "km/h":
-            mph_conversion_divisor = 1.6093
+            mph_conversion_divisor = KMH_PER_MPH
         return mph_conversion_divisor
 
     def calc_dew_point_with_humidity(self):
+        temperature = self.__temperature
+        humidity = self.__humidity
+        if self.fixed_point:
+            temperature /= CENTI
+            humidity /= CENTI
         if self.temp_units == "F":
-            temperature_c = Weather.fahrenheit2celsius(self.__temperature)
-            return Weather.celsius2fahrenheit(Weather.get_dew_point_in_c(self.__humidity, temperature_c))
+            temperature_c = Weather.fahrenheit2celsius(temperature)
+            return Weather.celsius2fahrenheit(Weather.get_dew_point_in_c(humidity, temperature_c))
         else:
-            return Weather.get_dew_point_in_c(self.__humidity, self.__temperature)
+            return Weather.get_dew_point_in_c(humidity, temperature)
 
-    def calculate_hourly_rain(self):
-        return sum(self.__rain_hourly_list)
+    def calculate_hourly_rain(self, now_ms):
+        ''' rain over the 60 minutes before now_ms, from the tip timestamps '''
+        tips = self.rain_tips.count_within(now_ms, HOUR_MS)
+        if self.fixed_point:
+            return tips
+        return self.rain_tips_to_units(tips)
 
-    def rotate_hourly_rain_buckets(self):
-        self.__rain_hourly_list.append(0.0)  # init float at end of list with 0.0
-        self.__rain_hourly_list.pop(0)  # remove first element in list
+    def calculate_rain_rate(self, now_ms):
+        '''
+        rain per hour from the time between the two newest tips. once it's been longer
+        than that since the newest tip the rate decays as if a tip were just about to
+        come; a lone tip or no tip in the last hour is a rate of 0.
+        '''
+        interval_ms = self.rain_tips.last_interval()
+        # count_within() expires old tips as they age, ticks_diff() alone can't tell a
+        # week old tip from a new one once ticks_ms() has wrapped
+        if not interval_ms or not self.rain_tips.count_within(now_ms, HOUR_MS):
+            return self.rain_rate_from_interval(interval_ms, HOUR_MS)
+        since_last_ms = max(ticks_diff(now_ms, self.rain_tips.newest()), 0)
+        return self.rain_rate_from_interval(interval_ms, since_last_ms)
+
+    def rain_rate_from_interval(self, interval_ms, since_last_ms):
+        ''' rate from the ms between the two newest tips and the ms since the newest one '''
+        if since_last_ms >= HOUR_MS:
+            return 0 if self.fixed_point else 0.0
+        interval_ms = max(interval_ms, since_last_ms, 1)
+        if self.fixed_point:
+            centi_mm_per_hr = RAIN_TIP_TENTH_MICRONS * (HOUR_MS // 100) // interval_ms
+            if self.rain_units == "mm":
+                return centi_mm_per_hr
+            return centi_mm_per_hr * 10 // 254
+        rain_per_hr = RAIN_COUNT_CONSTANT * HOUR_MS / interval_ms
+        if self.rain_units == "mm":
+            return rain_per_hr
+        return Weather.millimeters2inches(rain_per_hr)
+
+    def get_rollup(self, key):
+        return self.__rollups[key]
+
+    def close_rollup_period(self):
+        hours_closed = self.__rollups[PRESSURE_KEY].hours_closed
+        for rollup in self.__rollups.values():
+            rollup.close_period()
+        if self.__rollups[PRESSURE_KEY].hours_closed != hours_closed:
+            self.__input_changed(PRESSURE_HISTORY)
+
+    def close_rollup_day(self):
+        for rollup in self.__rollups.values():
+            rollup.close_day()
+        self.__input_changed(PRESSURE_HISTORY)
+
+    def __output_value(self, val):
+        return val / CENTI if self.fixed_point else val
+
+    def __temperature_f(self):
+        temperature = self.__output_value(self.__temperature)
+        if self.temp_units == "C":
+            return Weather.celsius2fahrenheit(temperature)
+        return temperature
+
+    def __wind_speed_mph(self):
+        speed = self.__output_value(self.__wind_speed)
+        if self.speed_units == "km/h":
+            return speed / KMH_PER_MPH
+        return speed
+
+    def __in_temp_units(self, temperature_f):
+        if self.temp_units == "C":
+            return Weather.two_decimals(Weather.fahrenheit2celsius(temperature_f))
+        return Weather.two_decimals(temperature_f)
+
+    def calculate_heat_index(self):
+        return self.__in_temp_units(
+            Weather.heat_index_f(self.__temperature_f(), self.__output_value(self.__humidity))
+        )
+
+    def calculate_wind_chill(self):
+        return self.__in_temp_units(Weather.wind_chill_f(self.__temperature_f(), self.__wind_speed_mph()))
+
+    def calculate_feels_like(self):
+        temperature_f = self.__temperature_f()
+        speed_mph = self.__wind_speed_mph()
+        if temperature_f <= 50 and speed_mph >= 3:
+            return self.__in_temp_units(Weather.wind_chill_f(temperature_f, speed_mph))
+        if temperature_f >= 80:
+            return self.__in_temp_units(Weather.heat_index_f(temperature_f, self.__output_value(self.__humidity)))
+        return self.__in_temp_units(temperature_f)
+
+    def calculate_sea_level_pressure(self):
+        temperature_f = self.__temperature_f()
+        sea_level_pa = Weather.sea_level_pressure(
+            self.__pressure_pa, Weather.fahrenheit2celsius(temperature_f), self.altitude_m
+        )
+        return Weather.two_decimals(Weather.pa_to_inches(sea_level_pa))
+
+    def calculate_pressure_tendency(self):
+        '''
+        change between the newest closed hour's mean pressure and the mean of the hour
+        PRESSURE_TENDENCY_HOURS before it, None until that much history has been kept
+        '''
+        rollup = self.__rollups[PRESSURE_KEY]
+        if rollup.levels[ROLLUP_HOURLY].closed_count() <= PRESSURE_TENDENCY_HOURS:
+            return None
+        newest = rollup.history(ROLLUP_HOURLY, 0)
+        oldest = rollup.history(ROLLUP_HOURLY, PRESSURE_TENDENCY_HOURS)
+        if newest is None or oldest is None:
+            return None
+        return Weather.two_decimals(Weather.pa_to_inches(newest[2] - oldest[2]))
 
     def reset_wind_gust(self):
-        self.set_wind_gust(0.0)
+        self.set_wind_gust(0 if self.fixed_point else 0.0)
 
     def reset_daily_rain_count(self):
-        self.set_rain_count_daily(0.0)
+        self.__rain_tips_daily = 0
+        self.set_rain_count_daily(0 if self.fixed_point else 0.0)
+
+    def reading_or_missing(self, val):
+        if val is None:
+            return MISSING_INT if self.fixed_point else MISSING
+        return val
+
+    def rain_tips_to_units(self, tips):
+        rain_mm = tips * RAIN_COUNT_CONSTANT
+        if self.rain_units == "mm":
+            return Weather.two_decimals(rain_mm)
+        return Weather.two_decimals(Weather.millimeters2inches(rain_mm))
 
     @staticmethod
-    def wind_adc_to_coordinate(wind_adc_val):
-        for wind_direction_coord, voltage_range in WIND_DIR_DICT.items():
-            if wind_adc_val in voltage_range:
-                return wind_direction_coord  # early return b/c found voltage range
-        # return default direction when not voltage in range of other directions
-        return WIND_ANGLE_COORDINATE_DICT["W"]  
+    def wind_adc_to_coordinate(wind_adc_val, table=WIND_DIR_TABLE):
+        if 0 <= wind_adc_val < WIND_ADC_RESOLUTION:
+            return WIND_DIR_COORDINATES[table[wind_adc_val]]
+        # return default direction when the value is outside of the adc's range
+        return WIND_ANGLE_COORDINATE_DICT[DEFAULT_WIND_DIRECTION]
 
     @staticmethod
     def two_decimals(val):
@@ -299,6 +878,16 @@ class Weather:
         ''' convert pa to inches with 1kPa = 0.2953in '''
         return (pres_pa_val * 0.2953) / 1000
 
+    @staticmethod
+    def pa_to_centi_inches(pres_pa_val):
+        ''' integer version of pa_to_inches, in hundredths of an inch '''
+        return round_div(pres_pa_val * 2953, 100000)
+
+    @staticmethod
+    def centi_celsius2fahrenheit(val):
+        ''' integer version of celsius2fahrenheit, both in hundredths of a degree '''
+        return round_div(val * 9, 5) + 3200
+
     @staticmethod
     def celsius2fahrenheit(val):
         return val * 1.8 + 32
@@ -311,6 +900,38 @@ class Weather:
     def millimeters2inches(val):
         return val / 25.4  # 25.4 mm / inch
 
+    @staticmethod
+    def heat_index_f(temp_f, humidity):
+        ''' the NWS heat index: Steadman's simple formula, or the Rothfusz regression once that reaches 80F '''
+        heat_index = 0.5 * (temp_f + 61 + (temp_f - 68) * 1.2 + humidity * 0.094)
+        if (heat_index + temp_f) / 2 < 80:
+            return heat_index
+        heat_index = (
+            -42.379 + 2.04901523 * temp_f + 10.14333127 * humidity
+            - 0.22475541 * temp_f * humidity - 0.00683783 * temp_f * temp_f
+            - 0.05481717 * humidity * humidity + 0.00122874 * temp_f * temp_f * humidity
+            + 0.00085282 * temp_f * humidity * humidity - 0.00000199 * temp_f * temp_f * humidity * humidity
+        )
+        if humidity < 13 and 80 <= temp_f <= 112:
+            heat_index -= (13 - humidity) / 4 * sqrt((17 - abs(temp_f - 95)) / 17)
+        elif humidity > 85 and 80 <= temp_f <= 87:
+            heat_index += (humidity - 85) / 10 * (87 - temp_f) / 5
+        return heat_index
+
+    @staticmethod
+    def wind_chill_f(temp_f, speed_mph):
+        ''' the NWS wind chill, only defined at 50F or colder with at least 3 mph of wind '''
+        if temp_f > 50 or speed_mph < 3:
+            return temp_f
+        speed_factor = pow(speed_mph, 0.16)
+        return 35.74 + 0.6215 * temp_f - 35.75 * speed_factor + 0.4275 * temp_f * speed_factor
+
+    @staticmethod
+    def sea_level_pressure(pres_pa_val, temp_c, altitude_m):
+        ''' station pressure reduced to sea level with the barometric formula '''
+        lapse = LAPSE_RATE * altitude_m
+        return pres_pa_val * pow(1 - lapse / (temp_c + lapse + 273.15), -BAROMETRIC_EXPONENT)
+
     @staticmethod
     def get_dew_point_in_c(humidity, temp_c):
         if humidity < 50:
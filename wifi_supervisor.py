@@ -0,0 +1,161 @@
+from time import ticks_ms, ticks_add, ticks_diff
+from random import getrandbits
+import network
+
+STATE_DOWN = "down"  # not connected, about to try
+STATE_CONNECTING = "connecting"
+STATE_BACKOFF = "backoff"  # the last attempt failed, waiting to try again
+STATE_UP = "up"
+EVENT_UP = "up"
+EVENT_DOWN = "down"
+EVENT_FAILED = "failed"  # an attempt timed out or the ap turned it down
+CONNECT_TIMEOUT_MS = 20_000
+BASE_BACKOFF_MS = 5_000
+MAX_BACKOFF_MS = 300_000
+RSSI_SMOOTHING = 4  # the rssi average moves 1/RSSI_SMOOTHING of the way to each reading
+NO_RSSI = -127
+# the attempt is over as soon as the driver says one of these, no need to wait out the timeout
+FAILED_STATUSES = tuple(getattr(network, name) for name in ("STAT_WRONG_PASSWORD", "STAT_NO_AP_FOUND",
+    "STAT_CONNECT_FAIL", "STAT_BEACON_TIMEOUT", "STAT_HANDSHAKE_TIMEOUT") if hasattr(network, name))
+
+
+class WifiSupervisor:
+    '''
+    keeps the station on the wifi without ever waiting for it: poll() looks at the
+    link, starts a connect attempt when it's down and gives the attempt up after
+    connect_timeout_ms. each failed attempt doubles the wait before the next one up to
+    max_backoff_ms, with half of the wait random so a house full of devices doesn't
+    retry in step after the ap comes back; being up resets it.
+
+    add_hook() registers callbacks for EVENT_UP, EVENT_DOWN and EVENT_FAILED. while up
+    the rssi is read on every poll. link_up_ms is when the link last came up and
+    uploaded() records how long it took from then to the first upload that went out.
+    '''
+
+    def __init__(self, wlan, ssid, password, connect_timeout_ms=CONNECT_TIMEOUT_MS, base_backoff_ms=BASE_BACKOFF_MS,
+            max_backoff_ms=MAX_BACKOFF_MS):
+        self.wlan = wlan
+        self.ssid = ssid
+        self.password = password
+        self.connect_timeout_ms = connect_timeout_ms
+        self.base_backoff_ms = base_backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.state = STATE_DOWN
+        self.backoff_ms = 0
+        self.attempts = 0
+        self.failed_attempts = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.rssi = NO_RSSI
+        self.mean_rssi = NO_RSSI
+        self.min_rssi = 0
+        self.last_failure = None  # the driver's status or the OSError that ended the last attempt
+        self.link_up_ms = None
+        self.last_up_to_upload_ms = None
+        self.max_up_to_upload_ms = 0
+        self.__since = ticks_ms()  # when the current attempt started or the backoff ends
+        self.__awaiting_upload = False
+        self.__hooks = {EVENT_UP: [], EVENT_DOWN: [], EVENT_FAILED: []}
+
+    def add_hook(self, event, callback):
+        ''' callback(supervisor) runs on the poll() that sees event '''
+        self.__hooks[event].append(callback)
+
+    def is_up(self):
+        return self.state == STATE_UP
+
+    def poll(self, now_ms=None):
+        if now_ms is None:
+            now_ms = ticks_ms()
+        connected = self.wlan.isconnected()
+        state = self.state
+        if state == STATE_UP:
+            if connected:
+                self.__read_rssi()
+                return
+            self.disconnects += 1
+            self.state = STATE_DOWN
+            self.rssi = NO_RSSI
+            self.__awaiting_upload = False
+            self.__fire(EVENT_DOWN)
+        elif connected:
+            self.__up(now_ms)
+            return
+        elif state == STATE_CONNECTING:
+            status = self.wlan.status()
+            if status not in FAILED_STATUSES and ticks_diff(now_ms, self.__since) < self.connect_timeout_ms:
+                return
+            self.__failed(now_ms, status)
+            return
+        elif state == STATE_BACKOFF and ticks_diff(now_ms, self.__since) < 0:
+            return
+        self.__connect(now_ms)
+
+    def uploaded(self):
+        ''' call when an upload went out, can be called from another thread '''
+        if not self.__awaiting_upload:
+            return
+        self.__awaiting_upload = False
+        self.last_up_to_upload_ms = ticks_diff(ticks_ms(), self.link_up_ms)
+        if self.last_up_to_upload_ms > self.max_up_to_upload_ms:
+            self.max_up_to_upload_ms = self.last_up_to_upload_ms
+
+    def __connect(self, now_ms):
+        self.attempts += 1
+        self.state = STATE_CONNECTING
+        self.__since = now_ms
+        try:
+            self.wlan.disconnect()  # the driver won't start an attempt on top of an unfinished one
+            self.wlan.connect(self.ssid, self.password)
+        except OSError as e:
+            self.__failed(now_ms, e)
+
+    def __failed(self, now_ms, reason):
+        self.failed_attempts += 1
+        if self.backoff_ms:
+            self.backoff_ms = min(self.backoff_ms * 2, self.max_backoff_ms)
+        else:
+            self.backoff_ms = self.base_backoff_ms
+        half = self.backoff_ms // 2
+        wait_ms = half + (getrandbits(16) * half >> 16)
+        self.state = STATE_BACKOFF
+        self.__since = ticks_add(now_ms, wait_ms)
+        self.last_failure = reason
+        self.__fire(EVENT_FAILED)
+
+    def __up(self, now_ms):
+        self.connects += 1
+        self.state = STATE_UP
+        self.backoff_ms = 0
+        self.link_up_ms = now_ms
+        self.__awaiting_upload = True
+        self.min_rssi = 0
+        self.mean_rssi = NO_RSSI
+        self.__read_rssi()
+        self.__fire(EVENT_UP)
+
+    def __read_rssi(self):
+        try:
+            rssi = self.wlan.status("rssi")
+        except Exception:
+            return
+        self.rssi = rssi
+        if self.mean_rssi == NO_RSSI:
+            self.mean_rssi = rssi
+        else:
+            self.mean_rssi += int((rssi - self.mean_rssi) / RSSI_SMOOTHING)
+        if rssi < self.min_rssi:
+            self.min_rssi = rssi
+
+    def __fire(self, event):
+        for callback in self.__hooks[event]:
+            try:
+                callback(self)
+            except Exception as e:
+                print("The wifi {} hook failed. {}".format(event, e))
+
+    def __repr__(self):
+        return "wifi: {}, {} attempts, {} failed, {} connects, {} drops, backoff {} ms, rssi {} dBm (mean {}, min {}), " \
+            "link up to first upload last {} ms, max {} ms".format(self.state, self.attempts, self.failed_attempts,
+            self.connects, self.disconnects, self.backoff_ms, self.rssi, self.mean_rssi, self.min_rssi,
+            self.last_up_to_upload_ms, self.max_up_to_upload_ms)
@@ -0,0 +1,73 @@
+from array import array
+from time import ticks_us, ticks_diff
+
+BURST_SAMPLES = const(16)
+N_SECTORS = const(16)
+
+
+class WindVane:
+    '''
+    oversampled wind vane. read_sector() reads a burst of adc samples back to back into
+    a preallocated array, maps each one through a direction table (see
+    weather.build_wind_dir_table) and returns the sector most of them landed in, so a
+    vane resting on the boundary between two sectors doesn't flip with the adc noise.
+    nothing is allocated per burst, and the time each burst takes is kept.
+    '''
+
+    def __init__(self, adc, samples=BURST_SAMPLES, default_sector=0):
+        if not 0 < samples < 256:
+            raise ValueError("WindVane takes 1 to 255 samples per burst")
+        self.adc = adc
+        self.samples = array('H', [0] * samples)
+        self.default_sector = default_sector  # for adc values the table doesn't cover
+        self.__counts = bytearray(N_SECTORS)
+        self.bursts = 0
+        self.last_burst_us = 0
+        self.max_burst_us = 0
+        self.total_burst_us = 0
+
+    def burst(self):
+        ''' fill samples with adc readings taken as fast as the adc goes '''
+        samples = self.samples
+        read = self.adc.read
+        for i in range(len(samples)):
+            samples[i] = read()
+        return samples
+
+    def modal_sector(self, table):
+        ''' the sector most samples map to; of sectors tied on count, the first to get there '''
+        counts = self.__counts
+        for i in range(N_SECTORS):
+            counts[i] = 0
+        n_table = len(table)
+        best = self.default_sector
+        best_count = 0
+        for val in self.samples:
+            sector = table[val] if val < n_table else self.default_sector
+            count = counts[sector] + 1
+            counts[sector] = count
+            if count > best_count:
+                best = sector
+                best_count = count
+        return best
+
+    def read_sector(self, table):
+        start = ticks_us()
+        self.burst()
+        sector = self.modal_sector(table)
+        took = ticks_diff(ticks_us(), start)
+        self.bursts += 1
+        self.last_burst_us = took
+        self.total_burst_us += took
+        if took > self.max_burst_us:
+            self.max_burst_us = took
+        return sector
+
+    def mean_burst_us(self):
+        if not self.bursts:
+            return 0
+        return self.total_burst_us // self.bursts
+
+    def __repr__(self):
+        return "wind vane: {} samples per burst, {} bursts, mean {} us, max {} us".format(
+            len(self.samples), self.bursts, self.mean_burst_us(), self.max_burst_us)